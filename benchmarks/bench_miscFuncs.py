@@ -0,0 +1,117 @@
+"""
+Compares the vectorized error kernels of miscFuncs with the loop
+implementations they replaced, in double and single precision. The
+quadratic loop norm errors are timed up to maxQuadraticLoopPoints.
+
+    python benchmarks/bench_miscFuncs.py [repeats]
+"""
+import os
+import sys
+import timeit
+import numpy as np
+
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'shardlib'))
+import miscFuncs as mf
+
+sizes = [10**3, 10**4, 10**5, 10**6]
+# the loop norm errors recalculate max(abs(analytical)) for every point
+maxQuadraticLoopPoints = 10**4
+rowFormat = '{0:<18}{1:>9}{2:>12.2e}{3:>12.2e}{4:>12.2e}{5:>9.0f}'
+
+
+def loopDotProd(a, b):
+    a = np.array(a)
+    b = np.array(b)
+    assert a.shape == b.shape
+    assert len(a.shape) == 1
+    return sum(np.prod([a, b], axis=0))
+
+
+def loopAbsoluteArea(x, y):
+    x = np.array(x)
+    y = np.array(y)
+    assert x.shape == y.shape
+    assert len(x.shape) == 1
+    assert min(x) >= 0
+    area = 0
+    for i in range(len(x) - 1):
+        a = x[i + 1] - x[i]
+        assert a >= 0
+        area += 0.5 * (abs(y[i]) + abs(y[i + 1])) * a
+    return area
+
+
+def loopNormErrors(analytical, analysis, domain, eSignFactor):
+    a = np.array(analytical)
+    f = np.array(analysis)
+    e = [float(fi - ai) / max(abs(a)) for ai, fi in zip(a, f)]
+    if eSignFactor == 'dotProd':
+        s = (-1 if loopDotProd(a, a) > loopDotProd(f, f) else 1)
+    else:
+        areaDiff = (loopAbsoluteArea(domain, f) -
+                    loopAbsoluteArea(domain, a))
+        s = (-1 if areaDiff < 0 else 1)
+    return np.array(e), s
+
+
+def loopMaxNormError(analytical, analysis, domain, eSignFactor):
+    errors, sign = loopNormErrors(analytical, analysis, domain, eSignFactor)
+    maxE = 0
+    for e in errors:
+        if abs(e) > abs(maxE):
+            maxE = e
+    return maxE
+
+
+def createData(size):
+    rs = np.random.RandomState(size)
+    angles = np.linspace(0, 360, size)
+    analytical = np.cos(np.radians(angles)) + 2
+    analysis = analytical + rs.normal(0, 0.01, size)
+    return angles, analytical, analysis
+
+
+def getKernels(angles, analytical, analysis):
+    args = (analytical, analysis, angles, 'areas')
+    f32 = [np.asarray(v, dtype=np.float32)
+           for v in (angles, analytical, analysis)]
+    return [
+        ('dotProd', False, lambda: loopDotProd(analysis, analysis),
+         lambda: mf.dotProd(analysis, analysis),
+         lambda: mf.dotProd(f32[2], f32[2], np.float32)),
+        ('calcAbsoluteArea', False,
+         lambda: loopAbsoluteArea(angles, analysis),
+         lambda: mf.calcAbsoluteArea(angles, analysis),
+         lambda: mf.calcAbsoluteArea(f32[0], f32[2], np.float32)),
+        ('calcNormErrors', True, lambda: loopNormErrors(*args),
+         lambda: mf.calcNormErrors(*args),
+         lambda: mf.calcNormErrors(f32[1], f32[2], f32[0], 'areas',
+                                   np.float32)),
+        ('calcMaxNormError', True, lambda: loopMaxNormError(*args),
+         lambda: mf.calcMaxNormError(*args),
+         lambda: mf.calcMaxNormError(f32[1], f32[2], f32[0], 'areas',
+                                     np.float32))]
+
+
+def timeKernel(func, repeats):
+    return min(timeit.repeat(func, number=1, repeat=repeats))
+
+
+def run(repeats=3):
+    print '{0:<18}{1:>9}{2:>12}{3:>12}{4:>12}{5:>9}'.format(
+        'kernel', 'points', 'loop [s]', 'f64 [s]', 'f32 [s]', 'speedup')
+    for size in sizes:
+        kernels = getKernels(*createData(size))
+        for name, quadratic, loop, f64, f32 in kernels:
+            if quadratic and size > maxQuadraticLoopPoints:
+                tLoop = np.nan
+            else:
+                tLoop = timeKernel(loop, 1 if size > 10**5 else repeats)
+            t64 = timeKernel(f64, repeats)
+            t32 = timeKernel(f32, repeats)
+            print rowFormat.format(name, size, tLoop, t64, t32, tLoop / t64)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
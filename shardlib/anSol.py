@@ -1,7 +1,16 @@
+import hashlib
+import collections
 from scipy.special import ellipe, ellipkm1
 import numpy as np
 import matplotlib.pyplot as plt
 
+maxCachedSolutions = 1024
+maxCachedUnitSolutions = 256
+maxCachedTables = 64
+tableTolerance = 1e-6
+minTableIntervals = 360
+maxTableIntervals = 360 * 2**8
+
 
 def calcK(axisA, axisB):
     assert axisA >= axisB
@@ -90,22 +99,361 @@ def calcK3(axisA, axisB, v, beta, omega, tao):
     return term1 * term2 / term3
 
 
+def calcBetaTerms(a, b, betas):
+    """
+    Returns the beta dependent terms shared by the SIF solutions,
+    (a**2 sin**2 + b**2 cos**2) and (a**4 sin**2 + b**4 cos**2), for
+    the array of betas in degrees.
+    """
+    betas = np.radians(np.asarray(betas, dtype=float))
+    sin2, cos2 = np.sin(betas)**2, np.cos(betas)**2
+    return betas, a**2 * sin2 + b**2 * cos2, a**4 * sin2 + b**4 * cos2
+
+
+def calcK1Array(axisA, axisB, betas, sigma):
+    """
+    Returns calcK1 for the array of betas, with the crack geometry
+    constants calculated once.
+    """
+    a, b = float(axisA) / 2, float(axisB) / 2
+    k = calcK(a, b)
+    betas, terms2, terms4 = calcBetaTerms(a, b, betas)
+    term1 = sigma * np.sqrt(np.pi * (b / a)) / ellipe(k)
+    return term1 * (terms4 / terms2)**0.25
+
+
+def calcK2Array(axisA, axisB, v, betas, omega, tao):
+    """
+    Returns calcK2 for the array of betas, with the crack geometry
+    constants calculated once.
+    """
+    a, b = float(axisA) / 2, float(axisB) / 2
+    omega = np.radians(omega)
+    k = calcK(a, b)
+    Q, R = calcQ(k, v), calcR(k, v)
+    betas, terms2, terms4 = calcBetaTerms(a, b, betas)
+    term1 = tao * np.sqrt(np.pi * b / a)
+    term2 = (b**2 * R * np.cos(betas) * np.cos(omega) +
+             a**2 * Q * np.sin(betas) * np.sin(omega))
+    return - term1 * term2 / (terms2**0.25 * terms4**0.25)
+
+
+def calcK3Array(axisA, axisB, v, betas, omega, tao):
+    """
+    Returns calcK3 for the array of betas, with the crack geometry
+    constants calculated once.
+    """
+    a, b = float(axisA) / 2, float(axisB) / 2
+    omega = np.radians(omega)
+    k = calcK(a, b)
+    Q, R = calcQ(k, v), calcR(k, v)
+    betas, terms2, terms4 = calcBetaTerms(a, b, betas)
+    term1 = tao * (1 - v) * np.sqrt(np.pi * b / a)
+    term2 = (a**2 * R * np.sin(betas) * np.cos(omega) -
+             b**2 * Q * np.cos(betas) * np.sin(omega))
+    return term1 * term2 / (terms2**0.25 * terms4**0.25)
+
+
 def calcAnSolWrapper(sifKey, majorAxis, minorAxis, v, betas,
                      gamma, omega, tensileStress):
+    """
+    Returns the analytical solution sifKey at the betas as an array.
+    """
     sigma, tao = calcStresses(tensileStress=tensileStress, gamma=gamma)
     if sifKey == 'K1':
-        return [
-            calcK1(
-                axisA=majorAxis,
-                axisB=minorAxis,
-                beta=beta,
-                sigma=sigma) for beta in betas]
+        return calcK1Array(axisA=majorAxis, axisB=minorAxis, betas=betas,
+                           sigma=sigma)
     elif sifKey == 'K2':
-        return [calcK2(axisA=majorAxis, axisB=minorAxis, v=v, beta=beta,
-                       omega=omega, tao=tao) for beta in betas]
+        return calcK2Array(axisA=majorAxis, axisB=minorAxis, v=v,
+                           betas=betas, omega=omega, tao=tao)
     elif sifKey == 'K3':
-        return [calcK3(axisA=majorAxis, axisB=minorAxis, v=v, beta=beta,
-                       omega=omega, tao=tao) for beta in betas]
+        return calcK3Array(axisA=majorAxis, axisB=minorAxis, v=v,
+                           betas=betas, omega=omega, tao=tao)
     else:
         raise KeyError(
             'Unrecognized analytical solution key {0}'.format(sifKey))
+
+
+def calcKArray(axisA, axisB):
+    """
+    calcK of arrays of crack axes.
+    """
+    axisA = np.asarray(axisA, dtype=float)
+    axisB = np.asarray(axisB, dtype=float)
+    assert np.all(axisA >= axisB)
+    assert np.all(axisB > 0)
+    return np.sqrt(1 - (axisB / axisA)**2)
+
+
+def calcQRArrays(k, v):
+    """
+    calcQ and calcR of arrays of k and v.
+    """
+    k = np.asarray(k, dtype=float)
+    v = np.asarray(v, dtype=float)
+    assert np.all(v > 0) and np.all(v <= 0.5)
+    assert np.all(k >= 0) and np.all(k < 1)
+    E = ellipe(k)
+    K = ellipkm1(1 - k)
+    k1sq = 1.0 - k**2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Q = np.where(k > 0, k**2 / (E * k**2 + v * k1sq * (E - K)),
+                     2.0 / np.pi)
+        R = np.where(k > 0, k**2 / ((k**2 - v) * E + v * k1sq * K),
+                     2.0 / (np.pi * (1 - v)))
+    return Q, R
+
+
+def calcStressesArray(tensileStress, gamma):
+    gamma = np.asarray(gamma, dtype=float) % 360
+    assert np.all(gamma >= 0) and np.all(gamma <= 90)
+    gamma = np.radians(gamma)
+    sigma = tensileStress * np.cos(gamma)**2
+    tao = tensileStress * (np.cos(gamma) * np.sin(gamma))
+    return sigma, tao
+
+
+def calcAnSolBatch(sifKey, majorAxes, minorAxes, vs, betas,
+                   gammas, omegas, tensileStresses):
+    """
+    Returns the analytical solution sifKey of many simulations at once.
+    The parameters are arrays with one value per simulation (or scalars
+    shared by all of them) and betas is either the angle grid shared by
+    all simulations or a (simulations, angles) array, e.g. ragged angles
+    padded with miscFuncs.padRows. Returns a (simulations, angles) array;
+    the values at padded angles are to be ignored.
+    """
+    if sifKey not in ['K1', 'K2', 'K3']:
+        raise KeyError(
+            'Unrecognized analytical solution key {0}'.format(sifKey))
+    a = np.asarray(majorAxes, dtype=float) / 2
+    b = np.asarray(minorAxes, dtype=float) / 2
+    k = calcKArray(a, b)
+    n = np.broadcast(a, b, vs, gammas, omegas, tensileStresses).shape
+    n = n if len(n) > 0 else (1,)
+    assert len(n) == 1
+    betas = np.asarray(betas, dtype=float)
+    if len(betas.shape) == 1:
+        betas = betas[np.newaxis, :]
+    assert len(betas.shape) == 2 and betas.shape[0] in [1, n[0]]
+
+    def column(x):
+        return np.broadcast_to(np.asarray(x, dtype=float), n)[:, np.newaxis]
+
+    a, b, k = column(a), column(b), column(k)
+    sigma, tao = calcStressesArray(column(tensileStresses), column(gammas))
+    betas, terms2, terms4 = calcBetaTerms(a, b, betas)
+    if sifKey == 'K1':
+        term1 = sigma * np.sqrt(np.pi * (b / a)) / ellipe(k)
+        return term1 * (terms4 / terms2)**0.25
+    v = column(vs)
+    omega = np.radians(column(omegas))
+    Q, R = calcQRArrays(k, v)
+    denominator = terms2**0.25 * terms4**0.25
+    if sifKey == 'K2':
+        term1 = tao * np.sqrt(np.pi * b / a)
+        term2 = (b**2 * R * np.cos(betas) * np.cos(omega) +
+                 a**2 * Q * np.sin(betas) * np.sin(omega))
+        return - term1 * term2 / denominator
+    term1 = tao * (1 - v) * np.sqrt(np.pi * b / a)
+    term2 = (a**2 * R * np.sin(betas) * np.cos(omega) -
+             b**2 * Q * np.cos(betas) * np.sin(omega))
+    return term1 * term2 / denominator
+
+
+def getAnglesFingerprint(betas):
+    betas = np.ascontiguousarray(betas, dtype=float)
+    return len(betas), hashlib.md5(betas.tostring()).hexdigest()
+
+
+class SolutionCache(object):
+    """
+    Results of calcAnSolWrapper per SIF, crack and load parameters and
+    angle array fingerprint in an LRU of at most maxSize solutions. The
+    cached arrays are read-only, so callers with the same parameters
+    share them.
+    """
+
+    def __init__(self, maxSize=maxCachedSolutions):
+        assert maxSize >= 1
+        self.maxSize = maxSize
+        self.solutions = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def getKey(self, sifKey, majorAxis, minorAxis, v, betas, gamma, omega,
+               tensileStress):
+        return (sifKey, majorAxis, minorAxis, v, gamma, omega,
+                tensileStress, getAnglesFingerprint(betas))
+
+    def getSolution(self, sifKey, majorAxis, minorAxis, v, betas,
+                    gamma, omega, tensileStress):
+        key = self.getKey(sifKey, majorAxis, minorAxis, v, betas,
+                          gamma, omega, tensileStress)
+        if key in self.solutions:
+            solution = self.solutions.pop(key)
+            self.solutions[key] = solution
+            self.hits += 1
+            return solution
+        self.misses += 1
+        solution = np.asarray(calcAnSolWrapper(
+            sifKey=sifKey, majorAxis=majorAxis, minorAxis=minorAxis, v=v,
+            betas=betas, gamma=gamma, omega=omega,
+            tensileStress=tensileStress))
+        solution.flags.writeable = False
+        while len(self.solutions) >= self.maxSize:
+            self.solutions.popitem(last=False)
+        self.solutions[key] = solution
+        return solution
+
+    def clear(self):
+        self.solutions.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class UnitSolutionCache(SolutionCache):
+    """
+    Analytical solutions for a unit tensile stress. K1 scales with sigma
+    and K2 and K3 with tao, both linear in the tensile stress, so the
+    solution for any stress is the unit solution multiplied by the
+    stress.
+    """
+
+    def __init__(self, maxSize=maxCachedUnitSolutions):
+        SolutionCache.__init__(self, maxSize)
+
+    def getUnitSolution(self, sifKey, majorAxis, minorAxis, v, betas,
+                        gamma, omega):
+        return SolutionCache.getSolution(
+            self, sifKey, majorAxis, minorAxis, v, betas, gamma, omega, 1.0)
+
+    def getSolution(self, sifKey, majorAxis, minorAxis, v, betas,
+                    gamma, omega, tensileStress):
+        return tensileStress * self.getUnitSolution(
+            sifKey, majorAxis, minorAxis, v, betas, gamma, omega)
+
+
+solutionCache = SolutionCache()
+unitSolutionCache = UnitSolutionCache()
+
+
+def calcAnSolCached(sifKey, majorAxis, minorAxis, v, betas,
+                    gamma, omega, tensileStress):
+    """
+    calcAnSolWrapper memoized by solutionCache. The returned array is
+    read-only.
+    """
+    return solutionCache.getSolution(sifKey, majorAxis, minorAxis, v,
+                                     betas, gamma, omega, tensileStress)
+
+
+def clearSolutionCache():
+    solutionCache.clear()
+
+
+def clearUnitSolutionCache():
+    unitSolutionCache.clear()
+
+
+class SolutionTable(object):
+    """
+    Analytical solution sifKey for a unit tensile stress tabulated on a
+    uniform beta grid over [0, 360]. The grid is refined until the
+    linear interpolation error, checked at the interval midpoints, is at
+    most tolerance times the largest absolute value of the solution. If
+    maxTableIntervals is reached first the solution is not tabulated and
+    getSolution evaluates the closed form.
+    """
+
+    def __init__(self, sifKey, majorAxis, minorAxis, v, gamma, omega,
+                 tolerance=tableTolerance):
+        self.sifKey = sifKey
+        self.params = {'majorAxis': majorAxis, 'minorAxis': minorAxis,
+                       'v': v, 'gamma': gamma, 'omega': omega}
+        self.tolerance = tolerance
+        self.grid, self.values, self.maxError = None, None, None
+        self.createTable()
+
+    def calcUnitSolution(self, betas):
+        return np.asarray(calcAnSolWrapper(
+            sifKey=self.sifKey, betas=betas, tensileStress=1.0,
+            **self.params), dtype=float)
+
+    def createTable(self):
+        numInts = minTableIntervals
+        grid = np.linspace(0, 360, numInts + 1)
+        values = self.calcUnitSolution(grid)
+        while numInts <= maxTableIntervals:
+            fineGrid = np.linspace(0, 360, 2 * numInts + 1)
+            fineValues = self.calcUnitSolution(fineGrid)
+            error = np.max(np.abs(
+                fineValues[1::2] - 0.5 * (values[:-1] + values[1:])))
+            if error <= self.tolerance * np.max(np.abs(fineValues)):
+                self.grid, self.values, self.maxError = grid, values, error
+                self.grid.flags.writeable = False
+                self.values.flags.writeable = False
+                return
+            numInts *= 2
+            grid, values = fineGrid, fineValues
+
+    def isTabulated(self):
+        return self.grid is not None
+
+    def getSolution(self, betas, tensileStress=1.0):
+        if not self.isTabulated():
+            return tensileStress * self.calcUnitSolution(betas)
+        betas = np.mod(np.asarray(betas, dtype=float), 360)
+        return tensileStress * np.interp(betas, self.grid, self.values)
+
+
+class SolutionTableCache(object):
+    """
+    SolutionTables per SIF and crack parameters in an LRU of at most
+    maxSize tables.
+    """
+
+    def __init__(self, maxSize=maxCachedTables):
+        assert maxSize >= 1
+        self.maxSize = maxSize
+        self.tables = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def getTable(self, sifKey, majorAxis, minorAxis, v, gamma, omega):
+        key = (sifKey, float(majorAxis), float(minorAxis), float(v),
+               float(gamma), float(omega))
+        if key in self.tables:
+            table = self.tables.pop(key)
+            self.tables[key] = table
+            self.hits += 1
+            return table
+        self.misses += 1
+        table = SolutionTable(sifKey, majorAxis, minorAxis, v, gamma, omega)
+        while len(self.tables) >= self.maxSize:
+            self.tables.popitem(last=False)
+        self.tables[key] = table
+        return table
+
+    def clear(self):
+        self.tables.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+solutionTables = SolutionTableCache()
+
+
+def calcAnSolTable(sifKey, majorAxis, minorAxis, v, betas,
+                   gamma, omega, tensileStress):
+    """
+    Table mode of calcAnSolWrapper: interpolates the tabulated solution
+    at betas instead of evaluating the closed form.
+    """
+    table = solutionTables.getTable(
+        sifKey, majorAxis, minorAxis, v, gamma, omega)
+    return table.getSolution(betas, tensileStress)
+
+
+def clearSolutionTables():
+    solutionTables.clear()
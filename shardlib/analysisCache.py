@@ -0,0 +1,166 @@
+import os
+import shelve
+import anydbm
+import atexit
+import hashlib
+import collections
+import cPickle as pickle
+import dbaccess as dba
+
+cacheDirName = 'analysisCache'
+maxCachedAnalyses = 512
+# disk cache files of another format are removed
+cacheFormat = 2
+diskErrors = (IOError, OSError) + anydbm.error
+# file extensions the anydbm modules add to the shelve name
+diskExtensions = ('.dat', '.dir', '.bak', '.db', '.pag')
+
+
+class AnalysisCache(object):
+    """
+    Computed analysis states per simId in two tiers: an in-memory LRU of
+    at most maxSize states and a shelve per database on disk. Both tiers
+    are keyed by simId, the database fingerprint and the analysis
+    settings, so a state is computed once per record per repository
+    version. simIds whose database cannot be fingerprinted are not
+    cached. A key is computed before the record is read and passed to
+    put, so a state is never stored under a newer fingerprint than the
+    data it was calculated from. If the disk cache cannot be opened or
+    written the cache keeps states in memory only.
+    """
+
+    def __init__(self, maxSize=maxCachedAnalyses):
+        assert maxSize >= 1
+        self.maxSize = maxSize
+        self.memory = collections.OrderedDict()
+        self.diskDbs = {}
+        self.memoryHits = 0
+        self.diskHits = 0
+        self.misses = 0
+
+    def getKey(self, simId, settings):
+        if not isinstance(simId, basestring) or dba.unionSym not in simId:
+            return None
+        dbName = dba.splitUniqueEntryKey(simId)[0]
+        try:
+            path, fingerprint = dba.getShelveVersion(dbName)
+        except (IOError, OSError):
+            return None
+        if not path:
+            return None
+        return dbName, fingerprint, repr((simId, settings)), path
+
+    def get(self, simId, settings, key=None):
+        if key is None:
+            key = self.getKey(simId, settings)
+        if key is None:
+            return None
+        dbName, fingerprint, diskKey, path = key
+        memoryKey = (path, fingerprint, diskKey)
+        if memoryKey in self.memory:
+            state = self.memory.pop(memoryKey)
+            self.memory[memoryKey] = state
+            self.memoryHits += 1
+            return state
+        disk = self.getDiskCache(dbName, fingerprint)
+        state = None
+        if disk is not None:
+            try:
+                if disk.has_key(diskKey):
+                    state = disk[diskKey]
+            except diskErrors:
+                self.disableDiskCache(dbName)
+        if state is not None:
+            self.addToMemory(memoryKey, state)
+            self.diskHits += 1
+            return state
+        self.misses += 1
+        return None
+
+    def put(self, simId, settings, state, key=None):
+        if key is None:
+            key = self.getKey(simId, settings)
+        if key is None:
+            return
+        dbName, fingerprint, diskKey, path = key
+        self.addToMemory((path, fingerprint, diskKey), state)
+        disk = self.getDiskCache(dbName, fingerprint)
+        if disk is not None:
+            try:
+                disk[diskKey] = state
+            except diskErrors:
+                self.disableDiskCache(dbName)
+
+    def addToMemory(self, memoryKey, state):
+        self.memory.pop(memoryKey, None)
+        while len(self.memory) >= self.maxSize:
+            self.memory.popitem(last=False)
+        self.memory[memoryKey] = state
+
+    def getDiskCache(self, dbName, fingerprint):
+        """
+        Returns the disk cache shelve of the current version of database
+        dbName, removing the caches of older versions, or None if the
+        cache cannot be written.
+        """
+        cached = self.diskDbs.get(dbName)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        self.closeDiskCache(dbName)
+        cacheDir = os.path.join(
+            dba.discoveryCache.getRepoDir(), dbName, cacheDirName)
+        name = '{0}_{1}_{2}'.format(
+            dbName, cacheFormat, hashlib.md5(fingerprint).hexdigest()[:16])
+        try:
+            if not os.path.exists(cacheDir):
+                os.makedirs(cacheDir)
+            for f in os.listdir(cacheDir):
+                base, ext = os.path.splitext(f)
+                if (base if ext in diskExtensions else f) != name:
+                    os.remove(os.path.join(cacheDir, f))
+            disk = shelve.open(os.path.join(cacheDir, name), 'c',
+                               protocol=pickle.HIGHEST_PROTOCOL)
+        except diskErrors:
+            print 'Could not open the analysis cache of {0}'.format(dbName)
+            disk = None
+        self.diskDbs[dbName] = (fingerprint, disk)
+        return disk
+
+    def disableDiskCache(self, dbName):
+        print 'Could not use the analysis cache of {0}'.format(dbName)
+        fingerprint, disk = self.diskDbs[dbName]
+        self.diskDbs[dbName] = (fingerprint, None)
+        try:
+            disk.close()
+        except diskErrors:
+            pass
+
+    def closeDiskCache(self, dbName):
+        fingerprint, disk = self.diskDbs.pop(dbName, (None, None))
+        if disk is not None:
+            try:
+                disk.close()
+            except diskErrors:
+                pass
+
+    def clearMemory(self):
+        self.memory.clear()
+
+    def closeAll(self):
+        for dbName in list(self.diskDbs.keys()):
+            self.closeDiskCache(dbName)
+
+    def clear(self):
+        self.closeAll()
+        self.clearMemory()
+        self.memoryHits = 0
+        self.diskHits = 0
+        self.misses = 0
+
+
+cache = AnalysisCache()
+atexit.register(cache.closeAll)
+
+
+def clearAnalysisCache():
+    cache.clear()
@@ -26,10 +26,7 @@ class PSCCompAnalysis(object):
     def divideSimIds(self, limD, limH):
         self.d = limD
         self.h = limH
-        for s in self.sims:
-            ad = dp.AnalysisData(s)
-            ad.calcAnSol()
-            ad.calculateStats()
+        for s, ad in dp.iterAnalysisData(self.sims):
             simD = ad.getContainerDiam()
             simH = ad.getContainerHeight()
             errs = ad.getErrorReports()[self.errType][self.sif]
@@ -15,10 +15,33 @@ from compAnalysisBase import CompAnalysisBase
 
 class SIMCompAnalysis(CompAnalysisBase):
 
-    def __init__(self, leavesQueue, criteria, sifs):
+    def __init__(self, leavesQueue, criteria, sifs, workers=1):
+        assert workers >= 1
         self.queue = leavesQueue
         self.sifs = sifs
         self.crit = criteria
+        self.workers = workers
+        self.nodesData = {}
+
+    def calcNodesData(self, nodes):
+        """
+        Performs the node operations of all nodes at once in a pool of
+        self.workers processes. Does nothing with a single worker.
+        """
+        nodes = [n for n in nodes if id(n) not in self.nodesData]
+        if self.workers == 1 or len(nodes) == 0:
+            return
+        nodesData = dp.performNodesOperations(
+            nodes, self.sifs, workers=self.workers)
+        for node, adn in zip(nodes, nodesData):
+            self.nodesData[id(node)] = adn
+
+    def getAnalysisNodeData(self, node):
+        adn = self.nodesData.get(id(node))
+        if adn is None:
+            return dp.getNodeData(node, self.sifs)
+        adn.update()
+        return adn
 
     def printQueueItems(self, items):
         self.queue.printTitle()
@@ -59,6 +82,7 @@ class BoxCompPlot(SIMCompAnalysis):
         dataDict = {s: {} for s in self.sifs}
         est = {i: {} for i in self.items}
         dd = self.getItemNodeDict(self.items, self.queue)
+        self.calcNodesData([dd[i] for i in self.items])
         for i in self.items:
             node = dd[i]
             errs, est[i] = self.getNodeErrsEst(node)
@@ -68,8 +92,7 @@ class BoxCompPlot(SIMCompAnalysis):
         self.dataDicts = [dataDict]
 
     def getNodeErrsEst(self, node):
-        adn = dp.AnalysisNodeData(node, self.sifs)
-        adn.performOperations()
+        adn = self.getAnalysisNodeData(node)
         est = adn.getEstimates()[self.crit[0]]
         errs = adn.getErrors()[self.errType]
         return errs, est
@@ -94,6 +117,7 @@ class HistCompPlot(SIMCompAnalysis):
 
     def createDataDict(self):
         data = {s: {} for s in self.sifs}
+        self.calcNodesData(self.dataStr[0][0].values())
         for i in self.items.keys():
             node = self.dataStr[0][0][i]
             errs = self.getNodeErrors(node)
@@ -102,8 +126,7 @@ class HistCompPlot(SIMCompAnalysis):
         self.dataDicts = [data]
 
     def getNodeErrors(self, node):
-        adn = dp.AnalysisNodeData(node, self.sifs)
-        adn.performOperations()
+        adn = self.getAnalysisNodeData(node)
         errs = adn.getErrors()[self.errType]
         return errs
 
@@ -166,6 +189,7 @@ class CorrCompPlot(SIMCompAnalysis):
     def createDataDict(self):
         dataX = {s: {} for s in self.sifs}
         dataY = {s: {} for s in self.sifs}
+        self.calcNodesData([self.dataStr[0][0][i] for i in self.items])
         for i in self.items:
             node = self.dataStr[0][0][i]
             anSol, res = self.getNodeParams(node)
@@ -175,8 +199,7 @@ class CorrCompPlot(SIMCompAnalysis):
         self.dataDicts = [[dataX, dataY]]
 
     def getNodeParams(self, node):
-        adn = dp.AnalysisNodeData(node, self.sifs)
-        adn.performOperations()
+        adn = self.getAnalysisNodeData(node)
         anSol = adn.getAnSol()
         res = adn.getDataByType(self.qt)
         return anSol, res
@@ -285,13 +308,13 @@ class RangeCompPlot(SIMCompAnalysis):
 
     def createDataDict(self):
         self.dataDicts = []
+        self.calcNodesData([item[0].values()[0] for item in self.dataStr])
         for item in self.dataStr:
             node = item[0].values()[0]
             self.dataDicts.append(self.getNodeParams(node))
 
     def getNodeParams(self, node):
-        adn = dp.AnalysisNodeData(node, self.sifs)
-        adn.performOperations()
+        adn = self.getAnalysisNodeData(node)
         angles = adn.getAngles()
         results = adn.getResults()
         ansol = adn.getAnSol()
@@ -365,9 +388,7 @@ class RangeCompPlot(SIMCompAnalysis):
     def createOptSimPlot(self):
         for n in range(len(self.dataDicts)):
             i = self.getItemKey(n)
-            ad = dp.AnalysisData(self.dataStr[n][1])
-            ad.calcAnSol()
-            ad.calculateStats()
+            ad = dp.getAnalysisData(self.dataStr[n][1])
             angles = ad.getAngles()
             for sif in self.sifs:
                 ax = self.getAxes(i, sif)
@@ -400,10 +421,10 @@ class RangeCompPlot(SIMCompAnalysis):
     def createAnSolPlot(self):
         for n in range(len(self.items.keys())):
             i = self.getItemKey(n)
+            adn = self.getAnalysisNodeData(self.dataStr[n][0].values()[0])
             for sif in self.sifs:
                 ax = self.getAxes(i, sif)
-                angles = self.dataDicts[n][0]
-                anSol = self.dataDicts[n][2][sif]
+                angles, anSol = adn.getAnSolCurve(sif)
                 ax.plot(angles, anSol, 'k', lw=2,
                         label='analytical')
 
@@ -515,14 +536,15 @@ class BoundsCompPlot(SIMCompAnalysis):
 
     def createDataDicts(self):
         self.dataDicts = []
+        self.calcNodesData([self.dataStr[n][0][self.items[n]]
+                            for n in range(len(self.items))])
         for n in range(len(self.items)):
             i = self.items[n]
             log = {s: {t: {'sigma': [], 'pip': []}
                        for t in self.targets.keys()}
                    for s in self.sifs}
             node = self.dataStr[n][0][i]
-            adn = dp.AnalysisNodeData(node, self.sifs)
-            adn.performOperations()
+            adn = self.getAnalysisNodeData(node)
             sigmaUp = 2 * adn.getAnSolParams()['sigma']
             sigmaLow = 0
             for s in self.sifs:
@@ -596,14 +618,11 @@ class BoundsCompPlot(SIMCompAnalysis):
                         label='inside bounds', alpha=alpha)
                 ax.plot(outs[0], outs[1], 'r.',
                         label='outside bounds', alpha=alpha)
-                angles = adn.getAngles()
-                anSol = adn.getAnSol()[s]
+                angles, anSol = adn.getAnSolCurve(s)
                 ax.plot(angles, anSol, 'k', lw=1.5,
                         label='analytical')
-                lowerBound = adn.calcSIFsForSigmaAndSIF(
-                    sigmaLower, s)
-                upperBound = adn.calcSIFsForSigmaAndSIF(
-                    sigmaUpper, s)
+                lowerBound = adn.getAnSolCurve(s, angles, sigmaLower)[1]
+                upperBound = adn.getAnSolCurve(s, angles, sigmaUpper)[1]
                 ax.plot(angles, upperBound, 'lime', lw=1.5,
                         label='bounds')
                 ax.plot(angles, lowerBound, 'lime', lw=1.5)
@@ -89,10 +89,8 @@ class CompAnalysisBase(object):
         if simKey == []:
             return {s: [] for s in self.sifs}
         elif isinstance(simKey, list) and len(simKey) == 1:
-            ad = dp.AnalysisData(simKey[0])
-            ad.calcAnSol()
-            ad.calculateStats()
-            errs = ad. getErrorReports()[self.errType]
+            ad = dp.getAnalysisData(simKey[0], metrics=[self.errType])
+            errs = ad.getErrorReports()[self.errType]
             return {sif: errs[sif] for sif in self.sifs}
 
 # figure
@@ -1,8 +1,28 @@
+import collections
+import multiprocessing
 import numpy as np
 import dbaccess as dba
 import miscFuncs as mf
 import anSol
+import resultsStore as rs
+import analysisCache
 import matplotlib.pyplot as plt
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# nodes with at least this many aggregated points report their memory use
+largeNodePoints = 100000
+# records whose statistics are calculated together by iterAnalysisData
+statsBatchSize = 256
+anSolParamKeys = ['a', 'b', 'v', 'gamma', 'omega', 'sigma']
+# outermost contours left out of the averaged results
+excludedContours = 2
+# points of the analytical curves of the plots
+anSolCurvePoints = 721
+maxRegisteredNodes = 64
+nodeDataRegistry = collections.OrderedDict()
 
 
 class AnalysisData(object):
@@ -15,8 +35,13 @@ class AnalysisData(object):
                 'K2',
                 'K3'],
             loadFromDb=True,
-            eSignFactor='areas'):
+            eSignFactor='areas',
+            entryData=None,
+            projection=None,
+            resultsStore=None):
         self.uek = uniqueEntryKey
+        self.projection = projection
+        self.resultsStore = resultsStore
         self.eSignFactor = eSignFactor  # 'dotProd'
         self.data = {
             'a': None,
@@ -43,19 +68,23 @@ class AnalysisData(object):
             'allEdges': None,
             'crackEdges': None}
         self.sifs = sifs
-        self.errors = {'areaDiff': {}, 'dotProd': {}, 'difference': {},
-                       'avgNormError': {}, 'maxNormError': {}, 'rmsd': {}}
+        self.errors = self.createErrorReports({
+            'areaDiff': {}, 'dotProd': {}, 'difference': {},
+            'avgNormError': {}, 'maxNormError': {}, 'rmsd': {}})
         self.calculatedErrors = False
         self.anSol = {}
         self.results = {}
         self.angles = []
         self.rawres = {}
-        if loadFromDb:
+        self.contourStacks = {}
+        if entryData is not None:
+            self.extractDataFromEntry(entryData)
+        elif loadFromDb:
             self.extractDataFromDb()
 
     def calcAnSol(self):
         for sif in self.sifs:
-            self.anSol[sif] = anSol.calcAnSolWrapper(
+            self.anSol[sif] = anSol.calcAnSolCached(
                 sifKey=sif,
                 majorAxis=self.data['a'],
                 minorAxis=self.data['b'],
@@ -66,30 +95,142 @@ class AnalysisData(object):
                 tensileStress=self.data['sigma'])
 
     def extractDataFromDb(self):
-        data = dba.getEntryData(self.uek)
-        for key in self.data.keys():
-            self.data[key] = dba.extractDataFromEntry(data, key)
+        self.extractDataFromEntry(dba.getEntryData(self.uek))
+
+    def getFieldsToExtract(self):
+        """
+        Returns the data keys and whether the results are extracted.
+        A projection limits the extraction to its keys, e.g. 'tree' or
+        'mesh' in dbaccess.fieldProjections.
+        """
+        if self.projection is None:
+            return self.data.keys(), True
+        fields = dba.getProjectionFields(self.projection)
+        return [k for k in fields if k in self.data], 'angles' in fields
+
+    def getStoredResults(self):
+        """
+        Returns the angles and contour stacks from the exported results
+        store of the database, or None if the record is not in a store.
+        A resultsStore of False skips the store lookup.
+        """
+        store = self.resultsStore
+        if store is None:
+            store = rs.findStore(self.uek)
+        if not store:
+            return None
+        return store.getContourStacks(
+            dba.splitUniqueEntryKey(self.uek)[1], self.sifs)
+
+    def extractDataFromEntry(self, data):
+        keys, loadResults = self.getFieldsToExtract()
+        stored = self.getStoredResults() if loadResults else None
+        if loadResults and stored is None:
+            fields = dba.extractFields(data, keys + ['angles'] + self.sifs)
+        else:
+            fields = dba.extractFields(data, keys)
+        for key in keys:
+            self.data[key] = fields[key]
+        if loadResults and self.data['analysisSuccess']:
+            if stored is not None:
+                self.angles = stored[0]
+                self.contourStacks.update(stored[1])
+            else:
+                self.angles = fields['angles']
+                for sif in self.sifs:
+                    self.rawres[sif] = fields[sif]
+
+    def calculateStats(self, metrics=None, sifs=None):
+        """
+        Calculates the error reports metrics of sifs, all of them by
+        default. The error reports not calculated yet are calculated on
+        their first access.
+        """
         if self.data['analysisSuccess']:
-            self.angles = dba.extractDataFromEntry(data, 'angles')
-            for sif in self.sifs:
-                self.rawres[sif] = dba.extractDataFromEntry(data, sif)
-
-    def calculateStats(self):
-        if self.data['analysisSuccess'] and not self.calculatedErrors:
-            for sif in self.sifs:
-                self.results[sif] = mf.contourAveraging(
-                    self.rawres[sif], len(self.rawres[sif].keys()) - 2)
-                for e in self.errors.keys():
-                    try:
-                        self.errors[e][sif] = mf.calcStatsWrapper(
-                            statKey=e, angles=self.angles,
-                            analytical=self.anSol[sif],
-                            analysis=self.results[sif],
-                            eSign=self.eSignFactor)
-                    except ZeroDivisionError:
-                        self.errors[e][sif] = float('NaN')
+            metrics = self.errors.keys() if metrics is None else metrics
+            for sif in (self.sifs if sifs is None else sifs):
+                missing = [e for e in metrics if sif not in self.errors[e]]
+                if len(missing) == 0:
+                    continue
+                if sif not in self.results:
+                    self.averageContours(sif)
+                self.setErrors(sif, mf.calcStats(
+                    self.angles, self.anSol[sif], self.results[sif],
+                    metrics=missing, eSigns=[self.eSignFactor]), missing)
         self.calculatedErrors = True
 
+    def hasErrors(self, metrics=None):
+        """
+        Returns True if the error reports metrics (all by default) of all
+        SIFs are calculated.
+        """
+        if not self.calculatedErrors:
+            return False
+        if not self.data['analysisSuccess']:
+            return True
+        metrics = self.errors.keys() if metrics is None else metrics
+        return all(sif in self.errors[e] for e in metrics for sif in self.sifs)
+
+    def createErrorReports(self, errors):
+        return dict((e, LazyErrorReport(self, e, errors[e])) for e in errors)
+
+    def averageContours(self, sif):
+        self.results[sif] = self.calcContourEstimates(sif, ['mean'])['mean']
+
+    def getContourStack(self, sif):
+        """
+        Returns the sorted contour keys and the contours of sif stacked in
+        a 2-D (contour, angle) array, which is built once per record. The
+        contours of an instance restored from the analysis cache are read
+        on first use.
+        """
+        if sif not in self.contourStacks and sif not in self.rawres:
+            self.loadContours()
+        if sif not in self.contourStacks:
+            self.contourStacks[sif] = mf.stackContours(self.rawres[sif])
+        return self.contourStacks[sif]
+
+    def loadContours(self):
+        stored = self.getStoredResults()
+        if stored is not None:
+            self.contourStacks.update(stored[1])
+            return
+        fields = dba.extractFields(dba.getEntryData(self.uek), self.sifs)
+        for sif in self.sifs:
+            self.rawres[sif] = fields[sif]
+
+    def calcContourEstimates(self, sif, estimators=None, numCont=None,
+                             start=None):
+        """
+        Returns miscFuncs.calcContourEstimates of the contours of sif.
+        The window leaves out excludedContours contours by default.
+        """
+        stack = self.getContourStack(sif)[1]
+        if numCont is None:
+            numCont = len(stack) - excludedContours
+        return mf.calcContourEstimates(stack, numCont, estimators, start)
+
+    def setErrors(self, sif, stats, metrics=None):
+        for e in (self.errors.keys() if metrics is None else metrics):
+            try:
+                self.errors[e][sif] = mf.getStat(stats, e, self.eSignFactor)
+            except ZeroDivisionError:
+                self.errors[e][sif] = float('NaN')
+
+    def getCacheState(self):
+        return {'data': dict(self.data), 'angles': np.array(self.angles),
+                'anSol': dict(self.anSol), 'results': dict(self.results),
+                'errors': dict((e, dict(self.errors[e])) for e in self.errors),
+                'calculatedErrors': self.calculatedErrors}
+
+    def setCacheState(self, state):
+        self.data = dict(state['data'])
+        self.angles = state['angles']
+        self.anSol = dict(state['anSol'])
+        self.results = dict(state['results'])
+        self.errors = self.createErrorReports(state['errors'])
+        self.calculatedErrors = state['calculatedErrors']
+
     def getAnalysisSuccess(self):
         assert self.data['analysisSuccess'] is not None
         return self.data['analysisSuccess']
@@ -110,6 +251,17 @@ class AnalysisData(object):
         params = ['a', 'b', 'omega', 'gamma', 'sigma', 'v']
         return {key: self.data[key] for key in params}
 
+    def getAnSolCurve(self, sif, betas=None, sigma=None):
+        params = dict(self.getAnSolParams())
+        if sigma is not None:
+            params['sigma'] = sigma
+        return calcAnSolCurve(params, sif, self.getCurveAngles(betas))
+
+    def getCurveAngles(self, betas=None):
+        if betas is None:
+            betas = createCurveAngles(self.angles)
+        return betas
+
     def getCrackRatio(self):
         return self.data['crackRatio']
 
@@ -157,6 +309,27 @@ class AnalysisData(object):
             'allEdges': self.data['allEdges']}
 
 
+class LazyErrorReport(dict):
+    """
+    The values of error report statKey of an AnalysisData per SIF. A
+    missing SIF of a successful analysis is calculated on its first
+    access, once the statistics have been requested with calculateStats.
+    """
+
+    def __init__(self, analysisData, statKey, values):
+        dict.__init__(self, values)
+        self.analysisData = analysisData
+        self.statKey = statKey
+
+    def __missing__(self, sif):
+        ad = self.analysisData
+        if (sif not in ad.sifs or not ad.calculatedErrors or
+                not ad.data['analysisSuccess']):
+            raise KeyError(sif)
+        ad.calculateStats([self.statKey], [sif])
+        return dict.__getitem__(self, sif)
+
+
 class AnalysisNodeData(object):
 
     def __init__(self, node, sifs, eSignFactor='areas'):
@@ -167,10 +340,10 @@ class AnalysisNodeData(object):
         self.angles = np.array([])
         self.results = {s: np.array([]) for s in self.sifs}
         self.anSol = {s: np.array([]) for s in self.sifs}
-        self.anSolParams = {
-            'a': set([]), 'b': set([]),
-            'omega': set([]), 'gamma': set([]),
-            'sigma': set([]), 'v': set([])}
+        self.clearChunks()
+        self.contributions = collections.OrderedDict()
+        self.unitSIFs = {}
+        self.clearAnSolParams()
         self.errors = {}
         self.estimates = {
             e: {} for e in [
@@ -180,8 +353,55 @@ class AnalysisNodeData(object):
                 'maxNormError',
                 'rmsd']}
 
-    def performOperations(self):
-        self.extractDataFromSims()
+    def performOperations(self, analysisData=None):
+        """
+        analysisData is an optional dict of calculated AnalysisData per
+        simId, e.g. from calcAnalysisData, used instead of reading and
+        calculating the simulations of the node.
+        """
+        if analysisData is None:
+            self.extractDataFromSims()
+        else:
+            self.extractDataFromAnalysisData(analysisData)
+        self.fixAngleValues()
+        self.sortDataByAnglesData()
+        self.verifyAnSolParams()
+        self.calcErrors()
+        self.calcEstimates()
+        self.reportMemoryUsage()
+
+    def update(self):
+        """
+        Brings the node data up to date with the successful members of
+        the node, e.g. after a simulation has been assigned as failed.
+        The members that left the node are dropped, only the new ones are
+        read and calculated and the node data is aggregated again from
+        the kept contributions. Returns True if the node data changed.
+        """
+        members = set(self.node.getSuccessfulMembers())
+        removed = [sim for sim in self.contributions if sim not in members]
+        added = members.difference(self.contributions)
+        if len(removed) == 0 and len(added) == 0:
+            return False
+        for sim in removed:
+            del self.contributions[sim]
+        self.clearChunks()
+        self.clearAnSolParams()
+        for sim, ad in iterAnalysisData(added, self.sifs, self.eSignFactor):
+            self.addAnalysisData(ad, sim)
+        self.aggregateContributions()
+        return True
+
+    def aggregateContributions(self):
+        self.angles = np.array([])
+        self.results = {s: np.array([]) for s in self.sifs}
+        self.anSol = {s: np.array([]) for s in self.sifs}
+        self.clearChunks()
+        self.clearAnSolParams()
+        for angles, results, anSol, params in self.contributions.values():
+            self.addChunks(angles, results, anSol)
+            self.addAnSolParams(params)
+        self.concatenateChunks()
         self.fixAngleValues()
         self.sortDataByAnglesData()
         self.verifyAnSolParams()
@@ -190,27 +410,75 @@ class AnalysisNodeData(object):
 
     def extractDataFromSims(self):
         simsS = self.node.getSuccessfulMembers()
-        for sim in simsS:
-            self.extractDataFromSimId(sim)
-
-    def extractDataFromSimId(self, simId):
-        ad = AnalysisData(simId)
+        stores = {}
+        for sim, entryData in dba.iterEntriesData(simsS):
+            self.extractDataFromSimId(
+                sim, entryData, findResultsStore(stores, sim))
+        self.concatenateChunks()
+
+    def extractDataFromSimId(self, simId, entryData=None, resultsStore=None):
+        ad = AnalysisData(simId, entryData=entryData,
+                          resultsStore=resultsStore)
         ad.calcAnSol()
         ad.calculateStats()
-        self.angles = np.concatenate(
-            (self.angles, ad.getAngles()))
+        self.addAnalysisData(ad, simId)
+
+    def extractDataFromAnalysisData(self, analysisData):
+        for sim in sorted(self.node.getSuccessfulMembers()):
+            self.addAnalysisData(analysisData[sim], sim)
+        self.concatenateChunks()
+
+    def addAnalysisData(self, ad, simId):
+        """
+        Adds the data of simulation simId to the chunks and keeps it as
+        the contribution of simId for update.
+        """
+        contribution = (
+            ad.getAngles(),
+            {s: ad.getResults()[s] for s in self.sifs},
+            {s: ad.getAnSol()[s] for s in self.sifs},
+            ad.getAnSolParams())
+        self.contributions[simId] = contribution
+        self.addChunks(*contribution[:3])
+        self.extractAnSolParams(ad)
+
+    def addChunks(self, angles, results, anSol):
+        self.angleChunks.append(angles)
+        for s in self.sifs:
+            self.resultChunks[s].append(results[s])
+            self.anSolChunks[s].append(anSol[s])
+
+    def clearChunks(self):
+        self.angleChunks = []
+        self.resultChunks = {s: [] for s in self.sifs}
+        self.anSolChunks = {s: [] for s in self.sifs}
+
+    def concatenateChunks(self):
+        """
+        Appends the data collected from the simulations to the node data
+        with a single concatenation per array.
+        """
+        self.angles = np.concatenate([self.angles] + self.angleChunks)
         for s in self.sifs:
             self.results[s] = np.concatenate(
-                (self.results[s], ad.getResults()[s]))
+                [self.results[s]] + self.resultChunks[s])
             self.anSol[s] = np.concatenate(
-                (self.anSol[s], ad.getAnSol()[s]))
-        self.extractAnSolParams(ad)
+                [self.anSol[s]] + self.anSolChunks[s])
+        self.clearChunks()
 
     def extractAnSolParams(self, ad):
-        params = ad.getAnSolParams()
+        self.addAnSolParams(ad.getAnSolParams())
+
+    def addAnSolParams(self, params):
         for key in params.keys():
             self.anSolParams[key].add(params[key])
 
+    def clearAnSolParams(self):
+        self.anSolParams = {
+            'a': set([]), 'b': set([]),
+            'omega': set([]), 'gamma': set([]),
+            'sigma': set([]), 'v': set([])}
+
     def verifyAnSolParams(self):
         for key in self.anSolParams.keys():
             assert len(self.anSolParams[key]) == 1
@@ -220,11 +488,28 @@ class AnalysisNodeData(object):
         self.angles = np.array(self.angles) % 360
 
     def sortDataByAnglesData(self):
+        self.unitSIFs = {}
         ind = np.argsort(self.angles)
-        self.angles = np.sort(self.angles)
+        self.angles = np.asarray(self.angles)[ind]
         for s in self.sifs:
-            self.anSol[s] = np.array([self.anSol[s][i] for i in ind])
-            self.results[s] = np.array([self.results[s][i] for i in ind])
+            self.anSol[s] = np.asarray(self.anSol[s])[ind]
+            self.results[s] = np.asarray(self.results[s])[ind]
+
+    def getDataSize(self):
+        arrays = [self.angles] + self.results.values() + self.anSol.values()
+        return sum(np.asarray(a).nbytes for a in arrays)
+
+    def reportMemoryUsage(self):
+        if len(self.angles) < largeNodePoints:
+            return
+        msg = 'Node {0}: {1} points, {2:.1f} MB of node data'.format(
+            self.node.getName(), len(self.angles),
+            self.getDataSize() / 1024. ** 2)
+        if resource is not None:
+            # ru_maxrss is in kilobytes on Linux
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            msg = msg + ', peak memory {0:.1f} MB'.format(peak / 1024.)
+        print msg
 
     def calcErrors(self):
         err = ['difference', 'normedDiff']
@@ -235,13 +520,12 @@ class AnalysisNodeData(object):
 
     def calcEstimates(self):
         for sif in self.sifs:
+            stats = mf.calcStats(self.angles, self.anSol[sif],
+                                 self.results[sif])
             for e in self.estimates.keys():
                 try:
-                    self.estimates[e][sif] = mf.calcStatsWrapper(
-                        statKey=e, angles=self.angles,
-                        analytical=self.anSol[sif],
-                        analysis=self.results[sif],
-                        eSign=self.eSignFactor)
+                    self.estimates[e][sif] = mf.getStat(
+                        stats, e, self.eSignFactor)
                 except ZeroDivisionError:
                     self.estimates[e][sif] = float('NaN')
 
@@ -263,6 +547,17 @@ class AnalysisNodeData(object):
     def getAnSolParams(self):
         return self.anSolParams
 
+    def getAnSolCurve(self, sif, betas=None, sigma=None):
+        params = dict(self.anSolParams)
+        if sigma is not None:
+            params['sigma'] = sigma
+        return calcAnSolCurve(params, sif, self.getCurveAngles(betas))
+
+    def getCurveAngles(self, betas=None):
+        if betas is None:
+            betas = createCurveAngles(self.angles)
+        return betas
+
     def getDataByType(self, dataType):
         if dataType == 'results':
             return self.results
@@ -272,16 +567,306 @@ class AnalysisNodeData(object):
             return self.errors['normedDiff']
 
     def calcSIFsForSigmaAndSIF(self, sigma, sif):
-        return anSol.calcAnSolWrapper(sifKey=sif,
-                                      majorAxis=self.anSolParams['a'],
-                                      minorAxis=self.anSolParams['b'],
-                                      v=self.anSolParams['v'],
-                                      betas=self.angles,
-                                      gamma=self.anSolParams['gamma'],
-                                      omega=self.anSolParams['omega'],
-                                      tensileStress=sigma)
+        return sigma * self.getUnitSIFs(sif)
+
+    def getUnitSIFs(self, sif):
+        """
+        Returns the analytical solution sif at the node angles for a unit
+        tensile stress. Stress sweeps scale it instead of evaluating the
+        analytical solution for every stress.
+        """
+        if sif not in self.unitSIFs:
+            self.unitSIFs[sif] = anSol.unitSolutionCache.getUnitSolution(
+                sif, majorAxis=self.anSolParams['a'],
+                minorAxis=self.anSolParams['b'], v=self.anSolParams['v'],
+                betas=self.angles, gamma=self.anSolParams['gamma'],
+                omega=self.anSolParams['omega'])
+        return self.unitSIFs[sif]
+
+
+def getAnalysisData(simId, sifs=['K1', 'K2', 'K3'], eSignFactor='areas',
+                    entryData=None, metrics=None):
+    """
+    Returns the AnalysisData of simId with the analytical solutions and
+    the error reports metrics (all by default) calculated; the other
+    error reports are calculated on their first access. The calculation
+    is done once per record and repository version and then read from
+    the analysis cache.
+    """
+    settings = (tuple(sifs), eSignFactor)
+    key = analysisCache.cache.getKey(simId, settings)
+    state = analysisCache.cache.get(simId, settings, key)
+    if state is not None:
+        ad = createFromCacheState(simId, state, sifs, eSignFactor)
+        if ad.hasErrors(metrics):
+            return ad
+    else:
+        ad = AnalysisData(simId, sifs=sifs, eSignFactor=eSignFactor,
+                          entryData=entryData)
+        ad.calcAnSol()
+    ad.calculateStats(metrics)
+    analysisCache.cache.put(simId, settings, ad.getCacheState(), key)
+    return ad
+
+
+def findResultsStore(stores, simId):
+    """
+    Returns the results store of the database of simId, or False if it
+    has none, looked up once per database in the dict stores.
+    """
+    dbName = dba.splitUniqueEntryKey(simId)[0]
+    if dbName not in stores:
+        stores[dbName] = rs.findStore(simId) or False
+    return stores[dbName]
+
+
+def createFromCacheState(simId, state, sifs, eSignFactor):
+    ad = AnalysisData(simId, sifs=list(sifs), loadFromDb=False,
+                      eSignFactor=eSignFactor)
+    ad.setCacheState(state)
+    return ad
+
+
+def iterAnalysisData(simIds, sifs=['K1', 'K2', 'K3'], eSignFactor='areas'):
+    """
+    Yields (simId, AnalysisData) pairs as getAnalysisData, the cached
+    simIds first and then the others, read from the databases in
+    storage order with their statistics calculated in batches of
+    statsBatchSize records.
+    """
+    settings = (tuple(sifs), eSignFactor)
+    missing = []
+    keys = {}
+    for simId in simIds:
+        keys[simId] = analysisCache.cache.getKey(simId, settings)
+        state = analysisCache.cache.get(simId, settings, keys[simId])
+        if state is None:
+            missing.append(simId)
+        else:
+            yield simId, createFromCacheState(simId, state, sifs, eSignFactor)
+    batch = []
+    stores = {}
+    for simId, entryData in dba.iterEntriesData(missing):
+        ad = AnalysisData(simId, sifs=sifs, eSignFactor=eSignFactor,
+                          entryData=entryData,
+                          resultsStore=findResultsStore(stores, simId))
+        batch.append((simId, ad))
+        if len(batch) == statsBatchSize:
+            for item in finishAnalysisDataBatch(batch, settings, keys):
+                yield item
+            batch = []
+    for item in finishAnalysisDataBatch(batch, settings, keys):
+        yield item
+
+
+def finishAnalysisDataBatch(batch, settings, keys={}):
+    calcAnSolBatch([ad for simId, ad in batch])
+    calculateStatsBatch([ad for simId, ad in batch])
+    for simId, ad in batch:
+        analysisCache.cache.put(simId, settings, ad.getCacheState(),
+                                keys.get(simId))
+    return batch
+
+
+def calcAnSolBatch(ads):
+    """
+    Calculates the analytical solutions of the AnalysisData ads as
+    calcAnSol, evaluating each SIF of all successful analyses in one
+    broadcast computation over their parameters and padded angles. The
+    ads must share their sifs. Falls back to calcAnSol per AnalysisData
+    if a parameter is missing or not valid.
+    """
+    batch = [ad for ad in ads
+             if ad.data['analysisSuccess'] and len(ad.angles) > 0]
+    try:
+        params = dict(
+            (p, np.array([ad.data[p] for ad in batch], dtype=float))
+            for p in anSolParamKeys)
+        betas, mask = mf.padRows([ad.angles for ad in batch])
+        for sif in (batch[0].sifs if len(batch) > 0 else []):
+            values = calcAnSolColumns(sif, params, betas)
+            for i, ad in enumerate(batch):
+                ad.anSol[sif] = values[i, mask[i]]
+    except (AssertionError, TypeError, ValueError):
+        batch = []
+    calculated = set(id(ad) for ad in batch)
+    for ad in ads:
+        if id(ad) not in calculated:
+            ad.calcAnSol()
+
+
+def createCurveAngles(angles):
+    """
+    Returns anSolCurvePoints angles over the range of angles, none for
+    the empty angles of failed analyses.
+    """
+    if len(angles) == 0:
+        return np.array([])
+    return np.linspace(np.min(angles), np.max(angles), anSolCurvePoints)
+
+
+def calcAnSolCurve(params, sif, betas):
+    """
+    Returns betas and the analytical solution sif at betas from the
+    interpolation tables of anSol, for plotting.
+    """
+    if len(betas) == 0:
+        return betas, np.array([])
+    return betas, anSol.calcAnSolTable(
+        sifKey=sif, majorAxis=params['a'], minorAxis=params['b'],
+        v=params['v'], betas=betas, gamma=params['gamma'],
+        omega=params['omega'], tensileStress=params['sigma'])
+
+
+def calcAnSolColumns(sif, params, betas):
+    return anSol.calcAnSolBatch(
+        sif, majorAxes=params['a'], minorAxes=params['b'], vs=params['v'],
+        betas=betas, gammas=params['gamma'], omegas=params['omega'],
+        tensileStresses=params['sigma'])
+
+
+def calculateStatsBatch(ads):
+    """
+    Calculates the statistics of the AnalysisData ads as calculateStats,
+    evaluating the statistics of all ads at once per SIF. The ads must
+    share their sifs and eSignFactor. Falls back to calculateStats per
+    AnalysisData if the angles of an ad are not sorted.
+    """
+    pending = [ad for ad in ads
+               if ad.data['analysisSuccess'] and not ad.calculatedErrors]
+    for ad in pending:
+        for sif in ad.sifs:
+            ad.averageContours(sif)
+    try:
+        for sif in (pending[0].sifs if len(pending) > 0 else []):
+            angles, mask = mf.padRows([ad.angles for ad in pending])
+            analytical = mf.padRows([ad.anSol[sif] for ad in pending])[0]
+            analysis = mf.padRows([ad.results[sif] for ad in pending])[0]
+            stats = mf.calcStatsBatch(angles, analytical, analysis, mask)
+            lengths = mask.sum(axis=1)
+            for i, ad in enumerate(pending):
+                ad.setErrors(sif, mf.selectBatchStats(stats, i, lengths[i]))
+    except AssertionError:
+        pass
+    else:
+        for ad in pending:
+            ad.calculatedErrors = True
+    for ad in ads:
+        ad.calculateStats()
+
+
+def calcAnalysisState(args):
+    simId, sifs, eSignFactor = args
+    ad = AnalysisData(simId, sifs=list(sifs), eSignFactor=eSignFactor)
+    ad.calcAnSol()
+    ad.calculateStats()
+    return simId, ad.getCacheState()
+
+
+def createWorkerPool(workers):
+    # forked workers must not inherit open shelve handles
+    dba.closeAllShelves()
+    analysisCache.cache.closeAll()
+    return multiprocessing.Pool(workers)
+
+
+def calcAnalysisData(simIds, sifs=['K1', 'K2', 'K3'], eSignFactor='areas',
+                     workers=1):
+    """
+    Returns a dict of the calculated AnalysisData of simIds. The simIds
+    missing from the analysis cache are calculated in a pool of workers
+    processes when workers > 1 and added to the cache.
+    """
+    assert workers >= 1
+    if workers == 1:
+        return dict(iterAnalysisData(simIds, sifs, eSignFactor))
+    settings = (tuple(sifs), eSignFactor)
+    analysisData = {}
+    missing = []
+    keys = {}
+    for simId in simIds:
+        keys[simId] = analysisCache.cache.getKey(simId, settings)
+        state = analysisCache.cache.get(simId, settings, keys[simId])
+        if state is None:
+            missing.append(simId)
+        else:
+            analysisData[simId] = createFromCacheState(
+                simId, state, sifs, eSignFactor)
+    if len(missing) > 0:
+        pool = createWorkerPool(min(workers, len(missing)))
+        try:
+            states = pool.map(
+                calcAnalysisState,
+                [(simId, tuple(sifs), eSignFactor) for simId in missing])
+        finally:
+            pool.close()
+            pool.join()
+        for simId, state in states:
+            analysisCache.cache.put(simId, settings, state, keys[simId])
+            analysisData[simId] = createFromCacheState(
+                simId, state, sifs, eSignFactor)
+    return analysisData
+
+
+def performNodesOperations(nodes, sifs, eSignFactor='areas', workers=1):
+    """
+    Returns the AnalysisNodeData of nodes with their operations
+    performed. With workers > 1 the simulations of all nodes are
+    calculated together in one pool of worker processes.
+    """
+    nodesData = [AnalysisNodeData(n, sifs, eSignFactor) for n in nodes]
+    for node, adn in zip(nodes, nodesData):
+        registerNodeData(getNodeDataKey(node, sifs, eSignFactor), adn)
+    if workers > 1:
+        simIds = set()
+        for node in nodes:
+            simIds.update(node.getSuccessfulMembers())
+        analysisData = calcAnalysisData(simIds, sifs, eSignFactor, workers)
+        for adn in nodesData:
+            adn.performOperations(analysisData)
+    else:
+        for adn in nodesData:
+            adn.performOperations()
+    return nodesData
+
+
+def getNodeDataKey(node, sifs, eSignFactor):
+    return id(node), tuple(sifs), eSignFactor
+
+
+def registerNodeData(key, adn):
+    """
+    Keeps adn in the node data registry, dropping the least recently
+    used node data beyond maxRegisteredNodes. The registry holds a
+    reference to the node, so the id of a registered node is not reused.
+    """
+    nodeDataRegistry.pop(key, None)
+    while len(nodeDataRegistry) >= maxRegisteredNodes:
+        nodeDataRegistry.popitem(last=False)
+    nodeDataRegistry[key] = adn
+
+
+def getNodeData(node, sifs, eSignFactor='areas'):
+    """
+    Returns the AnalysisNodeData of node with its operations performed.
+    The node data is registered and on later calls only updated with the
+    members added to or removed from the node since.
+    """
+    key = getNodeDataKey(node, sifs, eSignFactor)
+    adn = nodeDataRegistry.get(key)
+    if adn is None or adn.node is not node:
+        adn = AnalysisNodeData(node, sifs, eSignFactor)
+        adn.performOperations()
+    else:
+        adn.update()
+    registerNodeData(key, adn)
+    return adn
+
+
+def clearNodeDataRegistry():
+    nodeDataRegistry.clear()
 
 
 def getMeshParams(simId):
-    ad = AnalysisData(simId)
+    ad = AnalysisData(simId, projection='mesh')
     return ad.getMeshParams()
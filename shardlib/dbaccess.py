@@ -1,14 +1,32 @@
 import shelve
 import os
+import atexit
+import collections
+import multiprocessing
 import numpy as np
+import paramIndex
 
 resultsDb = 'resultsDb'
+# results payload shelves of databases in split storage
+resultsOdb = 'resultsOdb'
+payloadKey = 'odb'
 dbRepoDir = 'db'
+# repository directory set with setDbRepoDir, None finds the db directory
+dbRepoDirOverride = None
 unionSym = '$'
 dbEntyKeysToSkip = ['metadata']
+maxOpenShelves = 16
+# None uses one worker per cpu
+parallelScanWorkers = None
+# records below which table scans run serially
+parallelScanRecordThreshold = 2000
 
 
 def getDbRepoDir():
+    if dbRepoDirOverride is not None:
+        if os.path.isdir(dbRepoDirOverride):
+            return dbRepoDirOverride
+        raise IOError('Cannot find db directory ' + dbRepoDirOverride)
     filepath = os.path.abspath(__file__)
     modulesdir = os.path.dirname(filepath)
     root, tdir = os.path.split(modulesdir)
@@ -21,20 +39,17 @@ def getDbRepoDir():
 
 
 def getShelvePathByName(dbName):
-    dbRepoDir = getDbRepoDir()
-    if checkIfValidShelvePath(dbName):
-        dbDir = os.path.join(dbRepoDir, dbName)
-        resDir = os.path.join(dbDir, resultsDb)
-        return os.path.join(resDir, dbName)
-    else:
-        return ''
+    return discoveryCache.getShelvePath(dbName)
 
 
 def checkIfValidShelvePath(dbName):
     dbRepoDir = getDbRepoDir()
     dbDir = os.path.join(dbRepoDir, dbName)
     resDb = os.path.join(dbDir, resultsDb)
-    shelvePath = os.path.join(resDb, dbName)
+    return hasShelveFile(resDb, dbName)
+
+
+def hasShelveFile(resDb, dbName):
     if (os.path.exists(resDb) and
         (dbName in [f.rsplit('.', 1)[0] for f in os.listdir(resDb)] or
          dbName in os.listdir(resDb))):
@@ -45,6 +60,10 @@ def checkIfValidShelvePath(dbName):
 
 def verifyIfShelve(dbName):
     dbPath = getShelvePathByName(dbName)
+    return canOpenShelve(dbPath)
+
+
+def canOpenShelve(dbPath):
     try:
         db = shelve.open(dbPath, 'r')
         db.close()
@@ -54,18 +73,154 @@ def verifyIfShelve(dbName):
 
 
 def isValidDbName(dbName):
-    return (checkIfValidShelvePath(dbName) and verifyIfShelve(dbName))
+    return discoveryCache.isValidDbName(dbName)
 
 
 def getShelveNames():
-    return [dbName for dbName in os.listdir(getDbRepoDir())
-            if isValidDbName(dbName)]
+    return discoveryCache.getShelveNames()
 
 
 def getAllShelvePaths():
     return [getShelvePathByName(dbName) for dbName in getShelveNames()]
 
 
+def getDirMtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class DiscoveryCache(object):
+    """
+    Repository directory, valid database names and shelve paths found
+    once per session. Cached entries are revalidated with a stat of the
+    repository directory and of the results directory of each database
+    instead of listing and test-opening the shelves again.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.repoDir = None
+        self.repoMtime = None
+        self.dirNames = []
+        self.dbs = {}
+
+    def getRepoDir(self):
+        if self.repoDir is None or getDirMtime(self.repoDir) is None:
+            self.clear()
+            self.repoDir = getDbRepoDir()
+        return self.repoDir
+
+    def getDbInfo(self, dbName):
+        resDb = os.path.join(self.getRepoDir(), dbName, resultsDb)
+        mtime = getDirMtime(resDb)
+        odbMtime = getDirMtime(
+            os.path.join(self.getRepoDir(), dbName, resultsOdb))
+        info = self.dbs.get(dbName)
+        if (info is None or info['mtime'] != mtime or
+                info['odbMtime'] != odbMtime):
+            shelvePath = ''
+            if mtime is not None and hasShelveFile(resDb, dbName):
+                shelvePath = os.path.join(resDb, dbName)
+            payloadPath = ''
+            resOdb = os.path.join(self.getRepoDir(), dbName, resultsOdb)
+            if shelvePath and hasShelveFile(resOdb, dbName):
+                payloadPath = os.path.join(resOdb, dbName)
+            info = {'mtime': mtime, 'odbMtime': odbMtime,
+                    'path': shelvePath, 'valid': None,
+                    'payloadPath': payloadPath, 'files': None}
+            self.dbs[dbName] = info
+        return info
+
+    def getShelveFiles(self, dbName, info=None):
+        if info is None:
+            info = self.getDbInfo(dbName)
+        if info['files'] is None:
+            info['files'] = (listShelveFiles(info['path']) +
+                             listShelveFiles(info['payloadPath']))
+        return info['files']
+
+    def getShelvePath(self, dbName):
+        return self.getDbInfo(dbName)['path']
+
+    def getPayloadShelvePath(self, dbName):
+        return self.getDbInfo(dbName)['payloadPath']
+
+    def isValidDbName(self, dbName):
+        info = self.getDbInfo(dbName)
+        if info['valid'] is None:
+            info['valid'] = bool(info['path']) and canOpenShelve(info['path'])
+        return info['valid']
+
+    def getShelveNames(self):
+        repoDir = self.getRepoDir()
+        mtime = getDirMtime(repoDir)
+        if mtime != self.repoMtime:
+            self.dirNames = os.listdir(repoDir)
+            self.repoMtime = mtime
+            for dbName in set(self.dbs.keys()) - set(self.dirNames):
+                del self.dbs[dbName]
+        return [dbName for dbName in self.dirNames
+                if self.isValidDbName(dbName)]
+
+
+discoveryCache = DiscoveryCache()
+
+
+def clearDiscoveryCache():
+    discoveryCache.clear()
+
+
+def getPayloadShelvePath(dbName):
+    return discoveryCache.getPayloadShelvePath(dbName)
+
+
+def isSplitStorage(dbName):
+    return bool(getPayloadShelvePath(dbName))
+
+
+def listShelveFiles(path):
+    if not path:
+        return []
+    resDb, shelveName = os.path.split(path)
+    return [os.path.join(resDb, f) for f in sorted(os.listdir(resDb))
+            if f == shelveName or f.rsplit('.', 1)[0] == shelveName]
+
+
+def getShelveFingerprint(dbName):
+    """
+    Returns a string identifying the current version of a database
+    shelve, built from the names, sizes and modification times of the
+    shelve files, including the payload shelve files in split storage.
+    The file names are listed again only when the discovery cache sees
+    a changed results directory, so a fingerprint costs a stat per file.
+    """
+    return getFilesFingerprint(discoveryCache.getShelveFiles(dbName))
+
+
+def getShelveVersion(dbName):
+    """
+    Returns the shelve path and fingerprint of database dbName.
+    """
+    info = discoveryCache.getDbInfo(dbName)
+    return info['path'], getFilesFingerprint(
+        discoveryCache.getShelveFiles(dbName, info))
+
+
+def getFilesFingerprint(paths):
+    stats = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stats.append((os.path.basename(path), st.st_size, st.st_mtime))
+        except OSError:
+            stats.append((os.path.basename(path), None, None))
+    return repr(stats)
+
+
 def createUniqueEntryKey(dbName, entry):
     return dbName + unionSym + entry
 
@@ -74,33 +229,192 @@ def splitUniqueEntryKey(entry):
     return entry.split(unionSym)
 
 
+class ShelvePool(object):
+    """
+    Read-only shelve handles kept open between record lookups.
+    Handles are keyed by database name and the least recently used
+    one is closed when more than maxOpen shelves are open. Each handle
+    keeps the fingerprint of the database it was opened at and is
+    reopened when the database changes on disk. The storage order of
+    the keys is read once per opened handle. Used as a context
+    manager the pool closes its handles on leaving the outermost with
+    block.
+    """
+
+    def __init__(self, maxOpen=maxOpenShelves):
+        assert maxOpen >= 1
+        self.maxOpen = maxOpen
+        self.handles = collections.OrderedDict()
+        self.storageOrders = {}
+        self.depth = 0
+
+    def getShelve(self, dbName, payload=False):
+        return self.getVersionedShelve(dbName, payload)[0]
+
+    def getVersionedShelve(self, dbName, payload=False):
+        """
+        Returns a shelve handle of database dbName and the fingerprint
+        of the database version it reads.
+        """
+        handleKey = (dbName, resultsOdb) if payload else dbName
+        fingerprint = getShelveFingerprint(dbName)
+        db = None
+        if handleKey in self.handles:
+            db, openFingerprint = self.handles.pop(handleKey)
+            if openFingerprint != fingerprint:
+                db.close()
+                db = None
+        if db is None:
+            while len(self.handles) >= self.maxOpen:
+                self.handles.popitem(last=False)[1][0].close()
+            if payload:
+                db = shelve.open(getPayloadShelvePath(dbName), 'r')
+            else:
+                db = shelve.open(getShelvePathByName(dbName), 'r')
+        self.handles[handleKey] = (db, fingerprint)
+        return db, fingerprint
+
+    def getStorageOrder(self, dbName):
+        """
+        Returns a dict of the positions of the keys of database dbName
+        in storage order.
+        """
+        db, fingerprint = self.getVersionedShelve(dbName)
+        order = self.storageOrders.get(dbName)
+        if order is None or order[0] != fingerprint:
+            order = (fingerprint,
+                     dict((key, i) for i, key in enumerate(db.keys())))
+            self.storageOrders[dbName] = order
+        return order[1]
+
+    def closeShelve(self, dbName):
+        self.storageOrders.pop(dbName, None)
+        for handleKey in [dbName, (dbName, resultsOdb)]:
+            if handleKey in self.handles:
+                self.handles.pop(handleKey)[0].close()
+
+    def closeAll(self):
+        self.storageOrders.clear()
+        while len(self.handles) > 0:
+            self.handles.popitem(last=False)[1][0].close()
+
+    def getOpenShelveNames(self):
+        return list(self.handles.keys())
+
+    def __len__(self):
+        return len(self.handles)
+
+    def __enter__(self):
+        self.depth += 1
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.depth -= 1
+        if self.depth == 0:
+            self.closeAll()
+        return False
+
+
+shelvePool = ShelvePool()
+atexit.register(shelvePool.closeAll)
+
+
+def closeAllShelves():
+    shelvePool.closeAll()
+
+
+def setDbRepoDir(path=None):
+    """
+    Reads the databases from repository directory path instead of the db
+    directory next to the package, or from the db directory again if
+    path is None. Open shelves are closed and the discovery cache is
+    cleared.
+    """
+    global dbRepoDirOverride
+    closeAllShelves()
+    clearDiscoveryCache()
+    dbRepoDirOverride = None if path is None else os.path.abspath(path)
+
+
+class SplitEntry(dict):
+    """
+    Header of a record in split storage. The results payload ('odb') is
+    read from the payload shelve of the database on its first access,
+    so reading input and reports never unpickles the results.
+    """
+
+    def __init__(self, header, dbName, key, payloadDb=None):
+        dict.__init__(self, header)
+        self.dbName = dbName
+        self.key = key
+        self.payloadDb = payloadDb
+
+    def __missing__(self, k):
+        if k != payloadKey:
+            raise KeyError(k)
+        payloadDb = self.payloadDb
+        if payloadDb is None:
+            payloadDb = shelvePool.getShelve(self.dbName, payload=True)
+        value = payloadDb[self.key]
+        self[k] = value
+        return value
+
+
+def readEntry(db, dbName, key, split=False, payloadDb=None):
+    if split:
+        return SplitEntry(db[key], dbName, key, payloadDb)
+    return db[key]
+
+
 def getEntryData(entry):
     dbName, entry = splitUniqueEntryKey(entry)
-    dbPath = getShelvePathByName(dbName)
-    db = shelve.open(dbPath, 'r')
-    data = db[entry]
-    db.close()
-    return data
+    return readEntry(shelvePool.getShelve(dbName), dbName, entry,
+                     isSplitStorage(dbName))
+
+
+def iterEntriesData(simIds):
+    """
+    Yields (simId, entryData) pairs for simIds. The simIds are grouped
+    by database, each database shelve is opened once and its records
+    are read in storage order.
+    """
+    dbKeys = getDbKeysFromSubset(simIds)
+    for dbName in sorted(dbKeys.keys()):
+        db = shelvePool.getShelve(dbName)
+        split = isSplitStorage(dbName)
+        for key in orderKeysByStorage(
+                db, dbKeys[dbName], shelvePool.getStorageOrder(dbName)):
+            yield (createUniqueEntryKey(dbName, key),
+                   readEntry(db, dbName, key, split))
+
+
+def getEntriesData(simIds):
+    return dict(iterEntriesData(simIds))
+
+
+def orderKeysByStorage(db, keys, positions=None):
+    """
+    Returns keys in the storage order of db, followed by the keys db
+    does not have, so that reading them raises KeyError. positions is
+    the storage order of the pooled handle of db, if there is one.
+    """
+    if len(keys) < 2:
+        return list(keys)
+    if positions is None:
+        positions = dict((key, i) for i, key in enumerate(db.keys()))
+    end = len(positions)
+    return sorted(keys, key=lambda key: (positions.get(key, end), key))
 
 
 def getDbEntryKeys(dbName):
-    dbPath = getShelvePathByName(dbName)
-    db = shelve.open(dbPath, 'r')
-    keys = list(db.keys())
-    db.close()
-    return keys
+    return list(shelvePool.getShelve(dbName).keys())
 
 
 def getAllShelveKeys():
-    dbNames = getShelveNames()
     keys = set()
-    for dbName in dbNames:
-        dbPath = getShelvePathByName(dbName)
-        db = shelve.open(dbPath, 'r')
-        for key in db.keys():
-            uniqueKey = createUniqueEntryKey(dbName, key)
-            keys.add(uniqueKey)
-        db.close()
+    for dbName in getShelveNames():
+        for key in getDbEntryKeys(dbName):
+            keys.add(createUniqueEntryKey(dbName, key))
     return filterDbKeys(keys)
 
 
@@ -110,12 +424,10 @@ def filterDbKeys(keys):
 
 
 def getDbKeysFromSubset(subset):
-    dbNames = {splitUniqueEntryKey(k)[0] for k in subset}
-    dbKeys = {
-              dbName: {
-                       splitUniqueEntryKey(k)[1] for k in subset
-                       if splitUniqueEntryKey(k)[0] == dbName}
-              for dbName in dbNames}
+    dbKeys = {}
+    for k in subset:
+        dbName, key = splitUniqueEntryKey(k)
+        dbKeys.setdefault(dbName, set()).add(key)
     return dbKeys
 
 
@@ -125,145 +437,205 @@ def getParameterRange(subset, parameterKey):
 
 
 def getSubsetByCriterion(subset, parameterKey, criterion):
+    if paramIndex.isIndexed(parameterKey):
+        return paramIndex.selectSimIds(
+            getDbKeysFromSubset(subset), parameterKey, criterion)
     simIdVals = extractSimIdParamValuesFromSubset(subset, parameterKey)
     return {simId for simId in simIdVals.keys()
             if simIdVals[simId] == criterion}
 
 
-def extractSimIdParamValuesFromSubset(subset, parameterKey):
+def extractSimIdParamValuesFromSubset(subset, parameterKey, workers=None):
     dbKeys = getDbKeysFromSubset(subset)
+    if paramIndex.isIndexed(parameterKey):
+        return paramIndex.extractSimIdParamValues(dbKeys, parameterKey)
     simIdVals = {}
-    for dbName in dbKeys.keys():
-        dbPath = getShelvePathByName(dbName)
-        db = shelve.open(dbPath, 'r')
-        for key in dbKeys[dbName]:
-            simId = createUniqueEntryKey(dbName, key)
-            simIdVals[simId] = extractDataFromEntry(db[key], parameterKey)
-        db.close()
+    numRecords = sum(len(keys) for keys in dbKeys.values())
+    if isParallelScan(numRecords, len(dbKeys), workers):
+        args = [(dbName, getShelvePathByName(dbName),
+                 getPayloadShelvePath(dbName), dbKeys[dbName], parameterKey)
+                for dbName in dbKeys.keys()]
+        for vals in parallelScan(scanDbParamValues, args, workers):
+            simIdVals.update(vals)
+    else:
+        for dbName in dbKeys.keys():
+            simIdVals.update(extractDbParamValues(
+                shelvePool.getShelve(dbName), dbName, dbKeys[dbName],
+                parameterKey, isSplitStorage(dbName)))
     return simIdVals
 
 
-def extractDataFromEntry(entryData, keyword):
-    inp = entryData['input']
-    rep = entryData['reports']
+def extractDbParamValues(db, dbName, keys, parameterKey, split=False,
+                         payloadDb=None):
+    simIdVals = {}
+    for key in keys:
+        simId = createUniqueEntryKey(dbName, key)
+        simIdVals[simId] = extractDataFromEntry(
+            readEntry(db, dbName, key, split, payloadDb), parameterKey)
+    return simIdVals
+
+
+def getScanWorkers(numDbs, workers=None):
+    if workers is None:
+        workers = parallelScanWorkers
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    return max(1, min(workers, numDbs))
+
+
+def isParallelScan(numRecords, numDbs, workers=None):
+    return (numRecords >= parallelScanRecordThreshold and
+            getScanWorkers(numDbs, workers) > 1)
+
+
+def parallelScan(func, args, workers=None):
+    """
+    Maps func over args, one item per database, in a pool of worker
+    processes. Each worker opens its own shelve and returns only the
+    extracted data. The pooled shelves are closed before forking, so
+    the workers do not inherit their handles.
+    """
+    closeAllShelves()
+    pool = multiprocessing.Pool(getScanWorkers(len(args), workers))
     try:
-        res = entryData['odb']['results']
-    except KeyError:
-        pass
-
-    if keyword == 'analysisSuccess':
-        return rep['successfulAnalysis']
-    if keyword == 'crackRatio':
-        a = inp['crackParameters']['a']
-        b = inp['crackParameters']['b']
-        return float(a)/float(b)
-    if keyword == 'a':
-        return inp['crackParameters']['a']
-    if keyword == 'b':
-        return inp['crackParameters']['b']
-    if keyword == 'sigma':
-        return inp['analysisParameters']['sigma']
-    if keyword == 'gamma':
-        return inp['analysisParameters']['gamma']
-    if keyword == 'omega':
-        return inp['analysisParameters']['omega']
-    if keyword == 'analysisType':
-        return inp['analysisType']
-    if keyword == 'modelType':
-        return inp['modelType']
-    if keyword == 'transform':
-        try:
-            return inp['meshParameters']['transformationType']
-        except KeyError:
-            return None
-    if keyword == 'elements':
-        return inp['meshParameters']['elements']
-    # Seed parameters
-# FEM
-    if keyword == 'czrSeeds':
-        try:
-            return inp['seedParameters']['crackZoneRefinementSeeds']
-        except KeyError:
-            return None
-    if keyword == 'crSeeds':
-        try:
-            return inp['seedParameters']['containerRefinementSeeds']
-        except KeyError:
-            return None
-    if keyword == 'czmSeeds':
-        try:
-            return inp['seedParameters']['crackZoneMainSeeds']
-        except KeyError:
-            return None
-    if keyword == 'arcSeeds':
-        try:
-            return inp['seedParameters']['arcSeeds']
-        except KeyError:
-            return None
-    # XFEM CP
-    if keyword == 'allEdges':
-        try:
-            return inp['seedParameters']['allEdges']
-        except KeyError:
-            return None
-    if keyword == 'crackEdges':
-        try:
-            return inp['seedParameters']['crackEdges']
-        except KeyError:
-            return None
-    # TODO XFEM MP & XFEM simple
+        return pool.map(func, args, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
 
-    if keyword == 'h':
-        return inp['geometricParameters']['containerHeight']
-    if keyword == 'd':
-        return 2*inp['geometricParameters']['containerRadius']
-    if keyword == 'crackType':
-        return inp['crackParameters']['crackType']
-    if keyword == 'E':
-        return inp['material']['E']
-    if keyword == 'v':
-        return inp['material']['v']
-    if keyword == 'timeToCalcInSec':
-        return (rep['analysis']['timeOfCalculation'] -
-                rep['analysis']['creationTime'])
-
-    if keyword == 'angles':
-        try:
-            return res['sortedBetaAngles']
-        except KeyError:
-            return None
-    if keyword == 'K1':
-        try:
-            return res['sortedSIFs']['K1']
-        except KeyError:
-            return None
-    if keyword == 'K2':
-        try:
-            return res['sortedSIFs']['K2']
-        except KeyError:
-            return None
-    if keyword == 'K3':
-        try:
-            return res['sortedSIFs']['K3']
-        except KeyError:
-            return None
-    if keyword == 'J':
-        try:
-            return res['sortedSIFs']['J']
-        except KeyError:
-            return None
-    if keyword == 'Cpd':
-        try:
-            return res['sortedSIFs']['Cpd']
-        except KeyError:
-            return None
-    if keyword == 'JKs':
-        try:
-            return res['sortedSIFs']['JKs']
-        except KeyError:
-            return None
-    if keyword == 'T':
+
+def scanDbParamValues(args):
+    dbName, dbPath, payloadPath, keys, parameterKey = args
+    db = shelve.open(dbPath, 'r')
+    payloadDb = shelve.open(payloadPath, 'r') if payloadPath else None
+    try:
+        return extractDbParamValues(
+            db, dbName, orderKeysByStorage(db, keys), parameterKey,
+            payloadDb is not None, payloadDb)
+    finally:
+        db.close()
+        if payloadDb is not None:
+            payloadDb.close()
+
+
+def extractDataFromEntry(entryData, keyword):
+    return extractFields(entryData, [keyword])[keyword]
+
+
+def getFieldPath(field):
+    path = {
+        'inp': ('input',), 'rep': ('reports',), 'res': ('odb', 'results'),
+        'sifs': ('odb', 'results', 'sortedSIFs')}
+    return path[field[0]] + field[1:]
+
+
+# keyword: (entry paths, optional, function of the path values)
+# Optional keywords return None when a path is missing from the entry.
+entryFields = {
+    'analysisSuccess': ([('rep', 'successfulAnalysis')], False, None),
+    'crackRatio': ([('inp', 'crackParameters', 'a'),
+                    ('inp', 'crackParameters', 'b')], False,
+                   lambda a, b: float(a) / float(b)),
+    'a': ([('inp', 'crackParameters', 'a')], False, None),
+    'b': ([('inp', 'crackParameters', 'b')], False, None),
+    'sigma': ([('inp', 'analysisParameters', 'sigma')], False, None),
+    'gamma': ([('inp', 'analysisParameters', 'gamma')], False, None),
+    'omega': ([('inp', 'analysisParameters', 'omega')], False, None),
+    'analysisType': ([('inp', 'analysisType')], False, None),
+    'modelType': ([('inp', 'modelType')], False, None),
+    'transform': ([('inp', 'meshParameters', 'transformationType')],
+                  True, None),
+    'elements': ([('inp', 'meshParameters', 'elements')], False, None),
+    # FEM seeds
+    'czrSeeds': ([('inp', 'seedParameters', 'crackZoneRefinementSeeds')],
+                 True, None),
+    'crSeeds': ([('inp', 'seedParameters', 'containerRefinementSeeds')],
+                True, None),
+    'czmSeeds': ([('inp', 'seedParameters', 'crackZoneMainSeeds')],
+                 True, None),
+    'arcSeeds': ([('inp', 'seedParameters', 'arcSeeds')], True, None),
+    # XFEM CP seeds
+    'allEdges': ([('inp', 'seedParameters', 'allEdges')], True, None),
+    'crackEdges': ([('inp', 'seedParameters', 'crackEdges')], True, None),
+    # TODO XFEM MP & XFEM simple
+    'h': ([('inp', 'geometricParameters', 'containerHeight')], False, None),
+    'd': ([('inp', 'geometricParameters', 'containerRadius')], False,
+          lambda r: 2 * r),
+    'crackType': ([('inp', 'crackParameters', 'crackType')], False, None),
+    'E': ([('inp', 'material', 'E')], False, None),
+    'v': ([('inp', 'material', 'v')], False, None),
+    'timeToCalcInSec': ([('rep', 'analysis', 'timeOfCalculation'),
+                         ('rep', 'analysis', 'creationTime')], False,
+                        lambda t1, t0: t1 - t0),
+    'angles': ([('res', 'sortedBetaAngles')], True, None),
+    'K1': ([('sifs', 'K1')], True, None),
+    'K2': ([('sifs', 'K2')], True, None),
+    'K3': ([('sifs', 'K3')], True, None),
+    'J': ([('sifs', 'J')], True, None),
+    'Cpd': ([('sifs', 'Cpd')], True, None),
+    'JKs': ([('sifs', 'JKs')], True, None),
+    'T': ([('sifs', 'T')], True, None)}
+
+fieldProjections = {
+    'tree': ['crackRatio', 'analysisType', 'modelType', 'transform',
+             'elements', 'analysisSuccess'],
+    'mesh': ['analysisSuccess', 'analysisType', 'elements', 'd', 'h',
+             'czrSeeds', 'crSeeds', 'czmSeeds', 'arcSeeds',
+             'allEdges', 'crackEdges'],
+    'anSol': ['analysisSuccess', 'a', 'b', 'omega', 'gamma', 'sigma', 'v'],
+    'results': ['analysisSuccess', 'angles', 'K1', 'K2', 'K3']}
+compiledFields = {}
+
+
+def getProjectionFields(projection):
+    if isinstance(projection, str):
+        return fieldProjections[projection]
+    return list(projection)
+
+
+def compileFields(keywords):
+    """
+    Returns the accessors of keywords as a list of
+    (keyword, paths, optional, function) tuples. Unknown keywords get
+    no paths and are extracted as None.
+    """
+    keywords = tuple(keywords)
+    if keywords not in compiledFields:
+        accessors = []
+        for keyword in keywords:
+            paths, optional, func = entryFields.get(keyword, ([], True, None))
+            accessors.append(
+                (keyword, [getFieldPath(p) for p in paths], optional, func))
+        compiledFields[keywords] = accessors
+    return compiledFields[keywords]
+
+
+def extractFields(entryData, keywords):
+    """
+    (dict, list or str) -> dict
+    Returns the values of keywords, or of the keywords of a projection
+    name in fieldProjections, from a record in a single pass. Only the
+    parts of the record on the paths of the keywords are accessed.
+    """
+    fields = {}
+    for keyword, paths, optional, func in compileFields(
+            getProjectionFields(keywords)):
         try:
-            return res['sortedSIFs']['T']
+            values = []
+            for path in paths:
+                value = entryData
+                for p in path:
+                    value = value[p]
+                values.append(value)
         except KeyError:
-            return None
+            if optional:
+                fields[keyword] = None
+                continue
+            raise
+        if func is not None:
+            fields[keyword] = func(*values)
+        elif values:
+            fields[keyword] = values[0]
+        else:
+            fields[keyword] = None
+    return fields
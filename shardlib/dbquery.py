@@ -0,0 +1,315 @@
+import abc
+import numpy as np
+import dbaccess as dba
+import paramIndex
+
+indexName = 'paramIndex'
+
+
+class Predicate(object):
+    """
+    Condition on the values of record keywords. evaluate tests the
+    extracted fields of one record and getMask the rows of a paramIndex
+    index at positions.
+    """
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def getKeywords(self):
+        pass
+
+    def isIndexed(self):
+        return all(paramIndex.isIndexed(k) for k in self.getKeywords())
+
+    @abc.abstractmethod
+    def evaluate(self, fields):
+        pass
+
+    @abc.abstractmethod
+    def getMask(self, index, positions):
+        pass
+
+    def getConjuncts(self):
+        return [self]
+
+
+class KeywordPredicate(Predicate):
+    """
+    Condition on the value of one record keyword. Subclasses define
+    test for a single value and may override getMask with a vectorized
+    evaluation of the paramIndex column.
+    """
+
+    def __init__(self, keyword):
+        if keyword not in dba.entryFields:
+            raise KeyError(keyword)
+        self.keyword = keyword
+
+    def getKeywords(self):
+        return set([self.keyword])
+
+    def evaluate(self, fields):
+        return self.test(fields[self.keyword])
+
+    @abc.abstractmethod
+    def test(self, value):
+        pass
+
+    def getMask(self, index, positions):
+        column = index.getColumn(self.keyword)[positions]
+        return np.array([self.test(v) for v in column], dtype=bool)
+
+
+class Eq(KeywordPredicate):
+
+    def __init__(self, keyword, value):
+        KeywordPredicate.__init__(self, keyword)
+        self.value = value
+
+    def test(self, value):
+        return value == self.value
+
+    def getMask(self, index, positions):
+        column = index.getColumn(self.keyword)[positions]
+        return paramIndex.equalsMask(column, self.value)
+
+    def __repr__(self):
+        return '{0} == {1!r}'.format(self.keyword, self.value)
+
+
+class Range(KeywordPredicate):
+    """
+    low <= value <= high, either bound can be None. None values never
+    fall in a range.
+    """
+
+    def __init__(self, keyword, low=None, high=None):
+        KeywordPredicate.__init__(self, keyword)
+        self.low = low
+        self.high = high
+
+    def test(self, value):
+        if value is None:
+            return False
+        if self.low is not None and value < self.low:
+            return False
+        if self.high is not None and value > self.high:
+            return False
+        return True
+
+    def getMask(self, index, positions):
+        column = index.getColumn(self.keyword)[positions]
+        if (column.dtype == object or
+                not all(paramIndex.isNumber(b) for b in [self.low, self.high]
+                        if b is not None)):
+            return KeywordPredicate.getMask(self, index, positions)
+        mask = np.ones(len(column), dtype=bool)
+        if self.low is not None:
+            mask &= column >= self.low
+        if self.high is not None:
+            mask &= column <= self.high
+        return mask
+
+    def __repr__(self):
+        return '{0!r} <= {1} <= {2!r}'.format(
+            self.low, self.keyword, self.high)
+
+
+class In(KeywordPredicate):
+
+    def __init__(self, keyword, values):
+        KeywordPredicate.__init__(self, keyword)
+        self.values = list(values)
+
+    def test(self, value):
+        return value in self.values
+
+    def getMask(self, index, positions):
+        mask = np.zeros(len(positions), dtype=bool)
+        for v in self.values:
+            mask |= Eq(self.keyword, v).getMask(index, positions)
+        return mask
+
+    def __repr__(self):
+        return '{0} in {1!r}'.format(self.keyword, self.values)
+
+
+class IsNone(KeywordPredicate):
+
+    def test(self, value):
+        return value is None
+
+    def getMask(self, index, positions):
+        column = index.getColumn(self.keyword)[positions]
+        if column.dtype != object:
+            return np.zeros(len(column), dtype=bool)
+        return KeywordPredicate.getMask(self, index, positions)
+
+    def __repr__(self):
+        return '{0} is None'.format(self.keyword)
+
+
+class And(Predicate):
+
+    def __init__(self, *predicates):
+        self.predicates = list(predicates)
+
+    def getKeywords(self):
+        keywords = set()
+        for p in self.predicates:
+            keywords.update(p.getKeywords())
+        return keywords
+
+    def evaluate(self, fields):
+        return all(p.evaluate(fields) for p in self.predicates)
+
+    def getMask(self, index, positions):
+        mask = np.ones(len(positions), dtype=bool)
+        for p in self.predicates:
+            mask &= p.getMask(index, positions)
+        return mask
+
+    def getConjuncts(self):
+        conjuncts = []
+        for p in self.predicates:
+            conjuncts.extend(p.getConjuncts())
+        return conjuncts
+
+    def __repr__(self):
+        return '(' + ' and '.join(repr(p) for p in self.predicates) + ')'
+
+
+class Or(And):
+
+    def evaluate(self, fields):
+        return any(p.evaluate(fields) for p in self.predicates)
+
+    def getMask(self, index, positions):
+        mask = np.zeros(len(positions), dtype=bool)
+        for p in self.predicates:
+            mask |= p.getMask(index, positions)
+        return mask
+
+    def getConjuncts(self):
+        return [self]
+
+    def __repr__(self):
+        return '(' + ' or '.join(repr(p) for p in self.predicates) + ')'
+
+
+class Constant(Predicate):
+    """
+    Condition that all records satisfy or none does.
+    """
+
+    def __init__(self, value):
+        self.value = bool(value)
+
+    def getKeywords(self):
+        return set()
+
+    def evaluate(self, fields):
+        return self.value
+
+    def getMask(self, index, positions):
+        return np.zeros(len(positions), dtype=bool) | self.value
+
+    def __repr__(self):
+        return repr(self.value)
+
+
+def createConjunction(criteriaDict):
+    """
+    Returns the conjunction of keyword == value of criteriaDict. Records
+    have no value for unknown keywords, so these match only None.
+    """
+    return And(*[Eq(k, v) if k in dba.entryFields else Constant(v is None)
+                 for k, v in sorted(criteriaDict.items())])
+
+
+class QueryPlan(object):
+    """
+    Report of a query execution: the databases answered from the
+    index, the databases in which the index left no matching records,
+    the scanned databases and the number of unpickled records.
+    """
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+        self.indexedDbs = []
+        self.prunedDbs = []
+        self.scannedDbs = []
+        self.unpickled = 0
+        self.index = None
+
+    def getReport(self):
+        return '\n'.join([
+            'query: {0!r}'.format(self.predicate),
+            'index: {0}'.format(self.index),
+            'answered from index: {0}'.format(sorted(self.indexedDbs)),
+            'pruned: {0}'.format(sorted(self.prunedDbs)),
+            'scanned: {0}'.format(sorted(self.scannedDbs)),
+            'unpickled records: {0}'.format(self.unpickled)])
+
+    def printReport(self):
+        print self.getReport()
+
+
+def selectKeysFromIndex(dbName, keys, predicate):
+    index = paramIndex.getIndex(dbName)
+    keys = list(keys)
+    positions = index.getPositions(keys)
+    mask = predicate.getMask(index, positions)
+    return set(index.keys[positions[mask]])
+
+
+def scanDb(dbName, keys, predicate, plan):
+    keywords = list(predicate.getKeywords())
+    db = dba.shelvePool.getShelve(dbName)
+    split = dba.isSplitStorage(dbName)
+    selected = set()
+    for key in dba.orderKeysByStorage(
+            db, keys, dba.shelvePool.getStorageOrder(dbName)):
+        plan.unpickled += 1
+        entryData = dba.readEntry(db, dbName, key, split)
+        if predicate.evaluate(dba.extractFields(entryData, keywords)):
+            selected.add(key)
+    return selected
+
+
+def executeQuery(subset, predicate):
+    """
+    (iterable, Predicate) -> (set, QueryPlan)
+    Returns the simIds of subset that satisfy predicate. Each database
+    is answered from its parameter index when all keywords are indexed.
+    Otherwise the indexed conjuncts narrow the keys before a single
+    scan evaluates the whole predicate on the remaining records.
+    """
+    plan = QueryPlan(predicate)
+    simIds = set()
+    dbKeys = dba.getDbKeysFromSubset(subset)
+    indexedPart = And(*[p for p in predicate.getConjuncts()
+                        if p.isIndexed()])
+    for dbName in sorted(dbKeys.keys()):
+        keys = dbKeys[dbName]
+        if predicate.isIndexed():
+            keys = selectKeysFromIndex(dbName, keys, predicate)
+            plan.indexedDbs.append(dbName)
+            plan.index = indexName
+            if len(keys) == 0:
+                plan.prunedDbs.append(dbName)
+        else:
+            if len(indexedPart.predicates) > 0:
+                keys = selectKeysFromIndex(dbName, keys, indexedPart)
+                plan.index = indexName
+            if len(keys) == 0:
+                plan.prunedDbs.append(dbName)
+                continue
+            keys = scanDb(dbName, keys, predicate, plan)
+            plan.scannedDbs.append(dbName)
+        simIds.update(dba.createUniqueEntryKey(dbName, k) for k in keys)
+    return simIds, plan
+
+
+def selectSimIds(subset, predicate):
+    return executeQuery(subset, predicate)[0]
@@ -1,26 +1,28 @@
 import numpy as np
 
 
-def dotProd(a, b):
-    a = np.array(a)
-    b = np.array(b)
+def dotProd(a, b, dtype=None):
+    a = np.asarray(a, dtype=dtype)
+    b = np.asarray(b, dtype=dtype)
     assert a.shape == b.shape
     assert len(a.shape) == 1
-    return sum(np.prod([a, b], axis=0))
+    return np.dot(a, b)
 
 
-def calcAbsoluteArea(x, y):
-    x = np.array(x)
-    y = np.array(y)
+def calcAbsoluteArea(x, y, dtype=None):
+    """
+    Returns the trapezoidal area of abs(y) over the sorted, non-negative
+    x values. dtype=np.float32 calculates in single precision.
+    """
+    x = np.asarray(x, dtype=dtype)
+    y = np.asarray(y, dtype=dtype)
     assert x.shape == y.shape
     assert len(x.shape) == 1
-    assert min(x) >= 0
-    area = 0
-    for i in range(len(x) - 1):
-        a = x[i + 1] - x[i]
-        assert a >= 0
-        area += 0.5 * (abs(y[i]) + abs(y[i + 1])) * a
-    return area
+    assert np.min(x) >= 0
+    dx = np.diff(x)
+    assert np.all(dx >= 0)
+    absY = np.abs(y)
+    return np.dot(0.5 * (absY[:-1] + absY[1:]), dx)
 
 
 def calcDotProdDiff(analysisData, analyticalData):
@@ -38,13 +40,55 @@ def calcAreaDiff(angles, analysisData, analyticalData):
     return float(analysisArea - analyticalArea) / float(analyticalArea)
 
 
-def contourAveraging(contoursDict, numCont):
-    assert len(contoursDict.keys()) >= numCont
+contourEstimators = ['mean', 'trimmedMean', 'median']
+# fraction of the window contours cut from each end by 'trimmedMean'
+contourTrim = 0.2
+
+
+def stackContours(contoursDict):
+    """
+    Returns the sorted contour keys and the contours as a 2-D
+    (contour, angle) array in the same order.
+    """
+    keys = sorted(contoursDict.keys())
+    return keys, np.array([contoursDict[k] for k in keys], dtype=float)
+
+
+def calcContourEstimates(stack, numCont, estimators=None, start=None,
+                         trim=contourTrim):
+    """
+    (array, int, list, int, float) -> dict
+    Returns the estimators (all of contourEstimators by default) of the
+    window of numCont contours of the (contour, angle) stack starting at
+    contour start, the centered window by default. The median and the
+    trimmed mean share one sort of the window.
+    """
+    numContours = len(stack)
+    assert numContours >= numCont
     assert numCont >= 1
-    start = int((len(contoursDict.keys()) - numCont) / 2)
-    end = start + numCont
-    keys = sorted(contoursDict.keys())[start:end]
-    return np.sum([contoursDict[k] for k in keys], axis=0) / float(len(keys))
+    if start is None:
+        start = int((numContours - numCont) / 2)
+    assert start >= 0 and start + numCont <= numContours
+    estimators = contourEstimators if estimators is None else estimators
+    window = stack[start:start + numCont]
+    estimates = {}
+    if 'mean' in estimators:
+        estimates['mean'] = np.sum(window, axis=0) / float(numCont)
+    if 'trimmedMean' in estimators or 'median' in estimators:
+        ordered = np.sort(window, axis=0)
+        cut = int(trim * numCont)
+        if 'trimmedMean' in estimators:
+            estimates['trimmedMean'] = np.mean(
+                ordered[cut:numCont - cut], axis=0)
+        if 'median' in estimators:
+            half = numCont // 2
+            estimates['median'] = (
+                ordered[half] if numCont % 2 else
+                0.5 * (ordered[half - 1] + ordered[half]))
+    for e in estimators:
+        if e not in estimates:
+            raise KeyError(e)
+    return estimates
 
 
 def calcErrors(analytical, analysis):
@@ -71,26 +115,32 @@ def calcRMSD(analytical, analysis):
     return rmsd
 
 
-def calcNormErrors(analytical, analysis, domain, eSignFactor):
+def calcNormErrors(analytical, analysis, domain, eSignFactor, dtype=None):
     """
     (array, array, array, str) -> array, array
     """
     assert len(analytical) == len(analysis)
     assert len(domain) == len(analysis)
-    a = np.array(analytical)
-    f = np.array(analysis)
-    e = [float(fi - ai) / max(abs(a)) for ai, fi in zip(a, f)]
+    a = np.asarray(analytical, dtype=dtype)
+    f = np.asarray(analysis, dtype=dtype)
+    maxA = np.max(np.abs(a))
+    if maxA == 0 and not isInexact(a):
+        raise ZeroDivisionError('integer division by zero')
+    if dtype is None:
+        a, f = a.astype(float), f.astype(float)
+    e = divideErrors(f - a, maxA)
     if eSignFactor == 'dotProd':
         s = (-1 if dotProd(a, a) > dotProd(f, f) else 1)
     elif eSignFactor == 'areas':
-        areaDiff = calcAreaDiff(domain, analysis, analytical)
+        areaDiff = calcAreaDiff(np.asarray(domain, dtype=dtype), f, a)
         s = (-1 if areaDiff < 0 else 1)
     else:
         raise KeyError(eSignFactor)
-    return np.array(e), s
+    return e, s
 
 
-def calcAvgNormError(analytical, analysis, domain, eSignFactor):
+def calcAvgNormError(analytical, analysis, domain, eSignFactor,
+                     dtype=None):
     """
     (array, array, array, string) -> float
     Returns the averaged normalized difference between the
@@ -102,46 +152,269 @@ def calcAvgNormError(analytical, analysis, domain, eSignFactor):
     >>> 0.24
     """
     errors, sign = calcNormErrors(
-        analytical, analysis, domain, eSignFactor)
-    return sign * sum(abs(errors)) / float(len(domain))
+        analytical, analysis, domain, eSignFactor, dtype)
+    return sign * np.sum(np.abs(errors)) / float(len(domain))
 
 
-def calcMaxNormError(analytical, analysis, domain, eSignFactor):
+def calcMaxNormError(analytical, analysis, domain, eSignFactor,
+                     dtype=None):
     """
     (array, array, array, string) -> float
-
+    Returns the normalized error of the largest magnitude, the first one
+    if several have the same magnitude.
     """
     errors, sign = calcNormErrors(
-        analytical, analysis, domain, eSignFactor)
-    maxE = 0
-    for e in errors:
-        if abs(e) > abs(maxE):
-            maxE = e
-    return maxE
+        analytical, analysis, domain, eSignFactor, dtype)
+    return pickMaxError(np.asarray(errors))
 
 
-def calcStatsWrapper(statKey, angles, analytical, analysis, eSign):
-    if statKey == 'areaDiff':
-        return calcAreaDiff(angles=angles, analysisData=analysis,
-                            analyticalData=analytical)
-    elif statKey == 'dotProd':
-        return calcDotProdDiff(analysisData=analysis,
-                               analyticalData=analytical)
-    elif statKey == 'avgNormError':
-        return calcAvgNormError(
-            analytical=analytical,
-            analysis=analysis,
-            domain=angles,
-            eSignFactor=eSign)
-    elif statKey == 'maxNormError':
-        return calcMaxNormError(
-            analytical=analytical,
-            analysis=analysis,
-            domain=angles,
-            eSignFactor=eSign)
-    elif statKey == 'difference':
-        return calcDiffErrors(analytical=analytical, analysis=analysis)
-    elif statKey == 'rmsd':
-        return calcRMSD(analytical=analytical, analysis=analysis)
+def isInexact(a):
+    return np.issubdtype(np.asarray(a).dtype, np.inexact)
+
+
+def divideErrors(differences, maxA):
+    """
+    Returns differences / maxA, inf or nan for a zero maxA as the float
+    division of the loop implementation gave.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return differences / maxA
+
+
+def pickMaxError(errors):
+    """
+    Returns the error of the largest magnitude, the first one if several
+    have the same magnitude, skipping nan errors; 0 if there is none.
+    """
+    if len(errors) == 0:
+        return 0
+    absErrors = np.abs(errors)
+    i = np.argmax(np.where(np.isnan(absErrors), -1, absErrors))
+    return 0 if np.isnan(errors[i]) else errors[i]
+
+
+statKeys = ['areaDiff', 'dotProd', 'avgNormError', 'maxNormError',
+            'difference', 'rmsd']
+signedStatKeys = ['avgNormError', 'maxNormError']
+eSignFactors = ['areas', 'dotProd']
+
+
+def calcTrapezoidAreas(x, ys):
+    """
+    Returns the absolute areas under each of the 1-D arrays ys over x,
+    as calcAbsoluteArea, or the exception calcAbsoluteArea raises.
+    """
+    if len(x) == 0:
+        return ValueError('min() arg is an empty sequence')
+    dx = np.diff(x)
+    if np.min(x) < 0 or np.any(dx < 0):
+        return AssertionError('x values are negative or not sorted')
+    return [float(np.dot(0.5 * (np.abs(y[:-1]) + np.abs(y[1:])), dx))
+            for y in ys]
+
+
+def calcStats(angles, analytical, analysis, metrics=None, eSigns=None):
+    """
+    (array, array, array, list, list) -> dict
+    Calculates the statistics metrics of calcStatsWrapper (all by
+    default) in one vectorized pass over the arrays, sharing the areas,
+    dot products and norm errors between them. avgNormError and
+    maxNormError are dicts of the values of the eSigns sign conventions
+    (both by default). A statistic that cannot be calculated holds the
+    exception its function raises, e.g. ZeroDivisionError for zero
+    analytical values; use getStat to read the statistics.
+    """
+    metrics = statKeys if metrics is None else metrics
+    eSigns = eSignFactors if eSigns is None else eSigns
+    for statKey in metrics:
+        if statKey not in statKeys:
+            raise KeyError(
+                '{0} does not correspond to a function'.format(statKey))
+    signed = [m for m in metrics if m in signedStatKeys]
+    a = np.asarray(analytical, dtype=float)
+    f = np.asarray(analysis, dtype=float)
+    x = np.asarray(angles, dtype=float)
+    assert a.shape == f.shape
+    assert len(a.shape) == 1
+    n = len(a)
+    stats = {}
+    if 'difference' in metrics:
+        stats['difference'] = np.abs(f) - np.abs(a)
+    if 'rmsd' in metrics and n == 0:
+        stats['rmsd'] = ZeroDivisionError('rmsd of empty arrays')
+    elif 'rmsd' in metrics:
+        stats['rmsd'] = float(np.sqrt(np.dot(a - f, a - f) / float(n)))
+    if 'dotProd' in metrics or (signed and 'dotProd' in eSigns):
+        aa = np.dot(a, a)
+        ff = np.dot(f, f)
+    if 'dotProd' in metrics and aa == 0:
+        stats['dotProd'] = ZeroDivisionError('analytical dot product is 0')
+    elif 'dotProd' in metrics:
+        stats['dotProd'] = float((ff - aa) / aa)
+    if 'areaDiff' in metrics or (signed and 'areas' in eSigns):
+        if x.shape != a.shape:
+            areas = AssertionError('angles and data differ in length')
+        else:
+            areas = calcTrapezoidAreas(x, [f, a])
+        if isinstance(areas, Exception):
+            areaDiff = areas
+        elif areas[1] == 0:
+            areaDiff = ZeroDivisionError('analytical area is 0')
+        else:
+            areaDiff = (areas[0] - areas[1]) / areas[1]
+        if 'areaDiff' in metrics:
+            stats['areaDiff'] = areaDiff
+    if len(signed) == 0:
+        return stats
+    signs = {}
+    if 'dotProd' in eSigns:
+        signs['dotProd'] = -1 if aa > ff else 1
+    if 'areas' in eSigns and isinstance(areaDiff, Exception):
+        signs['areas'] = areaDiff
+    elif 'areas' in eSigns:
+        signs['areas'] = -1 if areaDiff < 0 else 1
+    if len(x) != n:
+        errors = AssertionError('domain and data differ in length')
+    elif n > 0 and np.max(np.abs(a)) == 0 and not isInexact(analytical):
+        errors = ZeroDivisionError('integer analytical values are 0')
     else:
+        errors = divideErrors(f - a, np.max(np.abs(a))) if n > 0 else f
+    values = {'avgNormError': {}, 'maxNormError': {}}
+    for eSign in eSigns:
+        if isinstance(errors, Exception) or isinstance(
+                signs[eSign], Exception):
+            failed = errors if isinstance(errors, Exception) else signs[eSign]
+            values['avgNormError'][eSign] = failed
+            values['maxNormError'][eSign] = failed
+            continue
+        if n == 0:
+            values['avgNormError'][eSign] = ZeroDivisionError(
+                'average of empty arrays')
+            values['maxNormError'][eSign] = 0
+        else:
+            absErrors = np.abs(errors)
+            values['avgNormError'][eSign] = float(
+                signs[eSign] * np.sum(absErrors) / float(n))
+            values['maxNormError'][eSign] = float(pickMaxError(errors))
+    for statKey in signed:
+        stats[statKey] = values[statKey]
+    return stats
+
+
+def padRows(rows):
+    """
+    (list of 1-D arrays) -> array, array
+    Returns the rows as one (len(rows), max row length) array padded
+    with zeros at the end of the shorter rows and the mask of the valid
+    entries.
+    """
+    rows = [np.asarray(r, dtype=float) for r in rows]
+    for r in rows:
+        assert len(r.shape) == 1
+    lengths = np.array([len(r) for r in rows], dtype=int)
+    width = lengths.max() if len(rows) > 0 else 0
+    mask = np.arange(width) < lengths[:, np.newaxis]
+    padded = np.zeros((len(rows), width))
+    if len(rows) > 0:
+        padded[mask] = np.concatenate(rows)
+    return padded, mask
+
+
+def calcStatsBatch(angles, analytical, analysis, mask=None):
+    """
+    (array, array, array, array) -> dict
+    Calculates the statistics of calcStats for many simulations at once.
+    analytical and analysis are (simulations, angles) arrays and angles
+    is either their shared angle grid or a 2-D array of the same shape.
+    Ragged inputs are padded at the end of the rows and mask marks the
+    valid entries, as returned by padRows. Returns the statistics in the
+    layout of calcStats with an array of values per statistic, NaN where
+    calcStats would hold a ZeroDivisionError.
+    """
+    a = np.asarray(analytical, dtype=float)
+    f = np.asarray(analysis, dtype=float)
+    assert a.shape == f.shape
+    assert len(a.shape) == 2
+    x = np.broadcast_to(np.asarray(angles, dtype=float), a.shape)
+    if mask is None:
+        mask = np.ones(a.shape, dtype=bool)
+    assert mask.shape == a.shape
+    assert np.all(mask[:, 1:] <= mask[:, :-1])  # padded at the row ends
+    a = np.where(mask, a, 0)
+    f = np.where(mask, f, 0)
+    counts = mask.sum(axis=1).astype(float)
+    pairs = mask[:, 1:] & mask[:, :-1]
+    dx = np.diff(x, axis=1)
+    assert np.all(x[mask] >= 0) and np.all(dx[pairs] >= 0)
+    stats = {'difference': np.abs(f) - np.abs(a)}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stats['rmsd'] = np.where(
+            counts > 0, np.sqrt(np.sum((a - f) ** 2, axis=1) / counts),
+            np.nan)
+        aa = np.sum(a * a, axis=1)
+        ff = np.sum(f * f, axis=1)
+        stats['dotProd'] = np.where(aa != 0, (ff - aa) / aa, np.nan)
+        areas = [np.sum(0.5 * (np.abs(y[:, :-1]) + np.abs(y[:, 1:])) *
+                        np.where(pairs, dx, 0), axis=1) for y in (f, a)]
+        stats['areaDiff'] = np.where(
+            (areas[1] != 0) & (counts > 0),
+            (areas[0] - areas[1]) / areas[1], np.nan)
+        signs = {'dotProd': np.where(aa > ff, -1., 1.),
+                 'areas': np.where(stats['areaDiff'] < 0, -1., 1.)}
+        signs['areas'][np.isnan(stats['areaDiff'])] = np.nan
+        maxAbs = np.max(np.abs(a), axis=1) if a.shape[1] > 0 else counts
+        errors = (f - a) / maxAbs[:, np.newaxis]
+        errors[~mask] = 0
+        absErrors = np.abs(errors)
+        maxErrors = errors[np.arange(len(a)), np.argmax(
+            np.where(np.isnan(absErrors), -1, absErrors), axis=1)] \
+            if a.shape[1] > 0 else np.zeros(len(a))
+        maxErrors = np.where((counts > 0) & ~np.isnan(maxErrors),
+                             maxErrors, 0)
+        stats['avgNormError'] = {}
+        stats['maxNormError'] = {}
+        for eSign in eSignFactors:
+            stats['avgNormError'][eSign] = \
+                signs[eSign] * np.sum(absErrors, axis=1) / counts
+            stats['maxNormError'][eSign] = np.where(
+                np.isnan(signs[eSign]), np.nan, maxErrors)
+    return stats
+
+
+def selectBatchStats(stats, index, length):
+    """
+    Returns the statistics of simulation index of calcStatsBatch in the
+    layout of calcStats, with the difference array cut to length.
+    """
+    selected = {'difference': stats['difference'][index, :length]}
+    for statKey in statKeys:
+        if statKey in signedStatKeys:
+            selected[statKey] = dict(
+                (eSign, float(stats[statKey][eSign][index]))
+                for eSign in eSignFactors)
+        elif statKey != 'difference':
+            selected[statKey] = float(stats[statKey][index])
+    return selected
+
+
+def getStat(stats, statKey, eSign):
+    """
+    Returns statistic statKey of the stats of calcStats, raising the
+    exception of a statistic that could not be calculated.
+    """
+    if statKey not in statKeys:
+        raise KeyError('{0} does not correspond to a function'.format(statKey))
+    value = stats[statKey]
+    if statKey in signedStatKeys:
+        if eSign not in value:
+            raise KeyError(eSign)
+        value = value[eSign]
+    if isinstance(value, Exception):
+        raise value
+    return value
+
+
+def calcStatsWrapper(statKey, angles, analytical, analysis, eSign):
+    if statKey not in statKeys:
         raise KeyError('{0} does not correspond to a function'.format(statKey))
+    return getStat(calcStats(angles, analytical, analysis), statKey, eSign)
@@ -0,0 +1,175 @@
+import os
+import numpy as np
+import dbaccess as dba
+
+indexFileSuffix = '.paramindex.npz'
+# index files of another format are rebuilt
+indexFormat = 2
+indexedParameters = [
+    'a', 'b', 'crackRatio', 'sigma', 'gamma', 'omega',
+    'h', 'd', 'E', 'v',
+    'czrSeeds', 'crSeeds', 'czmSeeds', 'arcSeeds',
+    'allEdges', 'crackEdges',
+    'analysisType', 'modelType', 'elements', 'transform',
+    'analysisSuccess']
+loadedIndexes = {}
+
+
+class ParamIndex(object):
+    """
+    Scalar parameters of all records of one database stored column-wise,
+    one numpy array per parameter, in the order of the keys array.
+    """
+
+    def __init__(self, dbName, fingerprint, keys, columns):
+        self.dbName = dbName
+        self.fingerprint = fingerprint
+        self.keys = np.array(keys, dtype=object)
+        self.columns = columns
+        self.positions = dict(
+            (key, i) for i, key in enumerate(self.keys))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def hasParameter(self, parameterKey):
+        return parameterKey in self.columns
+
+    def getPositions(self, keys):
+        return np.array([self.positions[k] for k in keys], dtype=int)
+
+    def getColumn(self, parameterKey):
+        return self.columns[parameterKey]
+
+    def getValues(self, parameterKey, keys):
+        positions = self.getPositions(keys)
+        return dict(zip(self.keys[positions],
+                        self.columns[parameterKey][positions].tolist()))
+
+    def getMask(self, parameterKey, criterion):
+        return equalsMask(self.columns[parameterKey], criterion)
+
+    def selectKeys(self, keys, parameterKey, criterion):
+        positions = self.getPositions(keys)
+        mask = self.getMask(parameterKey, criterion)[positions]
+        return set(self.keys[positions[mask]])
+
+
+def isIndexed(parameterKey):
+    return parameterKey in indexedParameters
+
+
+def isNumber(value):
+    return (isinstance(value, (int, long, float, np.number)) and
+            not isinstance(value, (bool, np.bool_)))
+
+
+def createColumn(values):
+    if len(values) > 0 and all(isNumber(v) for v in values):
+        return np.array(values)
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def equalsMask(column, criterion):
+    """
+    Returns the mask of the values of column that are == criterion, as
+    the comparison of the scanned record values, e.g. 1 == True.
+    """
+    if column.dtype != object and not isinstance(
+            criterion, (int, long, float, np.number, np.bool_)):
+        return np.zeros(len(column), dtype=bool)
+    return np.asarray(column == criterion, dtype=bool)
+
+
+def extractIndexValue(entryData, parameterKey):
+    try:
+        return dba.extractDataFromEntry(entryData, parameterKey)
+    except (KeyError, TypeError, ZeroDivisionError):
+        return None
+
+
+def extractIndexValues(entryData):
+    try:
+        return dba.extractFields(entryData, indexedParameters)
+    except (KeyError, TypeError, ZeroDivisionError):
+        return dict((p, extractIndexValue(entryData, p))
+                    for p in indexedParameters)
+
+
+def buildIndex(dbName):
+    db, fingerprint = dba.shelvePool.getVersionedShelve(dbName)
+    keys = [k for k in db.keys() if k not in dba.dbEntyKeysToSkip]
+    values = dict((p, []) for p in indexedParameters)
+    for key in keys:
+        entryValues = extractIndexValues(db[key])
+        for p in indexedParameters:
+            values[p].append(entryValues[p])
+    columns = dict((p, createColumn(values[p])) for p in indexedParameters)
+    return ParamIndex(dbName, fingerprint, keys, columns)
+
+
+def getIndexPath(dbName):
+    repoDir = dba.discoveryCache.getRepoDir()
+    return os.path.join(repoDir, dbName, dbName + indexFileSuffix)
+
+
+def saveIndex(index):
+    arrays = dict(('col_' + p, index.columns[p]) for p in index.columns)
+    arrays['keys'] = index.keys
+    arrays['fingerprint'] = np.array(index.fingerprint)
+    arrays['format'] = np.array(indexFormat)
+    with open(getIndexPath(index.dbName), 'wb') as f:
+        np.savez(f, **arrays)
+
+
+def loadIndex(dbName):
+    with np.load(getIndexPath(dbName), allow_pickle=True) as data:
+        if 'format' not in data.files or int(data['format']) != indexFormat:
+            return None
+        columns = dict((f[4:], data[f]) for f in data.files
+                       if f.startswith('col_'))
+        return ParamIndex(dbName, str(data['fingerprint']),
+                          list(data['keys']), columns)
+
+
+def getIndex(dbName):
+    fingerprint = dba.getShelveFingerprint(dbName)
+    index = loadedIndexes.get(dbName)
+    if index is not None and index.fingerprint == fingerprint:
+        return index
+    try:
+        index = loadIndex(dbName)
+    except (IOError, OSError, ValueError, KeyError):
+        index = None
+    if index is None or index.fingerprint != fingerprint:
+        index = buildIndex(dbName)
+        try:
+            saveIndex(index)
+        except (IOError, OSError):
+            print 'Could not save the parameter index of {0}'.format(dbName)
+    loadedIndexes[dbName] = index
+    return index
+
+
+def clearLoadedIndexes():
+    loadedIndexes.clear()
+
+
+def extractSimIdParamValues(dbKeys, parameterKey):
+    simIdVals = {}
+    for dbName in dbKeys.keys():
+        values = getIndex(dbName).getValues(parameterKey, dbKeys[dbName])
+        for key, val in values.items():
+            simIdVals[dba.createUniqueEntryKey(dbName, key)] = val
+    return simIdVals
+
+
+def selectSimIds(dbKeys, parameterKey, criterion):
+    simIds = set()
+    for dbName in dbKeys.keys():
+        keys = getIndex(dbName).selectKeys(
+            dbKeys[dbName], parameterKey, criterion)
+        simIds.update(dba.createUniqueEntryKey(dbName, k) for k in keys)
+    return simIds
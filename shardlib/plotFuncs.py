@@ -5,6 +5,7 @@ import numpy as np
 import scipy.stats as stats
 import trees
 import dbaccess as dba
+import dbquery
 import dataProcessing as dp
 import sessionFuncs as sf
 from types import *
@@ -37,19 +38,21 @@ def getBranchSimIdsByCriteria(treeRoot, criteria):
 
 
 def filterSimIds(simIds, criteriaDict):
-    simKeys = simIds
-    for parKey in criteriaDict.keys():
-        simKeys = dba.getSubsetByCriterion(
-            simKeys, parKey, criteriaDict[parKey])
-    return set(simKeys)
+    """
+    Returns the simIds that match all keyword values of criteriaDict.
+    """
+    return dbquery.selectSimIds(
+        simIds, dbquery.createConjunction(criteriaDict))
 
 # XFEM CP
 
 
 def getCeAeError(simId, errType, sif, successful=True):
-    ad = dp.AnalysisData(simId)
-    ad.calcAnSol()
-    ad.calculateStats()
+    return getAnalysisDataCeAeError(
+        dp.getAnalysisData(simId, metrics=[errType]), errType, sif, successful)
+
+
+def getAnalysisDataCeAeError(ad, errType, sif, successful=True):
     ce = ad.getMeshParams()['crackEdges']
     ae = ad.getMeshParams()['allEdges']
     if successful:
@@ -61,17 +64,21 @@ def getCeAeError(simId, errType, sif, successful=True):
 
 
 def createCeAeDataStr(simIds, errType, sif, successful):
+    analysisData = dict(dp.iterAnalysisData(simIds))
     data = {}
     for simId in simIds:
-        key, err = getCeAeError(simId, errType, sif, successful)
+        key, err = getAnalysisDataCeAeError(
+            analysisData[simId], errType, sif, successful)
         data[key] = (simId, err)
     return data
 
 
 def getDiamHeightError(simId, errType, sif):
-    ad = dp.AnalysisData(simId)
-    ad.calcAnSol()
-    ad.calculateStats()
+    return getAnalysisDataDiamHeightError(
+        dp.getAnalysisData(simId, metrics=[errType]), errType, sif)
+
+
+def getAnalysisDataDiamHeightError(ad, errType, sif):
     d = ad.getContainerDiam()
     h = ad.getContainerHeight()
     err = ad.getErrorReports()[errType][sif]
@@ -81,8 +88,8 @@ def getDiamHeightError(simId, errType, sif):
 
 def createD_H_SimId_Err_ValDataStr(simIds, errType, sif):
     data = {}
-    for simId in simIds:
-        key, err = getDiamHeightError(simId, errType, sif)
+    for simId, ad in dp.iterAnalysisData(simIds):
+        key, err = getAnalysisDataDiamHeightError(ad, errType, sif)
         if key not in data.keys():
             data[key] = []
         data[key].append((simId, err))
@@ -214,8 +221,9 @@ def createContourPlot4(dataDict, fig, errorType, selected=None, levels=25):
 # 3D scatter plot funcs
 def get3dScatterPlotData(simIds):
     diams, heights, aes = [], [], []
-    for simId in simIds:
-        dob = dp.AnalysisData(simId)
+    for simId, entryData in dba.iterEntriesData(simIds):
+        dob = dp.AnalysisData(simId, entryData=entryData,
+                              projection='mesh')
         d, h, ae = dob.get3dScatterPlotData()
         diams.append(d)
         heights.append(h)
@@ -352,9 +360,7 @@ def plotSimId(simId, fig):
         'K1': '$K_{I}$ errors [%]',
         'K2': '$K_{II}$ errors [%]',
         'K3': '$K_{III}$ errors [%]'}
-    ad = dp.AnalysisData(simId)
-    ad.calcAnSol()
-    ad.calculateStats()
+    ad = dp.getAnalysisData(simId)
     angles = np.array(ad.getAngles())
     axes = []
     for i in range(len(sifs)):
@@ -188,8 +188,9 @@ class CompQueue(object):
         count = 1
         print '|Num. |        Container            |   Seed Parameters'
         print '|-----|-----------------------------|----------------------------------'
+        entries = dba.getEntriesData(self.queue)
         for s in sorted(list(self.queue)):
-            ad = dp.AnalysisData(s)
+            ad = dp.AnalysisData(s, entryData=entries[s], projection='mesh')
             num = '|{0}{1} |'.format(' ' * (4 - len(str(count))), count)
             num = num + self.getGeomParamRepr(ad)
             num = num + self.getMeshParamRepr(ad)
@@ -203,16 +204,12 @@ class CompQueue(object):
         sifs = ['K1', 'K2', 'K3']
         ylabels = {'K1': '$K_{I}$', 'K2': '$K_{II}$', 'K3': '$K_{III}$'}
         res = []
-        ad = dp.AnalysisData(q[0])
-        ad.calcAnSol()
-        ad.calculateStats()
+        ad = dp.getAnalysisData(q[0])
         for i in range(len(sifs)):
             axes.append(fig.add_subplot(len(sifs) * 100 + 10 + (i + 1)))
-            analytical = axes[i].plot(ad.getAngles(), ad.getAnSol()[sifs[i]])
+            analytical = axes[i].plot(*ad.getAnSolCurve(sifs[i]))
             for simId in q:
-                ad1 = dp.AnalysisData(simId)
-                ad1.calcAnSol()
-                ad1.calculateStats()
+                ad1 = dp.getAnalysisData(simId)
                 res = res + axes[i].plot(ad1.getAngles(),
                                          ad1.getResults()[sifs[i]])
             axes[i].set_ylabel(ylabels[sifs[i]])
@@ -0,0 +1,284 @@
+import os
+import numpy as np
+import dbaccess as dba
+
+storeDirName = 'resultsStore'
+offsetsFileName = 'offsets.npz'
+anglesFileName = 'angles.npy'
+loadedStores = {}
+# fingerprints of the databases whose store could not be loaded
+missingStores = {}
+
+
+class ResultsStore(object):
+    """
+    Angles and SIF contours of the successful records of one database in
+    flat arrays. The angles of a record are a slice of the angles array
+    and the contours of a record and SIF are stored one after another,
+    so they are read as a 2-D (contour, angle) view. The arrays are
+    memory mapped and the views are not copied.
+    """
+
+    def __init__(self, dbName, fingerprint, offsets, angles, values):
+        self.dbName = dbName
+        self.fingerprint = fingerprint
+        self.offsets = offsets
+        self.angles = angles
+        self.values = values
+        self.positions = dict(
+            (key, i) for i, key in enumerate(offsets['keys']))
+
+    def getNumRecords(self):
+        return int(np.sum(self.offsets['angleStart'] >= 0))
+
+    def getSifs(self):
+        return sorted(self.values.keys())
+
+    def getPosition(self, key):
+        pos = self.positions.get(key)
+        if pos is None or self.offsets['angleStart'][pos] < 0:
+            return None
+        return pos
+
+    def hasRecord(self, key):
+        return self.getPosition(key) is not None
+
+    def getAngles(self, key):
+        pos = self.getPosition(key)
+        start = self.offsets['angleStart'][pos]
+        return self.angles[start:start + self.offsets['numAngles'][pos]]
+
+    def getContours(self, key, sif):
+        """
+        Returns the contours of a record as a (contour, angle) view, or
+        None if the record has no sif.
+        """
+        pos = self.getPosition(key)
+        if sif not in self.values or self.offsets['start_' + sif][pos] < 0:
+            return None
+        start = self.offsets['start_' + sif][pos]
+        numContours = self.offsets['numContours_' + sif][pos]
+        numAngles = self.offsets['numAngles'][pos]
+        flat = self.values[sif][start:start + numContours * numAngles]
+        return flat.reshape(numContours, numAngles)
+
+    def getContourKeys(self, key, sif):
+        pos = self.getPosition(key)
+        start = self.offsets['contourKeyStart_' + sif][pos]
+        numContours = self.offsets['numContours_' + sif][pos]
+        return list(self.offsets['contourKeys_' + sif][
+            start:start + numContours])
+
+    def getRawres(self, key, sif):
+        contours = self.getContours(key, sif)
+        if contours is None:
+            return None
+        return dict(zip(self.getContourKeys(key, sif), contours))
+
+    def getResults(self, key, sifs):
+        """
+        Returns the angles and the contour dicts of sifs of a record, or
+        None if the record or one of the sifs is not stored.
+        """
+        if not self.hasRecord(key):
+            return None
+        rawres = {}
+        for sif in sifs:
+            rawres[sif] = self.getRawres(key, sif)
+            if rawres[sif] is None:
+                return None
+        return self.getAngles(key), rawres
+
+    def getContourStacks(self, key, sifs):
+        """
+        Returns the angles and the (contour keys, contours) stacks of sifs
+        of a record as in AnalysisData.getContourStack, with the contours
+        as views of the store, or None if the record or one of the sifs
+        is not stored.
+        """
+        if not self.hasRecord(key):
+            return None
+        stacks = {}
+        for sif in sifs:
+            contours = self.getContours(key, sif)
+            if contours is None:
+                return None
+            stacks[sif] = (self.getContourKeys(key, sif), contours)
+        return self.getAngles(key), stacks
+
+
+def getStoreDir(dbName):
+    repoDir = dba.discoveryCache.getRepoDir()
+    return os.path.join(repoDir, dbName, storeDirName)
+
+
+def getRecordResults(entryData):
+    """
+    Returns the angles and the contours of all SIFs of a record as
+    arrays, or None if the record has no results or its contours do not
+    match its angles.
+    """
+    try:
+        res = entryData['odb']['results']
+        angles = np.asarray(res['sortedBetaAngles'], dtype=float)
+        sifs = res['sortedSIFs']
+    except (KeyError, TypeError):
+        return None
+    contours = {}
+    for sif in sifs.keys():
+        keys = sorted(sifs[sif].keys())
+        values = [np.asarray(sifs[sif][k], dtype=float) for k in keys]
+        if any(v.shape != angles.shape for v in values):
+            return None
+        contours[sif] = (keys, values)
+    return angles, contours
+
+
+def buildStoreArrays(dbName):
+    keys = []
+    angles = []
+    angleStart, numAngles = [], []
+    numAnglesTotal = 0
+    records = []
+    for simId, entryData in dba.iterEntriesData(
+            dba.filterDbKeys(dba.createUniqueEntryKey(dbName, k)
+                             for k in dba.getDbEntryKeys(dbName))):
+        try:
+            success = entryData['reports']['successfulAnalysis']
+        except KeyError:
+            success = False
+        results = getRecordResults(entryData) if success else None
+        keys.append(dba.splitUniqueEntryKey(simId)[1])
+        records.append(results)
+        if results is None:
+            angleStart.append(-1)
+            numAngles.append(0)
+        else:
+            angleStart.append(numAnglesTotal)
+            numAngles.append(len(results[0]))
+            angles.append(results[0])
+            numAnglesTotal += len(results[0])
+    sifs = sorted(set(s for r in records if r is not None for s in r[1]))
+    offsets = {'angleStart': np.array(angleStart, dtype=np.int64),
+               'numAngles': np.array(numAngles, dtype=np.int64)}
+    offsets['keys'] = np.empty(len(keys), dtype=object)
+    offsets['keys'][:] = keys
+    values = {}
+    for sif in sifs:
+        start, numContours, keyStart = [], [], []
+        flat, contourKeys = [], []
+        total = 0
+        for r in records:
+            keyStart.append(len(contourKeys))
+            if r is None or sif not in r[1]:
+                start.append(-1)
+                numContours.append(0)
+                continue
+            cKeys, cValues = r[1][sif]
+            start.append(total)
+            numContours.append(len(cKeys))
+            contourKeys.extend(cKeys)
+            flat.extend(cValues)
+            total += sum(len(v) for v in cValues)
+        offsets['start_' + sif] = np.array(start, dtype=np.int64)
+        offsets['numContours_' + sif] = np.array(numContours, dtype=np.int64)
+        offsets['contourKeyStart_' + sif] = np.array(keyStart, dtype=np.int64)
+        offsets['contourKeys_' + sif] = np.empty(
+            len(contourKeys), dtype=object)
+        offsets['contourKeys_' + sif][:] = contourKeys
+        values[sif] = np.concatenate(flat) if flat else np.array([])
+    angles = np.concatenate(angles) if angles else np.array([])
+    return offsets, angles, values
+
+
+def exportDb(dbName):
+    """
+    Writes the results store of database dbName to
+    <dbName>/resultsStore and returns it.
+    """
+    fingerprint = dba.getShelveFingerprint(dbName)
+    offsets, angles, values = buildStoreArrays(dbName)
+    storeDir = getStoreDir(dbName)
+    if not os.path.exists(storeDir):
+        os.makedirs(storeDir)
+    np.save(os.path.join(storeDir, anglesFileName), angles)
+    for sif in values.keys():
+        np.save(os.path.join(storeDir, sif + '.npy'), values[sif])
+    offsets['fingerprint'] = np.array(fingerprint)
+    offsets['sifs'] = np.array(sorted(values.keys()), dtype=object)
+    with open(os.path.join(storeDir, offsetsFileName), 'wb') as f:
+        np.savez(f, **offsets)
+    loadedStores.pop(dbName, None)
+    missingStores.pop(dbName, None)
+    return getStore(dbName)
+
+
+def exportRepository(dbNames=None):
+    if dbNames is None:
+        dbNames = dba.getShelveNames()
+    for dbName in sorted(dbNames):
+        store = exportDb(dbName)
+        print 'Exported results of {0}: {1} records'.format(
+            dbName, store.getNumRecords())
+
+
+def loadArray(path):
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        # empty arrays cannot be memory mapped
+        return np.load(path)
+
+
+def loadStore(dbName):
+    storeDir = getStoreDir(dbName)
+    with np.load(os.path.join(storeDir, offsetsFileName),
+                 allow_pickle=True) as data:
+        offsets = dict((f, data[f]) for f in data.files)
+    fingerprint = str(offsets.pop('fingerprint'))
+    sifs = list(offsets.pop('sifs'))
+    angles = loadArray(os.path.join(storeDir, anglesFileName))
+    values = dict((sif, loadArray(os.path.join(storeDir, sif + '.npy')))
+                  for sif in sifs)
+    return ResultsStore(dbName, fingerprint, offsets, angles, values)
+
+
+def getStore(dbName):
+    """
+    Returns the results store of database dbName, or None if it has not
+    been exported or the database has changed since the export. A store
+    that cannot be loaded is not looked up again until the database
+    changes or it is exported.
+    """
+    fingerprint = dba.getShelveFingerprint(dbName)
+    store = loadedStores.get(dbName)
+    if store is not None and store.fingerprint == fingerprint:
+        return store
+    if missingStores.get(dbName) == fingerprint:
+        return None
+    try:
+        store = loadStore(dbName)
+    except (IOError, OSError, ValueError, KeyError):
+        store = None
+    if store is None or store.fingerprint != fingerprint:
+        missingStores[dbName] = fingerprint
+        return None
+    loadedStores[dbName] = store
+    return store
+
+
+def findStore(simId):
+    parts = dba.splitUniqueEntryKey(simId)
+    if len(parts) != 2:
+        return None
+    try:
+        if not dba.isValidDbName(parts[0]):
+            return None
+        return getStore(parts[0])
+    except (IOError, OSError):
+        return None
+
+
+def clearLoadedStores():
+    loadedStores.clear()
+    missingStores.clear()
@@ -0,0 +1,73 @@
+import os
+import shelve
+import cPickle as pickle
+import dbaccess as dba
+
+
+def splitEntry(entryData):
+    """
+    Returns the header of a record, i.e. everything but the results
+    payload, and the payload or None if the record has no results.
+    """
+    header = dict(entryData)
+    header.pop(dba.payloadKey, None)
+    try:
+        payload = entryData[dba.payloadKey]
+    except KeyError:
+        payload = None
+    return header, payload
+
+
+def convertDb(dbName, destRepoDir):
+    """
+    Writes the records of database dbName into destRepoDir in split
+    storage: the headers to <dbName>/resultsDb/<dbName> and the results
+    payloads to <dbName>/resultsOdb/<dbName>. Returns the number of
+    converted records.
+    """
+    destDir = os.path.join(destRepoDir, dbName)
+    if os.path.exists(destDir):
+        raise IOError('{0} already exists'.format(destDir))
+    headerDir = os.path.join(destDir, dba.resultsDb)
+    payloadDir = os.path.join(destDir, dba.resultsOdb)
+    os.makedirs(headerDir)
+    os.makedirs(payloadDir)
+    src = dba.shelvePool.getShelve(dbName)
+    split = dba.isSplitStorage(dbName)
+    payloadDb = shelve.open(os.path.join(payloadDir, dbName), 'n',
+                            protocol=pickle.HIGHEST_PROTOCOL)
+    headerDb = shelve.open(os.path.join(headerDir, dbName), 'n',
+                           protocol=pickle.HIGHEST_PROTOCOL)
+    count = 0
+    try:
+        for key in src.keys():
+            entryData = dba.readEntry(src, dbName, key, split)
+            if key in dba.dbEntyKeysToSkip:
+                headerDb[key] = entryData
+                continue
+            header, payload = splitEntry(entryData)
+            if payload is not None:
+                payloadDb[key] = payload
+            headerDb[key] = header
+            count += 1
+    finally:
+        payloadDb.close()
+        headerDb.close()
+    return count
+
+
+def convertRepository(destRepoDir, dbNames=None):
+    """
+    Rewrites the databases of the repository, or dbNames, into
+    destRepoDir in split storage. Point dbaccess at destRepoDir to read
+    the converted repository.
+    """
+    repoDir = os.path.abspath(dba.discoveryCache.getRepoDir())
+    if os.path.abspath(destRepoDir) == repoDir:
+        raise IOError('Cannot convert the repository in place')
+    if dbNames is None:
+        dbNames = dba.getShelveNames()
+    for dbName in sorted(dbNames):
+        count = convertDb(dbName, destRepoDir)
+        print 'Converted {0}: {1} records'.format(dbName, count)
+    return sorted(dbNames)
@@ -3,7 +3,8 @@ import dataProcessing as dp
 import numpy as np
 import time
 import colorsys
-import copy
+import os
+import cPickle as pickle
 from types import *
 
 colLabels = ['Lvl', 'Branch', 'Total', 'Succ.', 'Fail', 'Graph']
@@ -13,6 +14,47 @@ treeLevelParameterNames = [
     'analysisType',
     'modelType',
     'elements']
+treeIndexFileName = 'treeindex.pickle'
+# tree index files of another format are rebuilt
+treeIndexFormat = 2
+
+
+class MemberSet(set):
+    """
+    Member set of a tree node, which invalidates the aggregated members
+    cached by the node and its ancestors when it is mutated. A copy is
+    not bound to a node; copied nodes bind new member sets to
+    themselves.
+    """
+
+    def __init__(self, node, members=()):
+        set.__init__(self, members)
+        self.node = node
+
+    def __reduce__(self):
+        return MemberSet, (None, list(self))
+
+    def invalidate(self):
+        node = getattr(self, 'node', None)
+        if node is not None:
+            node.invalidateMembers()
+
+
+def createMutator(name):
+    method = getattr(set, name)
+
+    def mutator(self, *args):
+        result = method(self, *args)
+        self.invalidate()
+        return result
+    mutator.__name__ = name
+    return mutator
+
+for name in ['add', 'clear', 'discard', 'pop', 'remove', 'update',
+             'difference_update', 'intersection_update',
+             'symmetric_difference_update',
+             '__ior__', '__iand__', '__isub__', '__ixor__']:
+    setattr(MemberSet, name, createMutator(name))
 
 
 class TreeNode(object):
@@ -21,6 +63,7 @@ class TreeNode(object):
         self.name = name
         self.parent = None
         self.children = []
+        self.memberCache = {}
         self.failedMembers = set()
         self.successfulMembers = set()
         self.xmark = 0
@@ -32,6 +75,42 @@ class TreeNode(object):
         self.currentMarker = '<--'
         self.cols = colLabels
 
+    @property
+    def successfulMembers(self):
+        return self._successfulMembers
+
+    @successfulMembers.setter
+    def successfulMembers(self, members):
+        self._successfulMembers = MemberSet(self, members)
+        self.invalidateMembers()
+
+    @property
+    def failedMembers(self):
+        return self._failedMembers
+
+    @failedMembers.setter
+    def failedMembers(self, members):
+        self._failedMembers = MemberSet(self, members)
+        self.invalidateMembers()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.memberCache = {}
+        self.successfulMembers = state['_successfulMembers']
+        self.failedMembers = state['_failedMembers']
+
+    def invalidateMembers(self):
+        """
+        Clears the aggregated members cached by the node and its
+        ancestors. A node only caches its members when all its
+        descendants have cached theirs, so the ancestors of a node
+        without a cache have none either.
+        """
+        node = self
+        while node is not None and node.memberCache:
+            node.memberCache = {}
+            node = node.parent
+
     def setParent(self, parent):
         if (isinstance(parent, NoneType) or
                 isinstance(parent, TreeNode)):
@@ -43,6 +122,7 @@ class TreeNode(object):
         if isinstance(child, TreeNode):
             self.children.append(child)
             self.sortChildren()
+            self.invalidateMembers()
         else:
             raise TypeError('child must be wither NoneType or TreeNode')
 
@@ -66,6 +146,17 @@ class TreeNode(object):
             for m in members:
                 setsDict[memberType].add(m)
 
+    def removeChild(self, child):
+        self.children.remove(child)
+        child.setParent(None)
+        self.invalidateMembers()
+
+    def removeMembersOfDbs(self, dbNames):
+        for members in [self.successfulMembers, self.failedMembers]:
+            for m in [m for m in members
+                      if dba.splitUniqueEntryKey(m)[0] in dbNames]:
+                members.remove(m)
+
     def addFailedMember(self, member):
         # self.failedMembers.add(member)
         self.addMembers(member, 'failed')
@@ -134,25 +225,35 @@ class TreeNode(object):
         return leaves
 
     def getSuccessfulMembers(self):
-        def getSM(node):
-            if node.getChildren() == []:
-                return node.successfulMembers
-            else:
-                ch = node.getChildren()
-                return frozenset().union(*[getSM(c) for c in ch])
-        return copy.deepcopy(getSM(self))
+        return self.getAggregatedMembers('successful')
 
     def getFailedMembers(self):
-        def getSM(node):
-            if node.getChildren() == []:
-                return node.failedMembers
-            else:
-                ch = node.getChildren()
-                return frozenset().union(*[getSM(c) for c in ch])
-        return copy.deepcopy(getSM(self))
+        return self.getAggregatedMembers('failed')
 
     def getAllMembers(self):
-        return self.getFailedMembers() | self.getSuccessfulMembers()
+        return self.getAggregatedMembers('all')
+
+    def getAggregatedMembers(self, memberType):
+        """
+        Returns the frozenset of the memberType members of the leaves
+        under the node, or of the node itself if it is a leaf. The sets
+        are cached until a member set or child of the node or of one of
+        its descendants changes.
+        """
+        if memberType not in self.memberCache:
+            if memberType == 'all':
+                members = (self.getAggregatedMembers('failed') |
+                           self.getAggregatedMembers('successful'))
+            elif self.getChildren() == []:
+                members = frozenset({'successful': self.successfulMembers,
+                                     'failed': self.failedMembers}[
+                                         memberType])
+            else:
+                members = frozenset().union(
+                    *[c.getAggregatedMembers(memberType)
+                      for c in self.getChildren()])
+            self.memberCache[memberType] = members
+        return self.memberCache[memberType]
 
     def getXMark(self):
         return self.xmark
@@ -366,11 +467,13 @@ class TreeNode(object):
                 stack = temp.getChildren() + stack
 
 
-def createTreeFromDbKeys(dbKeys):
-    root = TreeNode(treeRootNodeName)
-    for key in dbKeys:
+def createTreeFromDbKeys(dbKeys, root=None):
+    if root is None:
+        root = TreeNode(treeRootNodeName)
+    for key, entryData in dba.iterEntriesData(dbKeys):
         parent = root
-        anDataObj = dp.AnalysisData(key)
+        anDataObj = dp.AnalysisData(
+            key, entryData=entryData, projection='tree')
 
         for tlevel in treeLevelParameterNames:
             nodeName = anDataObj.getParameter(tlevel)
@@ -385,6 +488,104 @@ def createTreeFromDbKeys(dbKeys):
     return root
 
 
+def serializeTree(node):
+    return {'name': node.getName(),
+            'successful': sorted(node.successfulMembers),
+            'failed': sorted(node.failedMembers),
+            'children': [serializeTree(c) for c in node.getChildren()]}
+
+
+def deserializeTree(data, parent=None):
+    node = TreeNode(data['name'])
+    node.addMembers(data['successful'], 'successful')
+    node.addMembers(data['failed'], 'failed')
+    if parent is not None:
+        node.setParent(parent)
+        parent.setChild(node)
+    for child in data['children']:
+        deserializeTree(child, node)
+    return node
+
+
+def getTreeIndexPath():
+    return os.path.join(dba.discoveryCache.getRepoDir(), treeIndexFileName)
+
+
+def saveTree(root, fingerprints, path=None):
+    path = path or getTreeIndexPath()
+    data = {'levelNames': treeLevelParameterNames,
+            'format': treeIndexFormat,
+            'fingerprints': fingerprints,
+            'tree': serializeTree(root)}
+    with open(path, 'wb') as f:
+        pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+
+
+def loadTree(path=None):
+    """
+    Returns the tree stored in the tree index file and the database
+    fingerprints it was created from, or (None, {}) when there is no
+    usable tree index.
+    """
+    path = path or getTreeIndexPath()
+    try:
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+    except (IOError, EOFError, pickle.UnpicklingError):
+        return None, {}
+    if (data.get('levelNames') != treeLevelParameterNames or
+            data.get('format') != treeIndexFormat):
+        return None, {}
+    return deserializeTree(data['tree']), data['fingerprints']
+
+
+def removeDbsFromTree(root, dbNames):
+    for leaf in getTreeLeaves(root):
+        leaf.removeMembersOfDbs(dbNames)
+        node = leaf
+        while (node is not root and node.getChildren() == [] and
+               len(node.successfulMembers | node.failedMembers) == 0):
+            parent = node.getParent()
+            parent.removeChild(node)
+            node = parent
+
+
+def createTreeFromRepository(path=None, verbose=False):
+    """
+    Returns the index tree of all databases in the repository. The tree
+    is loaded from the tree index file and only databases that are new
+    or have changed since it was saved are indexed again. verbose
+    prints the number of indexed records.
+    """
+    fingerprints = dict((dbName, dba.getShelveFingerprint(dbName))
+                        for dbName in dba.getShelveNames())
+    root, oldFingerprints = loadTree(path)
+    if root is None:
+        root = TreeNode(treeRootNodeName)
+    changed = [dbName for dbName in fingerprints
+               if oldFingerprints.get(dbName) != fingerprints[dbName]]
+    removed = [dbName for dbName in oldFingerprints
+               if dbName not in fingerprints]
+    if changed or removed:
+        removeDbsFromTree(root, set(changed + removed))
+        dbKeys = set()
+        for dbName in changed:
+            db, fingerprints[dbName] = dba.shelvePool.getVersionedShelve(
+                dbName)
+            dbKeys.update(dba.createUniqueEntryKey(dbName, k)
+                          for k in db.keys())
+        dbKeys = dba.filterDbKeys(dbKeys)
+        createTreeFromDbKeys(dbKeys, root)
+        if verbose:
+            print 'Indexed {0} records from {1} databases.'.format(
+                len(dbKeys), len(changed))
+        try:
+            saveTree(root, fingerprints, path)
+        except (IOError, OSError):
+            print 'Could not save the tree index.'
+    return root
+
+
 def nodesPerLevel(root):
     stack = [root]
     levelNodes = {}
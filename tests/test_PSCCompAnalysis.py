@@ -24,8 +24,12 @@ class TestPSCCompAnalysis(unittest.TestCase):
             {'difference': {'K1': [155]}}, {'difference': {'K1': [166]}},
             {'difference': {'K1': [177]}}, {'difference': {'K1': [188]}},
             {'difference': {'K1': [199]}}]
+        entriesMock = MagicMock(
+            return_value=[(s, 'entry') for s in self.simIds])
         with patch('dataProcessing.AnalysisData', adMock):
-            self.psc.divideSimIds(limD=100, limH=80)
+            with patch('dbaccess.iterEntriesData', entriesMock):
+                self.psc.divideSimIds(limD=100, limH=80)
+        entriesMock.assert_called_once_with(self.simIds)
         expSims = {
             'smaller': set([
                 's80_50', 's80_80', 's80_100', 's100_50', 's120_50']),
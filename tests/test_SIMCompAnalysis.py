@@ -41,6 +41,29 @@ class TestSIMCompAnalysis(SIMCompAnalysisSetUp):
         self.assertIs(self.lq, self.simca.queue)
         self.assertEqual(['rmsd', 'K1'], self.simca.crit)
         self.assertEqual(['K1', 'K2', 'K3'], self.simca.sifs)
+        self.assertEqual(1, self.simca.workers)
+
+    def test_calcNodesData_with_one_worker(self):
+        with patch('dataProcessing.performNodesOperations') as pnoMock:
+            self.simca.calcNodesData([self.node1FEMeQF])
+        self.assertFalse(pnoMock.called)
+        self.assertEqual({}, self.simca.nodesData)
+
+    def test_calcNodesData_with_workers(self):
+        simca = SIMCompAnalysis(self.lq, ['rmsd', 'K1'], ['K1'], workers=4)
+        nodes = [self.node1FEMeQF, self.node1FEMsQR]
+        adns = [MagicMock(), MagicMock()]
+        pnoMock = MagicMock(return_value=adns)
+        with patch('dataProcessing.performNodesOperations', pnoMock):
+            simca.calcNodesData(nodes)
+            simca.calcNodesData(nodes)
+        pnoMock.assert_called_once_with(nodes, ['K1'], workers=4)
+        with patch('dataProcessing.getNodeData') as gndMock:
+            self.assertIs(adns[1], simca.getAnalysisNodeData(nodes[1]))
+            adns[1].update.assert_called_once_with()
+            self.assertFalse(gndMock.called)
+            simca.getAnalysisNodeData(self.node1FEMsLR)
+            gndMock.assert_called_once_with(self.node1FEMsLR, ['K1'])
 
     def test_getItemNodeDict(self):
         items = [1, 3, 4]
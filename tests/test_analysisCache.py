@@ -0,0 +1,150 @@
+import unittest
+from mock import MagicMock, patch
+import numpy as np
+import os
+import anydbm
+import copy
+import dbaccess as dba
+import analysisCache
+import dataProcessing as dp
+from test_repoSetUp import RepoSetUp
+
+
+class TestAnalysisCacheMemory(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = analysisCache.AnalysisCache(maxSize=2)
+
+    def test_addToMemory_evicts_least_recently_used_state(self):
+        for k in ['k1', 'k2', 'k3']:
+            self.cache.addToMemory(k, k + 'state')
+        self.assertEqual(['k2', 'k3'], list(self.cache.memory.keys()))
+
+    def test_simIds_without_database_are_not_cached(self):
+        self.assertEqual(None, self.cache.getKey(1, ()))
+        self.assertEqual(None, self.cache.getKey('unique_key', ()))
+        self.cache.put('unique_key', (), 'state')
+        self.assertEqual(0, len(self.cache.memory))
+
+
+class TestGetAnalysisData(RepoSetUp):
+
+    def setUp(self):
+        RepoSetUp.setUp(self)
+        self.cache = analysisCache.cache
+
+    def assertSameAnalysis(self, exp, res):
+        self.assertEqual(exp.data, res.data)
+        np.testing.assert_array_equal(exp.getAngles(), res.getAngles())
+        for sif in exp.sifs:
+            np.testing.assert_array_equal(
+                exp.getResults()[sif], res.getResults()[sif])
+            np.testing.assert_array_equal(
+                exp.getAnSol()[sif], res.getAnSol()[sif])
+            for e in exp.getErrorReports():
+                np.testing.assert_array_equal(
+                    exp.getErrorReports()[e][sif],
+                    res.getErrorReports()[e][sif])
+
+    def test_getAnalysisData_computes_once(self):
+        exp = dp.AnalysisData('db1$r1')
+        exp.calcAnSol()
+        exp.calculateStats()
+        ad = dp.getAnalysisData('db1$r1')
+        self.assertSameAnalysis(exp, ad)
+        self.assertEqual(1, self.cache.misses)
+        with patch('dataProcessing.AnalysisData.calculateStats',
+                   MagicMock(side_effect=AssertionError)):
+            self.assertSameAnalysis(exp, dp.getAnalysisData('db1$r1'))
+            self.assertEqual(1, self.cache.memoryHits)
+            self.cache.clearMemory()
+            self.cache.closeAll()
+            self.assertSameAnalysis(exp, dp.getAnalysisData('db1$r1'))
+            self.assertEqual(1, self.cache.diskHits)
+
+    def test_settings_are_cached_separately(self):
+        dp.getAnalysisData('db1$r1')
+        ad = dp.getAnalysisData('db1$r1', sifs=['K2'], eSignFactor='dotProd')
+        self.assertEqual(2, self.cache.misses)
+        self.assertEqual(['K2'], ad.getResults().keys())
+
+    def test_failed_analysis(self):
+        ad = dp.getAnalysisData('db2$r2')
+        self.assertFalse(ad.getAnalysisSuccess())
+        ad = dp.getAnalysisData('db2$r2')
+        self.assertFalse(ad.getAnalysisSuccess())
+        self.assertEqual(1, self.cache.memoryHits)
+
+    def test_cache_is_invalidated_when_database_changes(self):
+        dp.getAnalysisData('db1$r1')
+        self.cache.closeAll()
+        cacheDir = os.path.join(
+            self.repoDir, 'db1', analysisCache.cacheDirName)
+        oldFiles = set(os.listdir(cacheDir))
+        self.entries['db1$r1']['input']['analysisParameters']['sigma'] = 200
+        self.writeDb('db1')
+        ad = dp.getAnalysisData('db1$r1')
+        self.assertEqual(200, ad.data['sigma'])
+        self.assertEqual(2, self.cache.misses)
+        self.assertEqual(set(), oldFiles & set(os.listdir(cacheDir)))
+
+    def test_disk_cache_of_database_name_with_dots(self):
+        disk = self.cache.getDiskCache('db.v1', 'fingerprint')
+        disk['k'] = 'state'
+        self.cache.closeAll()
+        disk = self.cache.getDiskCache('db.v1', 'fingerprint')
+        self.assertEqual('state', disk['k'])
+        self.cache.closeAll()
+        disk = self.cache.getDiskCache('db.v1', 'newFingerprint')
+        self.assertNotIn('k', disk)
+
+    def test_iterAnalysisData(self):
+        dp.getAnalysisData('db1$r2')
+        res = dict(dp.iterAnalysisData(self.getSimIds()))
+        self.assertEqual(self.getSimIds(), set(res.keys()))
+        self.assertEqual(1, self.cache.memoryHits)
+        self.assertTrue(res['db1$r3'].calculatedErrors)
+
+    def test_getCacheState_copies_the_analysis(self):
+        ad = dp.getAnalysisData('db1$r1')
+        ad.data['sigma'] = 200
+        ad.anSol.clear()
+        ad = dp.getAnalysisData('db1$r1')
+        self.assertEqual(1, self.cache.memoryHits)
+        self.assertEqual(100, ad.data['sigma'])
+        self.assertEqual(set(['K1', 'K2', 'K3']), set(ad.anSol.keys()))
+
+    def test_state_is_stored_under_the_version_it_was_read_from(self):
+        entry = copy.deepcopy(self.entries['db1$r1'])
+        entry['input']['analysisParameters']['sigma'] = 200
+        calculateStats = dp.AnalysisData.calculateStats
+
+        def changeDatabase(ad, *args):
+            self.appendEntry('db1$r1', entry)
+            return calculateStats(ad, *args)
+        with patch('dataProcessing.AnalysisData.calculateStats',
+                   changeDatabase):
+            self.assertEqual(100, dp.getAnalysisData('db1$r1').data['sigma'])
+        self.assertEqual(200, dp.getAnalysisData('db1$r1').data['sigma'])
+        self.assertEqual(2, self.cache.misses)
+
+    def test_unreadable_disk_cache_falls_back_to_memory_only(self):
+        shelveMock = MagicMock()
+        shelveMock.open.side_effect = anydbm.error[0]('bad')
+        with patch('analysisCache.shelve', shelveMock):
+            exp = dp.getAnalysisData('db1$r1')
+            ad = dp.getAnalysisData('db1$r1')
+        self.assertSameAnalysis(exp, ad)
+        self.assertEqual(1, self.cache.memoryHits)
+        self.assertEqual(None, self.cache.diskDbs['db1'][1])
+
+    def test_calcContourEstimates_of_cached_analysis(self):
+        exp = dp.AnalysisData('db1$r1').calcContourEstimates(
+            'K1', numCont=3, start=0)
+        dp.getAnalysisData('db1$r1')
+        ad = dp.getAnalysisData('db1$r1')
+        self.assertEqual(1, self.cache.memoryHits)
+        self.assertEqual({}, ad.rawres)
+        res = ad.calcContourEstimates('K1', numCont=3, start=0)
+        for e in exp:
+            np.testing.assert_array_equal(exp[e], res[e])
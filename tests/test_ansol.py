@@ -1,7 +1,11 @@
 from math import pi
 import unittest
 from mock import Mock, MagicMock, patch
+import numpy as np
 from anSol import calcK, calcR, calcQ, calcStresses, calcK1, calcK2, calcK3, calcAnSolWrapper
+from anSol import calcK1Array, calcK2Array, calcK3Array, calcAnSolBatch
+from anSol import UnitSolutionCache
+from anSol import SolutionTable, SolutionTableCache
 
 modulePrefix = 'anSol.'
 
@@ -255,18 +259,87 @@ class TestCalcK3(unittest.TestCase):
                           a, b, self.v, self.beta, self.omega, self.tao)
 
 
+class TestCalcKArrays(unittest.TestCase):
+
+    def setUp(self):
+        self.betas = np.linspace(0, 360, 73)
+        self.cases = [(20, 10, 0.3, 30, 45), (20, 20, 0.5, 60, 0),
+                      (30, 1, 0.1, 0, 90), (20.5, 19.5, 0.25, 15, 10)]
+
+    def test_arrays_match_scalar_solutions(self):
+        for a, b, v, omega, stress in self.cases:
+            for res, func, args in [
+                    (calcK1Array(a, b, self.betas, stress),
+                     calcK1, lambda beta: (a, b, beta, stress)),
+                    (calcK2Array(a, b, v, self.betas, omega, stress),
+                     calcK2, lambda beta: (a, b, v, beta, omega, stress)),
+                    (calcK3Array(a, b, v, self.betas, omega, stress),
+                     calcK3, lambda beta: (a, b, v, beta, omega, stress))]:
+                self.assertIsInstance(res, np.ndarray)
+                exp = [func(*args(beta)) for beta in self.betas]
+                np.testing.assert_allclose(exp, res, rtol=1e-12, atol=1e-12)
+
+    def test_arrays_with_invalid_geometry(self):
+        self.assertRaises(AssertionError, calcK1Array, 10, 20,
+                          self.betas, 100)
+        self.assertRaises(AssertionError, calcK2Array, 20, 10, 0.6,
+                          self.betas, 0, 100)
+        self.assertRaises(AssertionError, calcK3Array, 20, 10, 0,
+                          self.betas, 0, 100)
+
+
+class TestCalcAnSolBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.params = [(20, 10, 0.3, 30, 45, 100), (20, 20, 0.5, 0, 60, 50),
+                       (30, 1, 0.1, 90, 10, 70)]
+        self.columns = [np.array(c) for c in zip(*self.params)]
+
+    def test_calcAnSolBatch_with_padded_betas(self):
+        betas = [np.linspace(0, 360, n) for n in [37, 5, 20]]
+        padded = np.zeros((3, 37))
+        for i, b in enumerate(betas):
+            padded[i, :len(b)] = b
+        a, b, v, gamma, omega, stress = self.columns
+        for sif in ['K1', 'K2', 'K3']:
+            res = calcAnSolBatch(sif, a, b, v, padded, gamma, omega, stress)
+            self.assertEqual((3, 37), res.shape)
+            for i, (a_, b_, v_, g_, o_, s_) in enumerate(self.params):
+                exp = calcAnSolWrapper(sif, a_, b_, v_, betas[i], g_, o_, s_)
+                np.testing.assert_allclose(
+                    exp, res[i, :len(betas[i])], rtol=1e-12, atol=1e-12)
+
+    def test_calcAnSolBatch_with_shared_betas_and_scalars(self):
+        betas = np.linspace(0, 360, 13)
+        res = calcAnSolBatch('K2', [20, 30], 10, 0.3, betas, 30, 45, 100)
+        self.assertEqual((2, 13), res.shape)
+        np.testing.assert_allclose(
+            calcAnSolWrapper('K2', 30, 10, 0.3, betas, 30, 45, 100), res[1])
+
+    def test_calcAnSolBatch_with_invalid_input(self):
+        a, b, v, gamma, omega, stress = self.columns
+        self.assertRaises(KeyError, calcAnSolBatch, 'K4', a, b, v, [0],
+                          gamma, omega, stress)
+        self.assertRaises(AssertionError, calcAnSolBatch, 'K1', b, a, v,
+                          [0], gamma, omega, stress)
+        self.assertRaises(AssertionError, calcAnSolBatch, 'K3', a, b,
+                          v + 0.3, [0], gamma, omega, stress)
+        self.assertRaises(AssertionError, calcAnSolBatch, 'K1', a, b, v,
+                          np.zeros((2, 4)), gamma, omega, stress)
+
+
 class TestCalcAnSolWrapper(unittest.TestCase):
 
     def setUp(self):
         self.betas = ['a', 'b', 'c']
-        self.mockK1 = MagicMock(return_value=1)
-        self.mockK2 = MagicMock(return_value=2)
-        self.mockK3 = MagicMock(return_value=3)
+        self.mockK1 = MagicMock(return_value=np.array([1, 1, 1]))
+        self.mockK2 = MagicMock(return_value=np.array([2, 2, 2]))
+        self.mockK3 = MagicMock(return_value=np.array([3, 3, 3]))
         self.mockStr = MagicMock(return_value=('sigma', 'tao'))
         self.patches = [
-            patch(modulePrefix + 'calcK1', self.mockK1),
-            patch(modulePrefix + 'calcK2', self.mockK2),
-            patch(modulePrefix + 'calcK3', self.mockK3),
+            patch(modulePrefix + 'calcK1Array', self.mockK1),
+            patch(modulePrefix + 'calcK2Array', self.mockK2),
+            patch(modulePrefix + 'calcK3Array', self.mockK3),
             patch(modulePrefix + 'calcStresses', self.mockStr)]
         for p in self.patches:
             p.start()
@@ -280,34 +353,38 @@ class TestCalcAnSolWrapper(unittest.TestCase):
                                'gamma', 'omega', 'stress')
         self.mockStr.assert_called_once_with(
             tensileStress='stress', gamma='gamma')
-        self.assertEqual(len(self.betas), self.mockK1.call_count)
-        self.assertEqual(len(self.betas) * [1], res)
-        for beta in self.betas:
-            self.mockK1.assert_any_call(axisA='a', axisB='b',
-                                        beta=beta, sigma='sigma')
+        self.assertEqual(len(self.betas) * [1], list(res))
+        self.mockK1.assert_called_once_with(axisA='a', axisB='b',
+                                            betas=self.betas, sigma='sigma')
 
     def test_calcAnSolWrapper_with_K2_sifKey(self):
         res = calcAnSolWrapper('K2', 'a', 'b', 'v', self.betas,
                                'gamma', 'omega', 'stress')
         self.mockStr.assert_called_once_with(
             tensileStress='stress', gamma='gamma')
-        self.assertEqual(len(self.betas), self.mockK2.call_count)
-        self.assertEqual(len(self.betas) * [2], res)
-        for beta in self.betas:
-            self.mockK2.assert_any_call(axisA='a', axisB='b', v='v',
-                                        beta=beta, omega='omega', tao='tao')
+        self.assertEqual(len(self.betas) * [2], list(res))
+        self.mockK2.assert_called_once_with(
+            axisA='a', axisB='b', v='v', betas=self.betas, omega='omega',
+            tao='tao')
 
     def test_calcAnSolWrapper_with_K3_sifKey(self):
         res = calcAnSolWrapper('K3', 'a', 'b', 'v', self.betas,
                                'gamma', 'omega', 'stress')
         self.mockStr.assert_called_once_with(
             tensileStress='stress', gamma='gamma')
-        self.assertEqual(len(self.betas), self.mockK3.call_count)
-        self.assertEqual(len(self.betas) * [3], res)
-        for beta in self.betas:
-            self.mockK3.assert_any_call(axisA='a', axisB='b', v='v',
-                                        beta=beta, omega='omega', tao='tao')
+        self.assertEqual(len(self.betas) * [3], list(res))
+        self.mockK3.assert_called_once_with(
+            axisA='a', axisB='b', v='v', betas=self.betas, omega='omega',
+            tao='tao')
 
+    def test_calcAnSolWrapper_returns_array(self):
+        for p in self.patches:
+            p.stop()
+        res = calcAnSolWrapper('K1', 20, 10, 0.3, [0, 45, 90], 30, 45, 100)
+        self.patches = []
+        self.assertIsInstance(res, np.ndarray)
+        np.testing.assert_allclose(
+            [calcK1(20, 10, beta, 75) for beta in [0, 45, 90]], res)
     def test_calcAnSolWrapper_with_undefined_sifKey(self):
         self.assertRaises(
             KeyError,
@@ -320,3 +397,76 @@ class TestCalcAnSolWrapper(unittest.TestCase):
             'gamma',
             'omega',
             'stress')
+
+
+class TestUnitSolutionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = UnitSolutionCache(maxSize=2)
+        self.betas = np.linspace(0, 90, 7)
+        self.params = {'majorAxis': 20.0, 'minorAxis': 10.0, 'v': 0.3,
+                       'gamma': 30.0, 'omega': 45.0}
+
+    def test_getSolution_scales_unit_solution(self):
+        for sif in ['K1', 'K2', 'K3']:
+            res = self.cache.getSolution(
+                sif, betas=self.betas, tensileStress=250, **self.params)
+            exp = calcAnSolWrapper(
+                sifKey=sif, betas=self.betas, tensileStress=250,
+                **self.params)
+            np.testing.assert_allclose(res, exp, rtol=1e-12, atol=1e-9)
+
+    def test_getUnitSolution_hits_and_misses(self):
+        res = self.cache.getUnitSolution('K1', betas=self.betas,
+                                         **self.params)
+        res2 = self.cache.getUnitSolution('K1', betas=list(self.betas),
+                                          **self.params)
+        self.assertIs(res, res2)
+        self.assertFalse(res.flags.writeable)
+        self.cache.getUnitSolution('K1', betas=self.betas[:-1],
+                                   **self.params)
+        self.assertEqual((1, 2), (self.cache.hits, self.cache.misses))
+
+    def test_getUnitSolution_evicts_least_recently_used(self):
+        for sif in ['K1', 'K2', 'K1', 'K3']:
+            self.cache.getUnitSolution(sif, betas=self.betas, **self.params)
+        self.assertEqual(2, len(self.cache.solutions))
+        self.assertEqual(['K1', 'K3'],
+                         [k[0] for k in self.cache.solutions.keys()])
+        self.cache.clear()
+        self.assertEqual((0, 0, 0), (len(self.cache.solutions),
+                                     self.cache.hits, self.cache.misses))
+
+
+class TestSolutionTables(unittest.TestCase):
+
+    def setUp(self):
+        self.params = {'majorAxis': 20.0, 'minorAxis': 10.0, 'v': 0.3,
+                       'gamma': 30.0, 'omega': 45.0}
+        self.betas = np.random.RandomState(0).uniform(-30, 390, 1000)
+
+    def test_getSolution_within_tolerance(self):
+        for sif in ['K1', 'K2', 'K3']:
+            table = SolutionTable(sif, **self.params)
+            self.assertTrue(table.isTabulated())
+            exp = calcAnSolWrapper(sifKey=sif, betas=self.betas,
+                                   tensileStress=250, **self.params)
+            res = table.getSolution(self.betas, 250)
+            self.assertLessEqual(np.max(np.abs(res - exp)),
+                                 2 * table.tolerance * np.max(np.abs(exp)))
+
+    def test_getSolution_without_table(self):
+        self.params['minorAxis'] = 0.1
+        with patch('anSol.maxTableIntervals', 360):
+            table = SolutionTable('K1', **self.params)
+        self.assertFalse(table.isTabulated())
+        exp = calcAnSolWrapper(sifKey='K1', betas=self.betas,
+                               tensileStress=2, **self.params)
+        np.testing.assert_array_equal(exp, table.getSolution(self.betas, 2))
+
+    def test_getTable_hits_misses_and_eviction(self):
+        cache = SolutionTableCache(maxSize=2)
+        for sif in ['K1', 'K2', 'K1', 'K3']:
+            cache.getTable(sif, **self.params)
+        self.assertEqual((1, 3), (cache.hits, cache.misses))
+        self.assertEqual(['K1', 'K3'], [k[0] for k in cache.tables.keys()])
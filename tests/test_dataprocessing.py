@@ -3,11 +3,15 @@ from mock import Mock, MagicMock, patch, call
 import numpy as np
 from dataProcessing import AnalysisData, AnalysisNodeData
 from trees import TreeNode
+import dataProcessing as dp
+import anSol
+from test_repoSetUp import RepoSetUp
 
 
 class TestAnalysisData(unittest.TestCase):
 
     def setUp(self):
+        anSol.clearSolutionCache()
         self.ukey = 'unique_key'
         self.eSignFactor = 'eSignFactor'
         keys = set(['a',
@@ -116,22 +120,23 @@ class TestAnalysisData(unittest.TestCase):
 
     def test_extractDataFromDb(self):
         entryMock = MagicMock(return_value=0)
-        extractMock = MagicMock(return_value=1)
+        sifs = ['K1', 'K2', 'K3']
+        fields = dict((k, 1) for k in self.data.keys() + sifs + ['angles'])
+        extractMock = MagicMock(return_value=fields)
         patchEntry = patch('dbaccess.getEntryData',
                            entryMock)
-        patchExtract = patch('dbaccess.extractDataFromEntry',
+        patchExtract = patch('dbaccess.extractFields',
                              extractMock)
         patchEntry.start()
         patchExtract.start()
-        sifs = ['K1', 'K2', 'K3']
         ad = AnalysisData(self.ukey, sifs=sifs, loadFromDb=True)
         self.assertFalse(ad.calculatedErrors)
         entryMock.assert_called_once_with(self.ukey)
-        expectedExtractCalls = sifs + self.data.keys() + ['angles']
-        for e in expectedExtractCalls:
-            extractMock.assert_any_call(0, e)
-        expectedExtractCalls = len(self.data.keys()) + len(sifs) + 1
-        self.assertEqual(expectedExtractCalls, len(extractMock.mock_calls))
+        self.assertEqual(1, extractMock.call_count)
+        args = extractMock.call_args[0]
+        self.assertEqual(0, args[0])
+        self.assertEqual(sorted(self.data.keys() + ['angles'] + sifs),
+                         sorted(args[1]))
         expected = {k: 1 for k in self.data.keys()}
         self.assertEqual(expected, ad.data)
         expectedRawres = {sif: 1 for sif in sifs}
@@ -140,18 +145,42 @@ class TestAnalysisData(unittest.TestCase):
         patchEntry.stop()
         patchExtract.stop()
 
+    def test_constructor_with_entryData(self):
+        fields = dict((k, 1) for k in self.data.keys() + ['K1', 'angles'])
+        extractMock = MagicMock(return_value=fields)
+        with patch('dbaccess.getEntryData') as entryMock:
+            with patch('dbaccess.extractFields', extractMock):
+                ad = AnalysisData(self.ukey, sifs=['K1'], entryData='entry')
+        self.assertFalse(entryMock.called)
+        self.assertEqual('entry', extractMock.call_args[0][0])
+        self.assertEqual({k: 1 for k in self.data.keys()}, ad.data)
+
+    def test_constructor_with_projection(self):
+        fields = {'d': 100, 'h': 80, 'allEdges': 50}
+        extractMock = MagicMock(return_value=fields)
+        with patch('dbaccess.extractFields', extractMock):
+            ad = AnalysisData(self.ukey, entryData='entry',
+                              projection=['d', 'h', 'allEdges'])
+        extractMock.assert_called_once_with('entry', ['d', 'h', 'allEdges'])
+        self.assertEqual((100, 80, 50), ad.get3dScatterPlotData())
+        self.assertEqual(None, ad.data['a'])
+        self.assertEqual({}, ad.rawres)
+
     def setup_calculateStats(self, sifs):
-        self.contAvgMock = MagicMock(return_value='contAvgMock')
+        self.contAvgMock = MagicMock(return_value={'mean': 'contAvgMock'})
+        self.kernelMock = MagicMock(return_value='kernelMock')
         self.statsMock = MagicMock(return_value='statsMock')
         self.patchContAvg = patch(
-            'miscFuncs.contourAveraging', self.contAvgMock)
-        self.patchStats = patch(
-            'miscFuncs.calcStatsWrapper', self.statsMock)
+            'miscFuncs.calcContourEstimates', self.contAvgMock)
+        self.patchKernel = patch('miscFuncs.calcStats', self.kernelMock)
+        self.patchStats = patch('miscFuncs.getStat', self.statsMock)
         self.patchContAvg.start()
+        self.patchKernel.start()
         self.patchStats.start()
 
     def teardown_calculateStats(self):
         self.patchContAvg.stop()
+        self.patchKernel.stop()
         self.patchStats.stop()
 
     def calculateStats_successfulAnalysis(self, sifs):
@@ -172,16 +201,19 @@ class TestAnalysisData(unittest.TestCase):
         self.assertEqual(expectedRes, ad.results)
         self.assertEqual(len(sifs) * len(self.errors),
                          self.statsMock.call_count)
+        self.assertEqual(len(sifs), self.kernelMock.call_count)
         self.assertEqual(len(sifs), self.contAvgMock.call_count)
         for s in sifs:
-            self.contAvgMock.assert_any_call(rawres[s], len(rawres[s]) - 2)
+            args = self.contAvgMock.call_args_list[sifs.index(s)][0]
+            self.assertEqual((3, 0), args[0].shape)
+            self.assertEqual((len(rawres[s]) - 2, ['mean'], None), args[1:])
+            args, kwargs = self.kernelMock.call_args_list[sifs.index(s)]
+            self.assertEqual(([], anSol[s], 'contAvgMock'), args)
+            self.assertEqual(sorted(self.errors), sorted(kwargs['metrics']))
+            self.assertEqual([self.eSignFactor], kwargs['eSigns'])
             for e in self.errors:
                 self.statsMock.assert_any_call(
-                    statKey=e,
-                    angles=[],
-                    analytical=anSol[s],
-                    analysis='contAvgMock',
-                    eSign=self.eSignFactor)
+                    'kernelMock', e, self.eSignFactor)
 
         self.teardown_calculateStats()
 
@@ -199,26 +231,70 @@ class TestAnalysisData(unittest.TestCase):
         ad.calculateStats()
         self.assertTrue(ad.calculatedErrors)
         self.assertFalse(self.contAvgMock.called)
+        self.assertFalse(self.kernelMock.called)
         self.assertFalse(self.statsMock.called)
         self.teardown_calculateStats()
 
     def test_calculateStats_with_ZeroDevError(self):
         sifs = ['K2']
         csMock = MagicMock(side_effect=ZeroDivisionError)
-        with patch('miscFuncs.contourAveraging') as cavgMock:
-            with patch('miscFuncs.calcStatsWrapper', csMock):
-                ad = AnalysisData(self.ukey, sifs=sifs, loadFromDb=False)
-                ad.rawres = {'K2': {'cont1': [], 'cont2': []}}
-                ad.anSol = {'K2': {'cont1': [], 'cont2': []}}
-                ad.results = {'K2': {'cont1': [], 'cont2': []}}
-                ad.data['analysisSuccess'] = True
-                ad.calculateStats()
+        with patch('miscFuncs.getStat', csMock), \
+                patch('miscFuncs.calcStats'):
+            ad = AnalysisData(self.ukey, sifs=sifs, loadFromDb=False)
+            ad.rawres = {'K2': {'cont1': [], 'cont2': []}}
+            ad.anSol = {'K2': {'cont1': [], 'cont2': []}}
+            ad.results = {'K2': {'cont1': [], 'cont2': []}}
+            ad.data['analysisSuccess'] = True
+            ad.calculateStats()
         self.assertEqual(self.errors.keys(), ad.errors.keys())
         for k in self.errors.keys():
             self.assertTrue(np.isnan(ad.errors[k]['K2']))
         expectedNumberCSMockCalls = len(sifs) * len(self.errors.keys())
         self.assertEqual(expectedNumberCSMockCalls, csMock.call_count)
 
+    def test_calcAnSol_shares_cached_solutions(self):
+        ads = [AnalysisData(self.ukey, sifs=['K1', 'K3'], loadFromDb=False)
+               for i in range(2)]
+        for ad in ads:
+            ad.angles = np.linspace(0, 360, 9)
+            ad.data.update({'a': 20.0, 'b': 10.0, 'v': 0.3, 'omega': 45.0,
+                            'gamma': 30.0, 'sigma': 100.0})
+        ads[1].angles = list(ads[1].angles)
+        for ad in ads:
+            ad.calcAnSol()
+        for s in ['K1', 'K3']:
+            self.assertIs(ads[0].anSol[s], ads[1].anSol[s])
+            self.assertFalse(ads[0].anSol[s].flags.writeable)
+            np.testing.assert_array_equal(
+                anSol.calcAnSolWrapper(s, 20.0, 10.0, 0.3, ads[0].angles,
+                                       30.0, 45.0, 100.0),
+                ads[0].anSol[s])
+        self.assertEqual((2, 2), (anSol.solutionCache.hits,
+                                  anSol.solutionCache.misses))
+
+    def test_getAnSolCurve_of_failed_analysis(self):
+        ad = AnalysisData(self.ukey, sifs=['K1'], loadFromDb=False)
+        ad.data.update({'a': None, 'b': None, 'v': None, 'omega': None,
+                        'gamma': None, 'sigma': None})
+        betas, res = ad.getAnSolCurve('K1')
+        self.assertEqual((0, 0), (len(betas), len(res)))
+
+    def test_calcContourEstimates(self):
+        ad = AnalysisData(self.ukey, sifs=['K1'], loadFromDb=False)
+        ad.rawres = {'K1': {'c{0}'.format(i): [i, -2 * i] for i in range(6)}}
+        with patch('miscFuncs.stackContours',
+                   MagicMock(side_effect=dp.mf.stackContours)) as stMock:
+            res = ad.calcContourEstimates('K1')
+            res2 = ad.calcContourEstimates('K1', ['median'], numCont=2,
+                                           start=0)
+        self.assertEqual(1, stMock.call_count)
+        for e in ['mean', 'trimmedMean', 'median']:
+            np.testing.assert_array_equal([2.5, -5], res[e])
+        self.assertEqual(['median'], res2.keys())
+        np.testing.assert_array_equal([0.5, -1], res2['median'])
+        ad.averageContours('K1')
+        np.testing.assert_array_equal([2.5, -5], ad.results['K1'])
+
 
 class TestAnalysisNodeData(unittest.TestCase):
 
@@ -265,15 +341,39 @@ class TestAnalysisNodeData(unittest.TestCase):
         self.assertEqual([4, 5, 6, 7], list(an.results['K1']))
         self.assertEqual([7, 8, 9, 10], list(an.anSol['K1']))
 
+    def test_reportMemoryUsage(self):
+        an = AnalysisNodeData(TreeNode('leaf'), ['K1'], 'areas')
+        an.angles = np.zeros(10)
+        an.results['K1'] = np.zeros(10)
+        an.anSol['K1'] = np.zeros(10)
+        self.assertEqual(240, an.getDataSize())
+        with patch('sys.stdout') as outMock:
+            an.reportMemoryUsage()
+            self.assertFalse(outMock.write.called)
+            with patch('dataProcessing.largeNodePoints', 10):
+                an.reportMemoryUsage()
+        self.assertIn('Node leaf: 10 points',
+                      outMock.write.call_args_list[0][0][0])
+
     def test_extractDataFromSims_with_nonempty_node(self):
+        sims = ['db1$s1', 'db1$s2', 'db2$s1']
+        entriesMock = MagicMock(
+            return_value=zip(sims, ['e1', 'e2', 'e3']))
+        storeMock = MagicMock(side_effect=lambda sim: 'store_' + sim[:3])
         with patch('dataProcessing.AnalysisNodeData.extractDataFromSimId') as extrMock:
             with patch('trees.TreeNode.getSuccessfulMembers') as successMock:
-                successMock.return_value = [1, 2, 3]
-                an = AnalysisNodeData(TreeNode(''), ['K1'], 'areas')
-                an.extractDataFromSims()
+                with patch('dbaccess.iterEntriesData', entriesMock):
+                    with patch('resultsStore.findStore', storeMock):
+                        successMock.return_value = sims
+                        an = AnalysisNodeData(TreeNode(''), ['K1'], 'areas')
+                        an.extractDataFromSims()
                 successMock.assert_called_once_with()
-                calls = [call(1), call(2), call(3)]
+                entriesMock.assert_called_once_with(sims)
+                calls = [call('db1$s1', 'e1', 'store_db1'),
+                         call('db1$s2', 'e2', 'store_db1'),
+                         call('db2$s1', 'e3', 'store_db2')]
                 self.assertEqual(calls, extrMock.mock_calls)
+                self.assertEqual(2, storeMock.call_count)
 
     def test_extractDataFromSimId(self):
         with patch('dataProcessing.AnalysisNodeData.extractAnSolParams') as ansolMock:
@@ -290,13 +390,17 @@ class TestAnalysisNodeData(unittest.TestCase):
                 an.results = {'K1': ['1r1'], 'K2': ['2r1'], 'K3': ['3r1']}
                 an.anSol = {'K1': ['1a1'], 'K2': ['2a1'], 'K3': ['3a1']}
                 an.extractDataFromSimId('simId')
-                expAngles = [1, 2, 3, 4, 5, 6]
+                an.extractDataFromSimId('simId')
+                self.assertEqual([1, 2, 3], list(an.angles))
+                an.concatenateChunks()
+                expAngles = [1, 2, 3, 4, 5, 6, 4, 5, 6]
                 expResults = {
-                    'K1': [
-                        '1r1', '1r4', '1r5', '1r6'], 'K2': ['2r1'], 'K3': [
-                        '3r1', '3r4', '3r5', '3r6']}
-                expAnSol = {'K1': ['1a1', '1a4', '1a5', '1a6'], 'K2': ['2a1'],
-                            'K3': ['3a1', '3a4', '3a5', '3a6']}
+                    'K1': ['1r1'] + 2 * ['1r4', '1r5', '1r6'], 'K2': ['2r1'],
+                    'K3': ['3r1'] + 2 * ['3r4', '3r5', '3r6']}
+                expAnSol = {
+                    'K1': ['1a1'] + 2 * ['1a4', '1a5', '1a6'], 'K2': ['2a1'],
+                    'K3': ['3a1'] + 2 * ['3a4', '3a5', '3a6']}
+                self.assertEqual([], an.angleChunks)
                 self.assertEqual(expAngles, list(an.angles))
                 for k in expResults.keys():
                     self.assertEqual(expResults[k], list(an.results[k]))
@@ -363,7 +467,8 @@ class TestAnalysisNodeData(unittest.TestCase):
 
     def test_calcEstimates_with_nonzero_analytical_solutions(self):
         wrMock = MagicMock(return_value=1)
-        with patch('miscFuncs.calcStatsWrapper', wrMock):
+        with patch('miscFuncs.getStat', wrMock), \
+                patch('miscFuncs.calcStats') as kernelMock:
             an = AnalysisNodeData('node', ['K1', 'K3'], 'areas')
             an.angles = [1, 2]
             an.anSol = {'K1': [1, 2], 'K3': [1, 2]}
@@ -372,10 +477,13 @@ class TestAnalysisNodeData(unittest.TestCase):
         expected = {e: {'K1': 1, 'K3': 1} for e in [
             'areaDiff', 'dotProd', 'avgNormError', 'maxNormError', 'rmsd']}
         self.assertEqual(expected, an.estimates)
+        self.assertEqual(2, kernelMock.call_count)
+        kernelMock.assert_any_call([1, 2], [1, 2], [1, 2])
 
     def test_calcEstimates_with_ZeroDivisionError(self):
         wrMock = MagicMock(side_effect=ZeroDivisionError)
-        with patch('miscFuncs.calcStatsWrapper', wrMock):
+        with patch('miscFuncs.getStat', wrMock), \
+                patch('miscFuncs.calcStats'):
             an = AnalysisNodeData('node', ['K1'], 'areas')
             an.angles = [1, 2]
             an.anSol = {'K1': [1, 2]}
@@ -396,10 +504,192 @@ class TestAnalysisNodeData(unittest.TestCase):
         an = AnalysisNodeData('node', ['K1'], 'areas')
         an.anSolParams = {'a': 20, 'b': 10, 'v': 0.3, 'gamma': 45, 'omega': 60}
         an.angles = [30, 45]
-        aMock = MagicMock(return_value=123)
+        aMock = MagicMock(return_value=np.array([1.5, 2]))
+        anSol.clearUnitSolutionCache()
         with patch('anSol.calcAnSolWrapper', aMock):
             res = an.calcSIFsForSigmaAndSIF(100, 'K2')
-        self.assertEqual(123, res)
+            res2 = an.calcSIFsForSigmaAndSIF(300, 'K2')
+        np.testing.assert_array_equal([150, 200], res)
+        np.testing.assert_array_equal([450, 600], res2)
         aMock.assert_called_once_with(
             sifKey='K2', majorAxis=20, minorAxis=10, v=0.3,
-            betas=[30, 45], gamma=45, omega=60, tensileStress=100)
+            betas=[30, 45], gamma=45, omega=60, tensileStress=1.0)
+        anSol.clearUnitSolutionCache()
+
+    def test_getAnSolCurve(self):
+        an = AnalysisNodeData('node', ['K1'], 'areas')
+        an.anSolParams = {'a': 20.0, 'b': 10.0, 'v': 0.3, 'gamma': 45.0,
+                          'omega': 60.0, 'sigma': 100.0}
+        an.angles = np.array([10.0, 350.0, 90.0])
+        betas, res = an.getAnSolCurve('K2', sigma=50.0)
+        self.assertEqual((10, 350), (betas[0], betas[-1]))
+        self.assertEqual(dp.anSolCurvePoints, len(betas))
+        exp = anSol.calcAnSolWrapper('K2', 20.0, 10.0, 0.3, betas,
+                                     45.0, 60.0, 50.0)
+        self.assertLess(np.max(np.abs(res - exp)), 1e-5 * np.max(np.abs(exp)))
+        self.assertEqual(100.0, an.anSolParams['sigma'])
+        an.angles = np.array([])
+        betas, res = an.getAnSolCurve('K2')
+        self.assertEqual((0, 0), (len(betas), len(res)))
+
+
+class TestPerformNodesOperations(RepoSetUp):
+
+    def setUp(self):
+        RepoSetUp.setUp(self)
+        self.nodes = [TreeNode('n1'), TreeNode('n2')]
+        self.nodes[0].addMembers(['db1$r1', 'db1$r2'], 'successful')
+        self.nodes[1].addMembers(['db1$r3'], 'successful')
+
+    def test_performNodesOperations_with_workers(self):
+        serial = dp.performNodesOperations(self.nodes, ['K1', 'K3'])
+        self.resetCaches()
+        parallel = dp.performNodesOperations(
+            self.nodes, ['K1', 'K3'], workers=2)
+        for exp, res in zip(serial, parallel):
+            np.testing.assert_array_equal(exp.getAngles(), res.getAngles())
+            self.assertEqual(exp.getAnSolParams(), res.getAnSolParams())
+            for s in ['K1', 'K3']:
+                np.testing.assert_array_almost_equal(
+                    exp.getResults()[s], res.getResults()[s])
+                np.testing.assert_array_almost_equal(
+                    exp.getAnSol()[s], res.getAnSol()[s])
+                self.assertAlmostEqual(exp.getEstimates()['rmsd'][s],
+                                       res.getEstimates()['rmsd'][s])
+
+    def assertNodeDataEqual(self, exp, res):
+        np.testing.assert_array_equal(exp.getAngles(), res.getAngles())
+        self.assertEqual(exp.getAnSolParams(), res.getAnSolParams())
+        for s in exp.sifs:
+            np.testing.assert_array_almost_equal(
+                exp.getResults()[s], res.getResults()[s])
+            np.testing.assert_array_almost_equal(
+                exp.getAnSol()[s], res.getAnSol()[s])
+            for e in exp.getEstimates().keys():
+                self.assertAlmostEqual(exp.getEstimates()[e][s],
+                                       res.getEstimates()[e][s])
+
+    def test_update_after_member_assigned_as_failed(self):
+        adn = dp.getNodeData(self.nodes[0], ['K1', 'K3'])
+        self.assertFalse(adn.update())
+        self.nodes[0].successfulMembers.remove('db1$r2')
+        self.nodes[0].failedMembers.add('db1$r2')
+        with patch('dataProcessing.iterAnalysisData',
+                   MagicMock(return_value=[])) as iterMock:
+            self.assertIs(adn, dp.getNodeData(self.nodes[0], ['K1', 'K3']))
+        iterMock.assert_called_once_with(set([]), ['K1', 'K3'], 'areas')
+        self.assertEqual(['db1$r1'], adn.contributions.keys())
+        node = TreeNode('n3')
+        node.addMembers(['db1$r1'], 'successful')
+        exp = AnalysisNodeData(node, ['K1', 'K3'])
+        exp.performOperations()
+        self.assertNodeDataEqual(exp, adn)
+
+    def test_update_with_added_member(self):
+        node = TreeNode('n3')
+        node.addMembers(['db1$r1'], 'successful')
+        adn = dp.getNodeData(node, ['K1'])
+        node.addMembers(['db1$r2'], 'successful')
+        self.assertTrue(adn.update())
+        self.assertEqual(['db1$r1', 'db1$r2'], sorted(adn.contributions))
+        exp = AnalysisNodeData(node, ['K1'])
+        exp.performOperations()
+        self.assertNodeDataEqual(exp, adn)
+
+    def test_registry_is_bounded(self):
+        with patch('dataProcessing.maxRegisteredNodes', 1):
+            first = dp.getNodeData(self.nodes[0], ['K1'])
+            dp.getNodeData(self.nodes[1], ['K1'])
+            self.assertEqual(1, len(dp.nodeDataRegistry))
+            self.assertIsNot(first, dp.getNodeData(self.nodes[0], ['K1']))
+
+    def test_calcAnalysisData_adds_worker_results_to_cache(self):
+        simIds = self.getSimIds('db1')
+        res = dp.calcAnalysisData(simIds, workers=2)
+        self.assertEqual(simIds, set(res.keys()))
+        with patch('dataProcessing.createWorkerPool',
+                   MagicMock(side_effect=AssertionError)):
+            res = dp.calcAnalysisData(simIds, workers=2)
+        self.assertEqual(simIds, set(res.keys()))
+
+
+class TestCalculateStatsBatch(RepoSetUp):
+
+    def createAnalysisData(self, simIds):
+        ads = []
+        for simId in simIds:
+            ad = AnalysisData(simId)
+            ad.calcAnSol()
+            ads.append(ad)
+        return ads
+
+    def test_calculateStatsBatch(self):
+        simIds = sorted(self.getSimIds())
+        exp = self.createAnalysisData(simIds)
+        for ad in exp:
+            ad.calculateStats()
+        ads = self.createAnalysisData(simIds)
+        with patch('miscFuncs.calcStats',
+                   MagicMock(side_effect=AssertionError)):
+            dp.calculateStatsBatch(ads)
+        for e, ad in zip(exp, ads):
+            self.assertTrue(ad.calculatedErrors)
+            for k in e.errors.keys():
+                for s in e.errors[k].keys():
+                    np.testing.assert_array_almost_equal(
+                        e.errors[k][s], ad.errors[k][s])
+
+    def test_calcAnSolBatch(self):
+        simIds = sorted(self.getSimIds())
+        exp = self.createAnalysisData(simIds)
+        ads = [AnalysisData(simId) for simId in simIds]
+        with patch('anSol.calcAnSolWrapper',
+                   MagicMock(side_effect=AssertionError)):
+            dp.calcAnSolBatch([ad for ad in ads if ad.getAnalysisSuccess()])
+        dp.calcAnSolBatch(ads)
+        for e, ad in zip(exp, ads):
+            self.assertEqual(sorted(e.anSol.keys()), sorted(ad.anSol.keys()))
+            for s in e.anSol.keys():
+                np.testing.assert_array_almost_equal(e.anSol[s], ad.anSol[s])
+
+    def test_calcAnSolBatch_with_invalid_parameters(self):
+        ads = [AnalysisData('db1$r1'), AnalysisData('db1$r2')]
+        ads[1].data['v'] = 0.7
+        with patch('anSol.calcAnSolWrapper') as wrMock:
+            dp.calcAnSolBatch(ads)
+        self.assertEqual(6, wrMock.call_count)
+
+    def test_calculateStatsBatch_with_unsorted_angles(self):
+        ads = self.createAnalysisData(['db1$r1', 'db1$r2'])
+        ads[1].angles = ads[1].angles[::-1]
+        self.assertRaises(AssertionError, dp.calculateStatsBatch, ads)
+        self.assertTrue(ads[0].calculatedErrors)
+
+
+class TestDemandDrivenStats(RepoSetUp):
+
+    def test_getAnalysisData_with_metrics(self):
+        exp = AnalysisData('db1$r1')
+        exp.calcAnSol()
+        exp.calculateStats()
+        exp = exp.getErrorReports()
+        with patch('miscFuncs.calcStats', wraps=dp.mf.calcStats) as csMock:
+            ad = dp.getAnalysisData('db1$r1', metrics=['rmsd'])
+        self.assertEqual(3, csMock.call_count)
+        errors = ad.getErrorReports()
+        self.assertEqual(['K1', 'K2', 'K3'], sorted(errors['rmsd'].keys()))
+        self.assertEqual({}, dict(errors['areaDiff']))
+        self.assertEqual(exp['areaDiff']['K2'], errors['areaDiff']['K2'])
+        self.assertEqual(['K2'], errors['areaDiff'].keys())
+        self.assertRaises(KeyError, errors['areaDiff'].__getitem__, 'K4')
+
+    def test_getAnalysisData_completes_cached_state(self):
+        dp.getAnalysisData('db1$r1', metrics=['dotProd'])
+        self.assertTrue(dp.getAnalysisData(
+            'db1$r1', metrics=['dotProd']).hasErrors(['dotProd']))
+        ad = dp.getAnalysisData('db1$r1')
+        self.assertTrue(ad.hasErrors())
+        with patch('miscFuncs.calcStats') as csMock:
+            self.assertTrue(dp.getAnalysisData('db1$r1').hasErrors())
+        self.assertFalse(csMock.called)
+
@@ -1,8 +1,13 @@
 import dbaccess as dba
+import paramIndex
 import unittest
 from mock import Mock, MagicMock, patch
 import tempfile
+import shutil
+import shelve
 import os
+import collections
+from test_repoSetUp import RepoSetUp, createEntry
 
 
 @patch('os.path.abspath', MagicMock(
@@ -29,6 +34,34 @@ class TestGetDbRepoDir(unittest.TestCase):
         self.assertEqual(expected, result)
 
 
+
+
+class TestSetDbRepoDir(unittest.TestCase):
+
+    def setUp(self):
+        self.repoDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        dba.setDbRepoDir(None)
+        shutil.rmtree(self.repoDir, ignore_errors=True)
+
+    def test_getDbRepoDir_returns_repository_dir_set(self):
+        dba.setDbRepoDir(self.repoDir)
+        self.assertEqual(self.repoDir, dba.getDbRepoDir())
+        self.assertEqual(self.repoDir, dba.discoveryCache.getRepoDir())
+
+    def test_getDbRepoDir_with_missing_repository_dir_set(self):
+        dba.setDbRepoDir(os.path.join(self.repoDir, 'missing'))
+        self.assertRaises(IOError, dba.getDbRepoDir)
+
+    def test_setDbRepoDir_closes_shelves_and_clears_discovery_cache(self):
+        with patch('dbaccess.closeAllShelves') as closeMock, \
+                patch('dbaccess.clearDiscoveryCache') as clearMock:
+            dba.setDbRepoDir(self.repoDir)
+        closeMock.assert_called_once_with()
+        clearMock.assert_called_once_with()
+
+
 class TestCheckIfValidShelvePath(unittest.TestCase):
 
     def setUp(self):
@@ -146,3 +179,303 @@ class TestGetParameterRange(unittest.TestCase):
             expected = set([1, 2, 3, 9])
             result = dba.getParameterRange(set([]), self.param)
         self.assertEqual(expected, result)
+
+
+class TestShelvePool(unittest.TestCase):
+
+    def setUp(self):
+        self.openMock = MagicMock(side_effect=lambda path, flag: MagicMock())
+        self.patches = [
+            patch('shelve.open', self.openMock),
+            patch('dbaccess.getShelvePathByName',
+                  MagicMock(side_effect=lambda name: 'path/' + name)),
+            patch('dbaccess.isSplitStorage', MagicMock(return_value=False)),
+            patch('dbaccess.getShelveFingerprint',
+                  MagicMock(side_effect=lambda name: self.fingerprints[name]))]
+        self.fingerprints = collections.defaultdict(str)
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_getShelve_reuses_open_handle(self):
+        pool = dba.ShelvePool(maxOpen=2)
+        db1 = pool.getShelve('db1')
+        db2 = pool.getShelve('db1')
+        self.assertIs(db1, db2)
+        self.openMock.assert_called_once_with('path/db1', 'r')
+        self.assertEqual(1, len(pool))
+
+    def test_getShelve_evicts_least_recently_used_handle(self):
+        pool = dba.ShelvePool(maxOpen=2)
+        db1 = pool.getShelve('db1')
+        db2 = pool.getShelve('db2')
+        pool.getShelve('db1')
+        pool.getShelve('db3')
+        self.assertEqual(['db1', 'db3'], pool.getOpenShelveNames())
+        db2.close.assert_called_once_with()
+        self.assertFalse(db1.close.called)
+
+    def test_getShelve_reopens_changed_database(self):
+        pool = dba.ShelvePool()
+        db1 = pool.getShelve('db1')
+        self.fingerprints['db1'] = 'changed'
+        db2, fingerprint = pool.getVersionedShelve('db1')
+        self.assertIsNot(db1, db2)
+        self.assertEqual('changed', fingerprint)
+        db1.close.assert_called_once_with()
+        self.assertEqual(2, self.openMock.call_count)
+        self.assertIs(db2, pool.getShelve('db1'))
+
+    def test_closeAll(self):
+        pool = dba.ShelvePool()
+        dbs = [pool.getShelve(n) for n in ['db1', 'db2']]
+        pool.closeAll()
+        self.assertEqual(0, len(pool))
+        for db in dbs:
+            db.close.assert_called_once_with()
+
+    def test_context_manager_closes_handles_on_outermost_exit(self):
+        pool = dba.ShelvePool()
+        with pool:
+            with pool:
+                db = pool.getShelve('db1')
+            self.assertEqual(1, len(pool))
+            self.assertFalse(db.close.called)
+        self.assertEqual(0, len(pool))
+        db.close.assert_called_once_with()
+
+    def test_getEntryData_uses_module_pool(self):
+        pool = dba.ShelvePool()
+        with patch('dbaccess.shelvePool', pool):
+            dba.getEntryData('db1$key1')
+            dba.getEntryData('db1$key2')
+        self.openMock.assert_called_once_with('path/db1', 'r')
+
+
+class TestShelvePoolWithChangedDatabase(RepoSetUp):
+
+    def test_pooled_handle_reads_changed_database(self):
+        self.assertEqual(['r1', 'r2', 'r3'],
+                         sorted(paramIndex.getIndex('db1').keys))
+        self.assertEqual(self.getSimIds(), dba.getAllShelveKeys())
+        self.appendEntry('db1$r9', createEntry(d=140))
+        self.assertEqual(self.getSimIds(), dba.getAllShelveKeys())
+        self.assertEqual(140, dba.extractFields(
+            dba.getEntryData('db1$r9'), ['d'])['d'])
+        self.assertEqual(['r1', 'r2', 'r3', 'r9'],
+                         sorted(paramIndex.getIndex('db1').keys))
+        self.resetCaches()
+        self.assertEqual(['r1', 'r2', 'r3', 'r9'],
+                         sorted(paramIndex.getIndex('db1').keys))
+
+    def test_storage_order_is_read_once_per_database_version(self):
+        order = dba.shelvePool.getStorageOrder('db1')
+        self.assertEqual(set(['r1', 'r2', 'r3', 'metadata']),
+                         set(order.keys()))
+        self.assertIs(order, dba.shelvePool.getStorageOrder('db1'))
+        self.appendEntry('db1$r9', createEntry())
+        self.assertIn('r9', dba.shelvePool.getStorageOrder('db1'))
+        self.assertEqual(
+            ['db1$r1', 'db1$r9'],
+            sorted(dict(dba.iterEntriesData(['db1$r1', 'db1$r9'])).keys()))
+
+
+class TestIterEntriesData(unittest.TestCase):
+
+    def setUp(self):
+        self.dbs = {
+            'db1': {'k3': 13, 'k1': 11, 'k2': 12},
+            'db2': {'k1': 21}}
+        self.storageOrder = {'db1': ['k3', 'k1', 'k2'], 'db2': ['k1']}
+        self.opened = []
+
+        def getShelve(dbName):
+            self.opened.append(dbName)
+            db = MagicMock()
+            db.keys.return_value = self.storageOrder[dbName]
+            db.__getitem__.side_effect = self.dbs[dbName].__getitem__
+            return db
+        self.poolMock = MagicMock()
+        self.poolMock.getShelve.side_effect = getShelve
+        self.poolMock.getStorageOrder.side_effect = lambda dbName: dict(
+            (k, i) for i, k in enumerate(self.storageOrder[dbName]))
+        self.poolPatch = patch('dbaccess.shelvePool', self.poolMock)
+        self.poolPatch.start()
+        self.splitPatch = patch('dbaccess.isSplitStorage',
+                                MagicMock(return_value=False))
+        self.splitPatch.start()
+
+    def tearDown(self):
+        self.poolPatch.stop()
+        self.splitPatch.stop()
+
+    def test_iterEntriesData_groups_by_database_in_storage_order(self):
+        simIds = ['db2$k1', 'db1$k1', 'db1$k2', 'db1$k3']
+        res = list(dba.iterEntriesData(simIds))
+        exp = [('db1$k3', 13), ('db1$k1', 11), ('db1$k2', 12),
+               ('db2$k1', 21)]
+        self.assertEqual(exp, res)
+        self.assertEqual(['db1', 'db2'], self.opened)
+
+    def test_getEntriesData(self):
+        res = dba.getEntriesData(set(['db1$k2', 'db2$k1']))
+        self.assertEqual({'db1$k2': 12, 'db2$k1': 21}, res)
+
+    def test_orderKeysByStorage(self):
+        db = MagicMock()
+        db.keys.return_value = ['k3', 'k1', 'k2']
+        self.assertEqual(['k3', 'k2'],
+                         dba.orderKeysByStorage(db, set(['k2', 'k3'])))
+        self.assertEqual(['k1', 'k0', 'k4'],
+                         dba.orderKeysByStorage(db, set(['k4', 'k0', 'k1'])))
+        self.assertEqual(['k2', 'k1', 'k4'], dba.orderKeysByStorage(
+            db, set(['k1', 'k2', 'k4']), {'k2': 0, 'k1': 1, 'k3': 2}))
+
+    def test_iterEntriesData_with_unknown_keys(self):
+        for simIds in [['db1$k9'], ['db1$k1', 'db1$k9', 'db2$k1']]:
+            self.assertRaises(KeyError, dba.getEntriesData, simIds)
+
+    def test_getEntriesData_with_empty_subset(self):
+        self.assertEqual({}, dba.getEntriesData([]))
+        self.assertEqual([], self.opened)
+
+
+class TestDiscoveryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dbRepoPath = tempfile.mkdtemp()
+        self.patcher = patch(
+            'dbaccess.getDbRepoDir',
+            MagicMock(return_value=self.dbRepoPath))
+        self.patcher.start()
+        self.cache = dba.DiscoveryCache()
+        self.createDb('db1')
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.dbRepoPath)
+
+    def createDb(self, dbName):
+        resDir = os.path.join(self.dbRepoPath, dbName, dba.resultsDb)
+        os.makedirs(resDir)
+        db = shelve.open(os.path.join(resDir, dbName), 'c')
+        db['key'] = 1
+        db.close()
+        self.touch(self.dbRepoPath)
+
+    def touch(self, path):
+        mtime = os.stat(path).st_mtime + 10
+        os.utime(path, (mtime, mtime))
+
+    def test_getShelvePath_with_valid_and_invalid_names(self):
+        exp = os.path.join(self.dbRepoPath, 'db1', dba.resultsDb, 'db1')
+        self.assertEqual(exp, self.cache.getShelvePath('db1'))
+        self.assertEqual('', self.cache.getShelvePath('db2'))
+
+    def test_getShelveNames_does_not_rescan_unchanged_repository(self):
+        self.assertEqual(['db1'], self.cache.getShelveNames())
+        with patch('os.listdir', MagicMock(side_effect=AssertionError)):
+            with patch('shelve.open', MagicMock(side_effect=AssertionError)):
+                self.assertEqual(['db1'], self.cache.getShelveNames())
+                self.assertTrue(self.cache.getShelvePath('db1'))
+
+    def test_getShelveNames_revalidates_after_repository_change(self):
+        self.assertEqual(['db1'], self.cache.getShelveNames())
+        self.createDb('db2')
+        self.assertEqual(set(['db1', 'db2']),
+                         set(self.cache.getShelveNames()))
+        shutil.rmtree(os.path.join(self.dbRepoPath, 'db1'))
+        self.touch(self.dbRepoPath)
+        self.assertEqual(['db2'], self.cache.getShelveNames())
+
+    def test_getShelveNames_skips_directories_without_shelve(self):
+        os.makedirs(os.path.join(self.dbRepoPath, 'db3', dba.resultsDb))
+        self.touch(self.dbRepoPath)
+        self.assertEqual(['db1'], self.cache.getShelveNames())
+        self.assertFalse(self.cache.isValidDbName('db3'))
+
+
+class TestExtractFields(unittest.TestCase):
+
+    def setUp(self):
+        self.entry = createEntry(a=30, b=10, d=100, h=80, allEdges=50)
+        self.failed = createEntry(successful=False, transform='elliptic')
+
+    def test_extractFields_matches_extractDataFromEntry(self):
+        keywords = dba.entryFields.keys()
+        for entry in [self.entry, self.failed]:
+            fields = dba.extractFields(entry, keywords)
+            for k in keywords:
+                value = dba.extractDataFromEntry(entry, k)
+                if dba.entryFields[k][2] is None:
+                    self.assertIs(value, fields[k])
+                else:
+                    self.assertEqual(value, fields[k])
+
+    def test_extractFields_values(self):
+        fields = dba.extractFields(
+            self.entry, ['crackRatio', 'd', 'timeToCalcInSec', 'transform',
+                         'czrSeeds', 'allEdges', 'unknown'])
+        self.assertEqual(
+            {'crackRatio': 3.0, 'd': 100, 'timeToCalcInSec': 60,
+             'transform': None, 'czrSeeds': None, 'allEdges': 50,
+             'unknown': None}, fields)
+        fields = dba.extractFields(self.failed, ['angles', 'K1', 'transform'])
+        self.assertEqual(
+            {'angles': None, 'K1': None, 'transform': 'elliptic'}, fields)
+
+    def test_extractFields_with_missing_required_field(self):
+        del self.entry['input']['material']
+        self.assertRaises(KeyError, dba.extractFields, self.entry, ['v'])
+        self.assertEqual({'a': 30}, dba.extractFields(self.entry, ['a']))
+
+    def test_extractFields_with_projection(self):
+        fields = dba.extractFields(self.entry, 'tree')
+        self.assertEqual(set(dba.fieldProjections['tree']), set(fields))
+        self.assertEqual(3.0, fields['crackRatio'])
+        del self.entry['odb']
+        del self.entry['input']['material']
+        fields = dba.extractFields(self.entry, 'mesh')
+        self.assertEqual(50, fields['allEdges'])
+
+
+class TestIsParallelScan(unittest.TestCase):
+
+    def test_isParallelScan(self):
+        with patch('dbaccess.parallelScanRecordThreshold', 100):
+            self.assertFalse(dba.isParallelScan(99, 4, workers=8))
+            self.assertTrue(dba.isParallelScan(100, 4, workers=8))
+            self.assertFalse(dba.isParallelScan(1000, 1, workers=8))
+            self.assertFalse(dba.isParallelScan(1000, 10, workers=1))
+
+    def test_getScanWorkers(self):
+        self.assertEqual(2, dba.getScanWorkers(2, workers=8))
+        self.assertEqual(3, dba.getScanWorkers(10, workers=3))
+        with patch('dbaccess.parallelScanWorkers', 5):
+            self.assertEqual(5, dba.getScanWorkers(10))
+
+
+class TestParallelScan(RepoSetUp):
+
+    def setUp(self):
+        RepoSetUp.setUp(self)
+        self.thresholdPatch = patch('dbaccess.parallelScanRecordThreshold', 1)
+        self.thresholdPatch.start()
+
+    def tearDown(self):
+        self.thresholdPatch.stop()
+        RepoSetUp.tearDown(self)
+
+    def test_extractSimIdParamValuesFromSubset(self):
+        simIds = self.getSimIds()
+        exp = dict((s, 60) for s in simIds)
+        dba.getDbEntryKeys('db1')
+        self.assertEqual(exp, dba.extractSimIdParamValuesFromSubset(
+            simIds, 'timeToCalcInSec', workers=2))
+        self.assertEqual({}, dba.shelvePool.handles)
+        exp = dict((s, 'embedded') for s in simIds)
+        self.assertEqual(exp, dba.extractSimIdParamValuesFromSubset(
+            simIds, 'crackType', workers=1))
@@ -0,0 +1,105 @@
+import unittest
+import dbquery
+import dbaccess as dba
+from dbquery import Eq, Range, In, IsNone, And, Or, executeQuery
+from plotFuncs import filterSimIds
+from test_repoSetUp import RepoSetUp, createEntry
+
+
+class TestPredicates(unittest.TestCase):
+
+    def test_unknown_keyword(self):
+        self.assertRaises(KeyError, Eq, 'unknown', 1)
+
+    def test_predicates_are_abstract(self):
+        self.assertRaises(TypeError, dbquery.Predicate)
+        self.assertRaises(TypeError, dbquery.KeywordPredicate, 'a')
+
+    def test_isIndexed(self):
+        self.assertTrue(And(Eq('a', 1), Or(Eq('b', 1))).isIndexed())
+        self.assertFalse(And(Eq('a', 1), Eq('crackType', 1)).isIndexed())
+
+    def test_evaluate(self):
+        fields = {'a': 20, 'b': 10, 'transform': None}
+        self.assertTrue(Eq('a', 20).evaluate(fields))
+        self.assertTrue(Range('a', 10, 20).evaluate(fields))
+        self.assertFalse(Range('a', high=19).evaluate(fields))
+        self.assertFalse(Range('transform', low=0).evaluate(fields))
+        self.assertTrue(In('b', [5, 10]).evaluate(fields))
+        self.assertTrue(IsNone('transform').evaluate(fields))
+        self.assertFalse(And(Eq('a', 20), Eq('b', 5)).evaluate(fields))
+        self.assertTrue(Or(Eq('a', 20), Eq('b', 5)).evaluate(fields))
+
+    def test_getConjuncts(self):
+        p1, p2, p3 = Eq('a', 1), Eq('b', 1), Eq('E', 1)
+        self.assertEqual([p1, p2, p3], And(p1, And(p2, p3)).getConjuncts())
+        orp = Or(p1, p2)
+        self.assertEqual([orp, p3], And(orp, p3).getConjuncts())
+
+    def test_createConjunction(self):
+        p = dbquery.createConjunction({'a': 1, 'b': 2})
+        self.assertEqual(set(['a', 'b']), p.getKeywords())
+        self.assertTrue(p.evaluate({'a': 1, 'b': 2}))
+
+
+class TestExecuteQuery(RepoSetUp):
+
+    def test_indexed_query(self):
+        p = And(Eq('analysisType', 'XFEM'), Range('d', 110, 200))
+        res, plan = executeQuery(self.getSimIds(), p)
+        self.assertEqual(set(['db1$r2']), res)
+        self.assertEqual(['db1', 'db2'], sorted(plan.indexedDbs))
+        self.assertEqual(['db2'], plan.prunedDbs)
+        self.assertEqual(0, plan.unpickled)
+        self.assertEqual('paramIndex', plan.index)
+
+    def test_indexed_query_with_In_and_IsNone(self):
+        res = dbquery.selectSimIds(
+            self.getSimIds(), Or(In('a', [30]), Eq('analysisSuccess', False)))
+        self.assertEqual(set(['db1$r3', 'db2$r2']), res)
+        res = dbquery.selectSimIds(self.getSimIds(), IsNone('transform'))
+        self.assertEqual(self.getSimIds('db1'), res)
+        res = dbquery.selectSimIds(self.getSimIds(), IsNone('a'))
+        self.assertEqual(set(), res)
+
+    def test_query_prunes_databases_with_index(self):
+        p = And(Eq('analysisType', 'FEM'), Range('timeToCalcInSec', 0, 100))
+        res, plan = executeQuery(self.getSimIds(), p)
+        self.assertEqual(self.getSimIds('db2'), res)
+        self.assertEqual(['db1'], plan.prunedDbs)
+        self.assertEqual(['db2'], plan.scannedDbs)
+        self.assertEqual(2, plan.unpickled)
+
+    def test_bool_value_of_numeric_keyword_in_index_and_scan(self):
+        self.appendEntry('db1$r9', createEntry(d=1))
+        p = Eq('d', True)
+        indexed = dbquery.selectSimIds(self.getSimIds(), p)
+        self.assertEqual(set(['db1$r9']), indexed)
+        fields = dict((s, dba.extractFields(dba.getEntryData(s), ['d']))
+                      for s in self.getSimIds())
+        self.assertEqual(set(s for s in fields if p.evaluate(fields[s])),
+                         indexed)
+
+    def test_scan_query(self):
+        p = Or(Eq('crackType', 'embedded'), Eq('a', 30))
+        res, plan = executeQuery(self.getSimIds(), p)
+        self.assertEqual(self.getSimIds(), res)
+        self.assertEqual(None, plan.index)
+        self.assertEqual(['db1', 'db2'], plan.scannedDbs)
+        self.assertEqual(5, plan.unpickled)
+        self.assertIn('unpickled records: 5', plan.getReport())
+
+    def test_filterSimIds(self):
+        res = filterSimIds(self.getSimIds(),
+                           {'analysisType': 'XFEM', 'h': 80, 'a': 20})
+        self.assertEqual(set(['db1$r1', 'db1$r2']), res)
+        self.assertEqual(self.getSimIds(),
+                         filterSimIds(self.getSimIds(), {}))
+
+    def test_filterSimIds_with_unknown_keyword(self):
+        self.assertEqual(set(), filterSimIds(
+            self.getSimIds(), {'analysisType': 'XFEM', 'unknown': 1}))
+        self.assertEqual(self.getSimIds('db1'), filterSimIds(
+            self.getSimIds(), {'analysisType': 'XFEM', 'unknown': None}))
+        self.assertEqual(set(), filterSimIds(
+            self.getSimIds(), {'crackType': 'embedded', 'unknown': 1}))
@@ -6,6 +6,42 @@ import numpy as np
 modulePath = 'miscFuncs.'
 
 
+def calcStatsSeparately(statKey, angles, analytical, analysis, eSign):
+    """
+    Reference for calcStats: calculates statistic statKey with its own
+    function, without the shared pass of calcStats.
+    """
+    if statKey == 'areaDiff':
+        return calcAreaDiff(angles=angles, analysisData=analysis,
+                            analyticalData=analytical)
+    elif statKey == 'dotProd':
+        return calcDotProdDiff(analysisData=analysis,
+                               analyticalData=analytical)
+    elif statKey == 'avgNormError':
+        return calcAvgNormError(
+            analytical=analytical,
+            analysis=analysis,
+            domain=angles,
+            eSignFactor=eSign)
+    elif statKey == 'maxNormError':
+        return calcMaxNormError(
+            analytical=analytical,
+            analysis=analysis,
+            domain=angles,
+            eSignFactor=eSign)
+    elif statKey == 'difference':
+        return calcDiffErrors(analytical=analytical, analysis=analysis)
+    elif statKey == 'rmsd':
+        return calcRMSD(analytical=analytical, analysis=analysis)
+    else:
+        raise KeyError('{0} does not correspond to a function'.format(statKey))
+
+
+def averageContours(contoursDict, numCont):
+    return calcContourEstimates(
+        stackContours(contoursDict)[1], numCont, ['mean'])['mean']
+
+
 class TestDotProd(unittest.TestCase):
 
     def test_dotProd_with_vectors_of_equal_length(self):
@@ -166,7 +202,7 @@ class TestContourAveraging(unittest.TestCase):
         expected = [17.0 / 4., 0, -17.0 / 4.]
         for i in range(len(expected)):
             self.assertAlmostEqual(
-                expected[i], contourAveraging(
+                expected[i], averageContours(
                     self.contEvenDict, numCont)[i])
 
     def test_contourAveraging_with_even_number_contours_and_odd_numCont(self):
@@ -174,7 +210,7 @@ class TestContourAveraging(unittest.TestCase):
         expected = [14.0 / 3., 0, -14.0 / 3.]
         for i in range(len(expected)):
             self.assertAlmostEqual(
-                expected[i], contourAveraging(
+                expected[i], averageContours(
                     self.contEvenDict, numCont)[i])
 
     def test_contourAveraging_with_odd_number_contours_and_even_numCont(self):
@@ -182,7 +218,7 @@ class TestContourAveraging(unittest.TestCase):
         expected = [19.0 / 4., 0, -19.0 / 4.]
         for i in range(len(expected)):
             self.assertAlmostEqual(
-                expected[i], contourAveraging(
+                expected[i], averageContours(
                     self.contOddDict, numCont)[i])
 
     def test_contourAveraging_with_odd_number_contours_and_odd_numCont(self):
@@ -190,7 +226,7 @@ class TestContourAveraging(unittest.TestCase):
         expected = [14.0 / 3., 0, -14.0 / 3.]
         for i in range(len(expected)):
             self.assertAlmostEqual(
-                expected[i], contourAveraging(
+                expected[i], averageContours(
                     self.contOddDict, numCont)[i])
 
     def test_contourAveraging_with_even_number_contours_and_one_numCont(self):
@@ -198,7 +234,7 @@ class TestContourAveraging(unittest.TestCase):
         expected = [9., 0, -9.]
         for i in range(len(expected)):
             self.assertAlmostEqual(
-                expected[i], contourAveraging(
+                expected[i], averageContours(
                     self.contEvenDict, numCont)[i])
 
     def test_contourAveraging_with_odd_number_contours_and_one_numCont(self):
@@ -206,7 +242,7 @@ class TestContourAveraging(unittest.TestCase):
         expected = [9.0, 0, -9.0]
         for i in range(len(expected)):
             self.assertAlmostEqual(
-                expected[i], contourAveraging(
+                expected[i], averageContours(
                     self.contEvenDict, numCont)[i])
 
     def test_contourAveraging_with_even_number_contours_over_all_contours(
@@ -215,7 +251,7 @@ class TestContourAveraging(unittest.TestCase):
         expected = [29. / 6., 0, -29. / 6]
         for i in range(len(expected)):
             self.assertAlmostEqual(
-                expected[i], contourAveraging(
+                expected[i], averageContours(
                     self.contEvenDict, numCont)[i])
 
     def test_contourAveraging_with_odd_number_contours_over_all_contours(self):
@@ -223,18 +259,55 @@ class TestContourAveraging(unittest.TestCase):
         expected = [22. / 5, 0, -22. / 5]
         for i in range(len(expected)):
             self.assertAlmostEqual(
-                expected[i], contourAveraging(
+                expected[i], averageContours(
                     self.contOddDict, numCont)[i])
 
     def test_contourAveraging_with_larger_numCont_than_contours(self):
         numCont = len(self.contEvenDict.keys()) + 1
         self.assertRaises(
-            AssertionError, contourAveraging, self.contEvenDict, numCont)
+            AssertionError, averageContours, self.contEvenDict, numCont)
 
     def test_contourAveraging_over_zero_contours(self):
         numCont = 0
         self.assertRaises(
-            AssertionError, contourAveraging, self.contEvenDict, numCont)
+            AssertionError, averageContours, self.contEvenDict, numCont)
+
+
+class TestCalcContourEstimates(unittest.TestCase):
+
+    def setUp(self):
+        rs = np.random.RandomState(0)
+        self.stack = rs.normal(size=(7, 50))
+        self.stack[3, 0] = 100
+
+    def test_stackContours(self):
+        keys, stack = stackContours({'c2': [3, 4], 'c1': [1, 2]})
+        self.assertEqual(['c1', 'c2'], keys)
+        np.testing.assert_array_equal([[1, 2], [3, 4]], stack)
+
+    def test_calcContourEstimates_with_centered_window(self):
+        res = calcContourEstimates(self.stack, 5)
+        window = self.stack[1:6]
+        np.testing.assert_allclose(np.mean(window, axis=0), res['mean'])
+        np.testing.assert_allclose(np.median(window, axis=0), res['median'])
+        np.testing.assert_allclose(
+            np.mean(np.sort(window, axis=0)[1:4], axis=0),
+            res['trimmedMean'])
+        self.assertLess(res['median'][0], 5)
+
+    def test_calcContourEstimates_with_start_and_even_window(self):
+        res = calcContourEstimates(self.stack, 4, ['median'], start=3)
+        self.assertEqual(['median'], res.keys())
+        np.testing.assert_allclose(
+            np.median(self.stack[3:7], axis=0), res['median'])
+
+    def test_calcContourEstimates_with_invalid_window(self):
+        self.assertRaises(AssertionError, calcContourEstimates,
+                          self.stack, 4, start=4)
+        self.assertRaises(AssertionError, calcContourEstimates,
+                          self.stack, 8)
+        self.assertRaises(KeyError, calcContourEstimates, self.stack, 3,
+                          ['mode'])
 
 
 class TestCalcErrors(unittest.TestCase):
@@ -382,109 +455,251 @@ class TestCalcMaxNormError(unittest.TestCase):
         self.assertAlmostEqual(errors[2], result)
 
 
+class TestCalcStats(unittest.TestCase):
+
+    def setUp(self):
+        self.angles = [0, 10, 20, 35, 50, 90]
+        self.analytical = [2, 1, -7, -1, -9, 3]
+        self.analysis = [1, 2, 3, -4, -5, -6]
+
+    def assertStatsEqual(self, angles, analytical, analysis):
+        stats = calcStats(angles, analytical, analysis)
+        for statKey in statKeys:
+            for eSign in eSignFactors:
+                exp = calcStatsSeparately(
+                    statKey, angles, analytical, analysis, eSign)
+                res = getStat(stats, statKey, eSign)
+                np.testing.assert_array_almost_equal(exp, res)
+
+    def test_calcStats_matches_the_separate_functions(self):
+        self.assertStatsEqual(self.angles, self.analytical, self.analysis)
+        self.assertStatsEqual(self.angles, self.analysis, self.analytical)
+        np.random.seed(0)
+        angles = np.sort(np.random.uniform(0, 360, 50))
+        self.assertStatsEqual(angles, np.random.normal(size=50),
+                              np.random.normal(size=50))
+
+    def test_calcStats_with_zero_analytical(self):
+        stats = calcStats(self.angles, [0] * 6, self.analysis)
+        for statKey in ['areaDiff', 'dotProd', 'avgNormError',
+                        'maxNormError']:
+            for eSign in eSignFactors:
+                self.assertRaises(ZeroDivisionError, getStat, stats,
+                                  statKey, eSign)
+                self.assertRaises(
+                    ZeroDivisionError, calcStatsSeparately, statKey,
+                    self.angles, [0] * 6, self.analysis, eSign)
+        self.assertAlmostEqual(calcRMSD([0] * 6, self.analysis),
+                               getStat(stats, 'rmsd', 'areas'))
+
+    def test_calcStats_with_zero_float_analytical_and_dotProd_sign(self):
+        analysis = [1, 0, 3, -4, -5, -6]
+        stats = calcStats(self.angles, [0.] * 6, analysis)
+        for statKey, exp in [('avgNormError', np.nan),
+                             ('maxNormError', np.inf)]:
+            np.testing.assert_equal(exp, getStat(stats, statKey, 'dotProd'))
+            np.testing.assert_equal(exp, calcStatsSeparately(
+                statKey, self.angles, [0.] * 6, analysis, 'dotProd'))
+            self.assertRaises(ZeroDivisionError, getStat, stats, statKey,
+                              'areas')
+        self.assertEqual(-np.inf, getStat(
+            calcStats(self.angles, [0.] * 6, [0, 0, -2, 0, 0, 0]),
+            'maxNormError', 'dotProd'))
+
+    def test_calcStats_with_unsorted_angles(self):
+        angles = [0, 20, 10, 35, 50, 90]
+        stats = calcStats(angles, self.analytical, self.analysis)
+        self.assertRaises(AssertionError, getStat, stats, 'areaDiff', None)
+        self.assertRaises(AssertionError, getStat, stats, 'avgNormError',
+                          'areas')
+        self.assertAlmostEqual(
+            calcAvgNormError(self.analytical, self.analysis, angles,
+                             'dotProd'),
+            getStat(stats, 'avgNormError', 'dotProd'))
+
+    def test_calcStats_with_different_length_arrays(self):
+        self.assertRaises(AssertionError, calcStats, [0, 1], [1, 2], [1])
+
+    def test_calcStats_with_selected_metrics(self):
+        with patch(modulePath + 'calcTrapezoidAreas') as areasMock:
+            stats = calcStats(self.angles, self.analytical, self.analysis,
+                              metrics=['rmsd', 'avgNormError'],
+                              eSigns=['dotProd'])
+        self.assertFalse(areasMock.called)
+        self.assertEqual(['avgNormError', 'rmsd'], sorted(stats.keys()))
+        self.assertEqual(['dotProd'], stats['avgNormError'].keys())
+        full = calcStats(self.angles, self.analytical, self.analysis)
+        self.assertEqual(full['rmsd'], stats['rmsd'])
+        self.assertEqual(full['avgNormError']['dotProd'],
+                         stats['avgNormError']['dotProd'])
+        self.assertRaises(KeyError, calcStats, self.angles, self.analytical,
+                          self.analysis, metrics=['statkey'])
+
+    def test_getStat_with_unrecognized_keys(self):
+        stats = calcStats(self.angles, self.analytical, self.analysis)
+        self.assertRaises(KeyError, getStat, stats, 'statkey', 'areas')
+        self.assertRaises(KeyError, getStat, stats, 'avgNormError',
+                          'unrecognized key')
+
+
 class TestCalcStatsWrapper(unittest.TestCase):
 
     def setUp(self):
-        self.areaDiffMock = MagicMock(return_value='areaDiffMock')
-        self.dpMock = MagicMock(return_value='dpMock')
-        self.avgNErrMock = MagicMock(return_value='avgNErrMock')
-        self.maxNErrMock = MagicMock(return_value='maxNErrMock')
-        self.diffErrMock = MagicMock(return_value='diffErrMock')
-        self.rmsdMock = MagicMock(return_value='rmsdMock')
-        self.patches = [
-            patch(modulePath + 'calcAreaDiff', self.areaDiffMock),
-            patch(modulePath + 'calcDotProdDiff', self.dpMock),
-            patch(modulePath + 'calcAvgNormError', self.avgNErrMock),
-            patch(modulePath + 'calcMaxNormError', self.maxNErrMock),
-            patch(modulePath + 'calcDiffErrors', self.diffErrMock),
-            patch(modulePath + 'calcRMSD', self.rmsdMock)]
-        for p in self.patches:
-            p.start()
-
-    def tearDown(self):
-        for p in self.patches:
-            p.stop()
+        self.angles = [0, 10, 20, 35, 50, 90]
+        self.analytical = [2, 1, -7, -1, -9, 3]
+        self.analysis = [1, 2, 3, -4, -5, -6]
 
     def test_calcStatsWrapper_with_nonexisting_statKey(self):
-        self.assertRaises(KeyError, calcStatsWrapper, 'statkey',
-                          'angles', 'analytical', 'analysis', 'areas')
+        with patch(modulePath + 'calcStats') as kernelMock:
+            self.assertRaises(KeyError, calcStatsWrapper, 'statkey',
+                              'angles', 'analytical', 'analysis', 'areas')
+        self.assertFalse(kernelMock.called)
+
+    def test_calcStatsWrapper_uses_the_fused_kernel(self):
+        kernelMock = MagicMock(return_value='stats')
+        getMock = MagicMock(return_value='rmsdStat')
+        with patch(modulePath + 'calcStats', kernelMock), \
+                patch(modulePath + 'getStat', getMock):
+            self.assertEqual('rmsdStat', calcStatsWrapper(
+                'rmsd', 'angles', 'analytical', 'analysis', 'areas'))
+        kernelMock.assert_called_once_with('angles', 'analytical', 'analysis')
+        getMock.assert_called_once_with('stats', 'rmsd', 'areas')
+
+    def test_calcStatsWrapper_raises_ZeroDivisionError(self):
+        self.assertRaises(ZeroDivisionError, calcStatsWrapper, 'dotProd',
+                          [0, 1], [0, 0], [1, 2], 'areas')
+
+    def assertWrapperEqual(self, statKey, exp, eSign='areas'):
+        np.testing.assert_array_almost_equal(exp, calcStatsWrapper(
+            statKey, self.angles, self.analytical, self.analysis, eSign))
 
     def test_calcStatsWrapper_with_areaDiff_statKey(self):
-        self.assertEqual(
-            'areaDiffMock',
-            calcStatsWrapper(
-                'areaDiff',
-                'angles',
-                'analytical',
-                'analysis',
-                'areas'))
-        self.areaDiffMock.assert_called_once_with(
-            angles='angles',
-            analysisData='analysis',
-            analyticalData='analytical')
+        self.assertWrapperEqual('areaDiff', calcAreaDiff(
+            angles=self.angles, analysisData=self.analysis,
+            analyticalData=self.analytical))
 
     def test_calcStatsWrapper_with_dotProd_statKey(self):
-        self.assertEqual(
-            'dpMock',
-            calcStatsWrapper(
-                'dotProd',
-                'angles',
-                'analytical',
-                'analysis',
-                'areas'))
-        self.dpMock.assert_called_once_with(analysisData='analysis',
-                                            analyticalData='analytical')
+        self.assertWrapperEqual('dotProd', calcDotProdDiff(
+            analysisData=self.analysis, analyticalData=self.analytical))
 
     def test_calcStatsWrapper_with_avgNormError(self):
-        self.assertEqual(
-            'avgNErrMock',
-            calcStatsWrapper(
-                'avgNormError',
-                'angles',
-                'analytical',
-                'analysis',
-                'areas'))
-        self.avgNErrMock.assert_called_once_with(
-            analytical='analytical',
-            analysis='analysis',
-            domain='angles',
-            eSignFactor='areas')
+        for eSign in eSignFactors:
+            self.assertWrapperEqual('avgNormError', calcAvgNormError(
+                analytical=self.analytical, analysis=self.analysis,
+                domain=self.angles, eSignFactor=eSign), eSign)
 
     def test_calcStatsWrapper_with_maxNormError_statKey(self):
-        self.assertEqual(
-            'maxNErrMock',
-            calcStatsWrapper(
-                'maxNormError',
-                'angles',
-                'analytical',
-                'analysis',
-                'areas'))
-        self.maxNErrMock.assert_called_once_with(
-            analytical='analytical',
-            analysis='analysis',
-            domain='angles',
-            eSignFactor='areas')
+        for eSign in eSignFactors:
+            self.assertWrapperEqual('maxNormError', calcMaxNormError(
+                analytical=self.analytical, analysis=self.analysis,
+                domain=self.angles, eSignFactor=eSign), eSign)
 
     def test_calcStatsWrapper_with_difference_statKey(self):
-        self.assertEqual(
-            'diffErrMock',
-            calcStatsWrapper(
-                'difference',
-                'angles',
-                'analytical',
-                'analysis',
-                'areas'))
-        self.diffErrMock.assert_called_once_with(analytical='analytical',
-                                                 analysis='analysis')
+        self.assertWrapperEqual('difference', calcDiffErrors(
+            analytical=self.analytical, analysis=self.analysis))
 
     def test_calcStatsWrapper_with_rmsd_statKey(self):
-        self.assertEqual(
-            'rmsdMock',
-            calcStatsWrapper(
-                'rmsd',
-                'angles',
-                'analytical',
-                'analysis',
-                'areas'))
-        self.rmsdMock.assert_called_once_with(analytical='analytical',
-                                              analysis='analysis')
+        self.assertWrapperEqual('rmsd', calcRMSD(
+            analytical=self.analytical, analysis=self.analysis))
+
+
+class TestCalcStatsBatch(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1)
+        self.angles = [np.sort(np.random.uniform(0, 360, n))
+                       for n in [6, 9, 4]]
+        self.analytical = [np.random.normal(size=len(x)) for x in self.angles]
+        self.analysis = [np.random.normal(size=len(x)) for x in self.angles]
+
+    def assertBatchEqual(self, stats, angles, analytical, analysis):
+        for i in range(len(angles)):
+            exp = calcStats(angles[i], analytical[i], analysis[i])
+            res = selectBatchStats(stats, i, len(angles[i]))
+            for statKey in statKeys:
+                for eSign in eSignFactors:
+                    try:
+                        expValue = getStat(exp, statKey, eSign)
+                    except ZeroDivisionError:
+                        expValue = float('NaN')
+                    np.testing.assert_array_almost_equal(
+                        expValue, getStat(res, statKey, eSign))
+
+    def test_padRows(self):
+        padded, mask = padRows([[1, 2], [3], []])
+        np.testing.assert_array_equal([[1, 2], [3, 0], [0, 0]], padded)
+        np.testing.assert_array_equal(
+            [[True, True], [True, False], [False, False]], mask)
+
+    def test_calcStatsBatch_with_ragged_rows(self):
+        angles, mask = padRows(self.angles)
+        stats = calcStatsBatch(angles, padRows(self.analytical)[0],
+                               padRows(self.analysis)[0], mask)
+        self.assertBatchEqual(stats, self.angles, self.analytical,
+                              self.analysis)
+
+    def test_calcStatsBatch_with_shared_angle_grid(self):
+        angles = self.angles[0]
+        analytical = np.array([self.analytical[0], [0] * 6,
+                               self.analysis[0]])
+        analysis = np.array([self.analysis[0], self.analysis[0],
+                             self.analytical[0]])
+        stats = calcStatsBatch(angles, analytical, analysis)
+        self.assertTrue(np.isnan(stats['dotProd'][1]))
+        self.assertBatchEqual(stats, [angles] * 3, analytical, analysis)
+
+    def test_calcStatsBatch_with_invalid_input(self):
+        angles, mask = padRows(self.angles)
+        data = padRows(self.analysis)[0]
+        self.assertRaises(AssertionError, calcStatsBatch,
+                          angles[:, ::-1], data, data, mask)
+        self.assertRaises(AssertionError, calcStatsBatch,
+                          angles, data, data, mask[:, ::-1])
+        self.assertRaises(AssertionError, calcStatsBatch,
+                          angles, data, data[:2], mask)
+
+
+class TestVectorizedKernels(unittest.TestCase):
+
+    def setUp(self):
+        rs = np.random.RandomState(0)
+        self.x = np.linspace(0, 360, 1001)
+        self.analytical = np.cos(np.radians(self.x)) + 0.5
+        self.analysis = self.analytical + rs.normal(0, 0.05, len(self.x))
+
+    def loopArea(self, x, y):
+        return sum(0.5 * (abs(y[i]) + abs(y[i + 1])) * (x[i + 1] - x[i])
+                   for i in range(len(x) - 1))
+
+    def test_calcAbsoluteArea_matches_loop(self):
+        self.assertAlmostEqual(self.loopArea(self.x, self.analysis),
+                               calcAbsoluteArea(self.x, self.analysis))
+
+    def test_calcAbsoluteArea_with_float32(self):
+        res = calcAbsoluteArea(self.x, self.analysis, np.float32)
+        self.assertEqual(np.float32, res.dtype)
+        self.assertAlmostEqual(1, res / self.loopArea(self.x, self.analysis),
+                               places=5)
+
+    def test_calcAbsoluteArea_with_one_point(self):
+        self.assertEqual(0, calcAbsoluteArea([1], [5]))
+
+    def test_calcMaxNormError_returns_first_largest(self):
+        res = calcMaxNormError([1, 1, 1, 1], [1, 3, -1, 2], [0, 1, 2, 3],
+                               'dotProd')
+        self.assertEqual(2, res)
+
+    def test_calcNormErrors_with_float32(self):
+        for eSign in eSignFactors:
+            exp, expSign = calcNormErrors(
+                self.analytical, self.analysis, self.x, eSign)
+            res, sign = calcNormErrors(
+                self.analytical, self.analysis, self.x, eSign, np.float32)
+            self.assertEqual(np.float32, res.dtype)
+            self.assertEqual(expSign, sign)
+            np.testing.assert_allclose(exp, res, atol=1e-6)
+            self.assertAlmostEqual(
+                calcMaxNormError(self.analytical, self.analysis, self.x,
+                                 eSign),
+                calcMaxNormError(self.analytical, self.analysis, self.x,
+                                 eSign, np.float32), places=6)
@@ -0,0 +1,89 @@
+import unittest
+from mock import MagicMock, patch
+import numpy as np
+import os
+import dbaccess as dba
+import paramIndex
+from test_repoSetUp import RepoSetUp
+
+
+class TestColumns(unittest.TestCase):
+
+    def test_createColumn_with_numbers(self):
+        col = paramIndex.createColumn([1, 2.5, 3])
+        self.assertNotEqual(object, col.dtype)
+        self.assertEqual([1, 2.5, 3], col.tolist())
+
+    def test_createColumn_with_None_strings_and_booleans(self):
+        for values in [[1, None], ['a', 'b'], [True, False]]:
+            col = paramIndex.createColumn(values)
+            self.assertEqual(object, col.dtype)
+            self.assertEqual(values, col.tolist())
+
+    def test_equalsMask(self):
+        col = paramIndex.createColumn([1, 2, 1])
+        self.assertEqual([True, False, True],
+                         list(paramIndex.equalsMask(col, 1)))
+        self.assertEqual([False] * 3,
+                         list(paramIndex.equalsMask(col, '1')))
+        for criterion in [True, False, np.True_]:
+            self.assertEqual([v == criterion for v in [1, 2, 1]],
+                             list(paramIndex.equalsMask(col, criterion)))
+        col = paramIndex.createColumn(['a', None, 'a'])
+        self.assertEqual([False, True, False],
+                         list(paramIndex.equalsMask(col, None)))
+
+
+class TestParamIndexQueries(RepoSetUp):
+
+    def test_extractSimIdParamValuesFromSubset_with_indexed_parameter(self):
+        res = dba.extractSimIdParamValuesFromSubset(self.getSimIds(), 'd')
+        exp = {'db1$r1': 100, 'db1$r2': 120, 'db1$r3': 100,
+               'db2$r1': 100, 'db2$r2': 100}
+        self.assertEqual(exp, res)
+
+    def test_getSubsetByCriterion_with_indexed_parameter(self):
+        simIds = self.getSimIds()
+        self.assertEqual(set(['db1$r1', 'db1$r3']), dba.getSubsetByCriterion(
+            self.getSimIds('db1'), 'd', 100))
+        self.assertEqual(set(['db2$r1', 'db2$r2']), dba.getSubsetByCriterion(
+            simIds, 'analysisType', 'FEM'))
+        self.assertEqual(set(['db2$r2']), dba.getSubsetByCriterion(
+            simIds, 'analysisSuccess', False))
+        self.assertEqual(set(['db1$r3']), dba.getSubsetByCriterion(
+            simIds, 'crackRatio', 3.0))
+
+    def test_getParameterRange_with_indexed_parameter(self):
+        self.assertEqual(set([20, 30]),
+                         dba.getParameterRange(self.getSimIds(), 'a'))
+
+    def test_index_is_persisted_and_reused(self):
+        paramIndex.getIndex('db1')
+        self.assertTrue(os.path.exists(paramIndex.getIndexPath('db1')))
+        paramIndex.clearLoadedIndexes()
+        with patch('paramIndex.buildIndex',
+                   MagicMock(side_effect=AssertionError)):
+            index = paramIndex.getIndex('db1')
+        self.assertEqual(set(['r1', 'r2', 'r3']), set(index.keys))
+        self.assertEqual(
+            {'r1': 50, 'r2': 60},
+            index.getValues('allEdges', ['r1', 'r2']))
+
+    def test_index_is_rebuilt_when_shelve_changes(self):
+        self.assertEqual(set(['db1$r1', 'db1$r3']), dba.getSubsetByCriterion(
+            self.getSimIds('db1'), 'd', 100))
+        self.entries['db1$r2']['input']['geometricParameters'][
+            'containerRadius'] = 50
+        self.writeDb('db1')
+        self.assertEqual(
+            set(['db1$r1', 'db1$r2', 'db1$r3']),
+            dba.getSubsetByCriterion(self.getSimIds('db1'), 'd', 100))
+
+    def test_index_of_another_format_is_rebuilt(self):
+        index = paramIndex.getIndex('db1')
+        index.keys = index.keys[:2]
+        with patch('paramIndex.indexFormat', 1):
+            paramIndex.saveIndex(index)
+        paramIndex.clearLoadedIndexes()
+        self.assertEqual(set(['r1', 'r2', 'r3']),
+                         set(paramIndex.getIndex('db1').keys))
@@ -142,11 +142,16 @@ class TestCreateCeAeDataStr(unittest.TestCase):
         self.simids = ['simid1', 'simid2', 'simid3', 'simid4']
         self.caeMock = MagicMock(side_effect=mockSF)
         self.caePatch = patch(
-            'plotFuncs.getCeAeError', self.caeMock)
+            'plotFuncs.getAnalysisDataCeAeError', self.caeMock)
         self.caePatch.start()
+        # the AnalysisData of a simId is replaced with the simId
+        self.iterPatch = patch('dataProcessing.iterAnalysisData', MagicMock(
+            side_effect=lambda simIds: [(s, s) for s in simIds]))
+        self.iterPatch.start()
 
     def tearDown(self):
         self.caePatch.stop()
+        self.iterPatch.stop()
 
     def test_createCeAeDataStr_with_rmsd_K1_successful_True(self):
         res = createCeAeDataStr(self.simids, 'rmsd', 'K1', successful=True)
@@ -178,11 +183,15 @@ class TestCreateD_H_SimId_Err_ValDataStr(unittest.TestCase):
             return data[simId]
         dheMock = MagicMock(side_effect=mockSF)
         self.dheP = patch(
-            'plotFuncs.getDiamHeightError', dheMock)
+            'plotFuncs.getAnalysisDataDiamHeightError', dheMock)
         self.dheP.start()
+        self.iterPatch = patch('dataProcessing.iterAnalysisData', MagicMock(
+            side_effect=lambda simIds: [(s, s) for s in simIds]))
+        self.iterPatch.start()
 
     def tearDown(self):
         self.dheP.stop()
+        self.iterPatch.stop()
 
     def test_createD_H_SimId_Err_ValDataStr(self):
         exp = {(100, 10): [('simid_1', 1), ('simid_3', 3)],
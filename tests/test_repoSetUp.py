@@ -0,0 +1,134 @@
+import unittest
+from mock import MagicMock, patch
+import numpy as np
+import tempfile
+import shutil
+import shelve
+import os
+import dbaccess as dba
+import paramIndex
+import resultsStore
+import analysisCache
+import dataProcessing
+import anSol
+
+
+def createEntry(a=20, b=10, d=100, h=80, analysisType='XFEM',
+                modelType='crackPartition', elements='LinearTet',
+                successful=True, numAngles=5, numContours=4,
+                allEdges=50, crackEdges=20, transform=None):
+    angles = np.linspace(10, 350, numAngles)
+    sifs = {}
+    for s, f in zip(['K1', 'K2', 'K3'], [1.0, 2.0, 3.0]):
+        sifs[s] = dict(
+            (c, f * (c + 1) + angles / 100.) for c in range(numContours))
+    entry = {
+        'input': {
+            'crackParameters': {'a': a, 'b': b, 'crackType': 'embedded'},
+            'analysisParameters': {'sigma': 100, 'gamma': 45, 'omega': 60},
+            'analysisType': analysisType,
+            'modelType': modelType,
+            'meshParameters': {'elements': elements},
+            'seedParameters': {'allEdges': allEdges,
+                               'crackEdges': crackEdges},
+            'geometricParameters': {'containerHeight': h,
+                                    'containerRadius': d / 2.},
+            'material': {'E': 210000, 'v': 0.3}},
+        'reports': {
+            'successfulAnalysis': successful,
+            'analysis': {'creationTime': 10, 'timeOfCalculation': 70}}}
+    if transform is not None:
+        entry['input']['meshParameters']['transformationType'] = transform
+    if successful:
+        entry['odb'] = {'results': {'sortedBetaAngles': angles,
+                                    'sortedSIFs': sifs}}
+    return entry
+
+
+class RepoSetUp(unittest.TestCase):
+    """
+    Temporary Policrack repository with two databases. db1 holds three
+    records and db2 holds two records, one of them failed.
+    """
+
+    def setUp(self):
+        self.repoDir = tempfile.mkdtemp()
+        self.repoPatch = patch(
+            'dbaccess.getDbRepoDir', MagicMock(return_value=self.repoDir))
+        self.repoPatch.start()
+        self.resetCaches()
+        self.entries = {
+            'db1$r1': createEntry(d=100, h=80, allEdges=50),
+            'db1$r2': createEntry(d=120, h=80, allEdges=60),
+            'db1$r3': createEntry(a=30, d=100, h=100, allEdges=70),
+            'db2$r1': createEntry(analysisType='FEM', modelType=None,
+                                  elements='QuadraticRI',
+                                  transform='elliptic'),
+            'db2$r2': createEntry(analysisType='FEM', modelType=None,
+                                  elements='QuadraticRI',
+                                  transform='elliptic', successful=False)}
+        for dbName in ['db1', 'db2']:
+            self.writeDb(dbName)
+
+    def tearDown(self):
+        self.resetCaches()
+        self.repoPatch.stop()
+        shutil.rmtree(self.repoDir)
+
+    def resetCaches(self):
+        dba.closeAllShelves()
+        dba.clearDiscoveryCache()
+        paramIndex.clearLoadedIndexes()
+        resultsStore.clearLoadedStores()
+        analysisCache.clearAnalysisCache()
+        dataProcessing.clearNodeDataRegistry()
+        anSol.clearUnitSolutionCache()
+        anSol.clearSolutionTables()
+        anSol.clearSolutionCache()
+
+    def writeDb(self, dbName):
+        dba.closeAllShelves()
+        resDir = os.path.join(self.repoDir, dbName, dba.resultsDb)
+        if os.path.exists(resDir):
+            shutil.rmtree(resDir)
+        os.makedirs(resDir)
+        db = shelve.open(os.path.join(resDir, dbName), 'c')
+        for simId in self.entries:
+            name, key = dba.splitUniqueEntryKey(simId)
+            if name == dbName:
+                db[key] = self.entries[simId]
+        db['metadata'] = {}
+        db.close()
+        self.bumpMtimes(dbName)
+
+    def appendEntry(self, simId, entry):
+        """
+        Writes entry to its database without closing the open shelves.
+        """
+        dbName, key = dba.splitUniqueEntryKey(simId)
+        self.entries[simId] = entry
+        resDir = os.path.join(self.repoDir, dbName, dba.resultsDb)
+        db = shelve.open(os.path.join(resDir, dbName), 'w')
+        db[key] = entry
+        db.close()
+        self.bumpMtimes(dbName)
+
+    def bumpMtimes(self, dbName):
+        resDir = os.path.join(self.repoDir, dbName, dba.resultsDb)
+        for path in [self.repoDir, resDir] + [
+                os.path.join(resDir, f) for f in os.listdir(resDir)]:
+            mtime = os.stat(path).st_mtime + 10
+            os.utime(path, (mtime, mtime))
+
+    def getSimIds(self, dbName=None):
+        return set(k for k in self.entries
+                   if dbName is None or k.startswith(dbName + '$'))
+
+
+class TestRepoSetUp(RepoSetUp):
+
+    def test_repository_databases(self):
+        self.assertEqual(['db1', 'db2'], sorted(dba.getShelveNames()))
+
+    def test_repository_keys(self):
+        self.assertEqual(self.getSimIds(), dba.getAllShelveKeys())
@@ -0,0 +1,117 @@
+import unittest
+from mock import MagicMock, patch
+import numpy as np
+import os
+import dbaccess as dba
+import resultsStore as rs
+import dataProcessing as dp
+from dataProcessing import AnalysisData, AnalysisNodeData
+from trees import TreeNode
+from test_repoSetUp import RepoSetUp, createEntry
+
+
+class TestGetRecordResults(unittest.TestCase):
+
+    def test_getRecordResults(self):
+        angles, contours = rs.getRecordResults(createEntry(numAngles=3))
+        self.assertEqual(3, len(angles))
+        self.assertEqual(['K1', 'K2', 'K3'], sorted(contours.keys()))
+        self.assertEqual([0, 1, 2, 3], contours['K1'][0])
+
+    def test_getRecordResults_without_matching_results(self):
+        self.assertEqual(None, rs.getRecordResults(
+            createEntry(successful=False)))
+        entry = createEntry(numAngles=3)
+        entry['odb']['results']['sortedSIFs']['K2'][1] = [1, 2]
+        self.assertEqual(None, rs.getRecordResults(entry))
+
+
+class TestResultsStore(RepoSetUp):
+
+    def setUp(self):
+        RepoSetUp.setUp(self)
+        with patch('sys.stdout'):
+            rs.exportRepository()
+        rs.clearLoadedStores()
+
+    def test_store_is_memory_mapped(self):
+        store = rs.getStore('db1')
+        self.assertEqual(3, store.getNumRecords())
+        self.assertEqual(['K1', 'K2', 'K3'], store.getSifs())
+        contours = store.getContours('r2', 'K2')
+        self.assertEqual((4, 5), contours.shape)
+        self.assertIsInstance(contours.base, np.memmap)
+        self.assertFalse(contours.flags.writeable)
+        self.assertEqual(1, rs.getStore('db2').getNumRecords())
+        self.assertFalse(rs.getStore('db2').hasRecord('r2'))
+
+    def test_store_matches_records(self):
+        for simId in self.getSimIds('db1'):
+            key = dba.splitUniqueEntryKey(simId)[1]
+            res = self.entries[simId]['odb']['results']
+            store = rs.getStore('db1')
+            np.testing.assert_array_equal(
+                res['sortedBetaAngles'], store.getAngles(key))
+            rawres = store.getRawres(key, 'K3')
+            self.assertEqual(sorted(res['sortedSIFs']['K3'].keys()),
+                             sorted(rawres.keys()))
+            for c in rawres:
+                np.testing.assert_array_equal(
+                    res['sortedSIFs']['K3'][c], rawres[c])
+        self.assertEqual(None, rs.getStore('db1').getResults('r1', ['J']))
+
+    def test_AnalysisData_reads_results_from_store(self):
+        extract = dba.extractFields
+        with patch('dbaccess.extractFields',
+                   MagicMock(side_effect=extract)) as extractMock:
+            ad = AnalysisData('db1$r1')
+        self.assertNotIn('angles', extractMock.call_args[0][1])
+        self.assertEqual(5, len(ad.angles))
+        self.assertEqual({}, ad.rawres)
+        keys, contours = ad.getContourStack('K1')
+        self.assertEqual(4, len(keys))
+        self.assertTrue(np.shares_memory(
+            contours, rs.getStore('db1').values['K1']))
+        ad.calcAnSol()
+        ad.calculateStats()
+        self.assertEqual(5, len(ad.getResults()['K1']))
+
+    def test_AnalysisNodeData_with_and_without_store(self):
+        node = TreeNode('node')
+        node.addMembers(['db1$r1', 'db1$r2'], 'successful')
+        withStore = AnalysisNodeData(node, ['K1', 'K2'])
+        withStore.performOperations()
+        with patch('resultsStore.findStore', MagicMock(return_value=None)):
+            withoutStore = AnalysisNodeData(node, ['K1', 'K2'])
+            withoutStore.performOperations()
+        np.testing.assert_array_equal(
+            withoutStore.getAngles(), withStore.getAngles())
+        for sif in ['K1', 'K2']:
+            np.testing.assert_array_equal(
+                withoutStore.getResults()[sif], withStore.getResults()[sif])
+
+    def test_iterAnalysisData_looks_up_stores_once_per_database(self):
+        with patch('resultsStore.findStore',
+                   MagicMock(side_effect=rs.findStore)) as findMock:
+            res = dict(dp.iterAnalysisData(self.getSimIds()))
+        self.assertEqual(2, findMock.call_count)
+        self.assertTrue(np.shares_memory(
+            res['db1$r2'].getContourStack('K2')[1],
+            rs.getStore('db1').values['K2']))
+
+    def test_store_is_ignored_when_database_changes(self):
+        self.assertNotEqual(None, rs.getStore('db1'))
+        self.writeDb('db1')
+        self.assertEqual(None, rs.getStore('db1'))
+        self.assertEqual(None, rs.findStore('db1$r1'))
+        self.assertEqual(None, rs.findStore('unknown$r1'))
+
+    def test_failed_lookups_are_cached_until_export(self):
+        self.writeDb('db1')
+        with patch('resultsStore.loadStore', wraps=rs.loadStore) as load:
+            self.assertEqual(None, rs.getStore('db1'))
+            self.assertEqual(None, rs.findStore('db1$r2'))
+            self.assertEqual(1, load.call_count)
+            rs.exportDb('db1')
+            self.assertEqual(3, rs.findStore('db1$r2').getNumRecords())
+            self.assertEqual(2, load.call_count)
@@ -0,0 +1,118 @@
+import unittest
+from mock import MagicMock, patch
+import numpy as np
+import tempfile
+import shutil
+import shelve
+import os
+import dbaccess as dba
+import splitStorage
+from dataProcessing import AnalysisData
+from test_repoSetUp import RepoSetUp
+
+getDbRepoDir = dba.getDbRepoDir
+
+
+class TestSplitEntry(unittest.TestCase):
+
+    def test_splitEntry(self):
+        entry = {'input': 1, 'reports': 2, 'odb': 3}
+        self.assertEqual(({'input': 1, 'reports': 2}, 3),
+                         splitStorage.splitEntry(entry))
+        self.assertEqual(({'input': 1}, None),
+                         splitStorage.splitEntry({'input': 1}))
+
+    def test_SplitEntry_loads_payload_once(self):
+        payloadDb = MagicMock()
+        payloadDb.__getitem__.return_value = 'payload'
+        entry = dba.SplitEntry({'input': 1}, 'db1', 'r1', payloadDb)
+        self.assertEqual(1, entry['input'])
+        self.assertFalse(payloadDb.__getitem__.called)
+        self.assertEqual('payload', entry['odb'])
+        self.assertEqual('payload', entry['odb'])
+        payloadDb.__getitem__.assert_called_once_with('r1')
+        self.assertRaises(KeyError, entry.__getitem__, 'unknown')
+
+
+class TestConvertRepository(RepoSetUp):
+
+    def setUp(self):
+        RepoSetUp.setUp(self)
+        self.destDir = tempfile.mkdtemp()
+        self.destRepo = os.path.join(self.destDir, 'db')
+        with patch('sys.stdout'):
+            splitStorage.convertRepository(self.destRepo)
+        self.resetCaches()
+        self.destPatch = patch(
+            'dbaccess.getDbRepoDir', MagicMock(return_value=self.destRepo))
+        self.destPatch.start()
+
+    def tearDown(self):
+        self.resetCaches()
+        self.destPatch.stop()
+        shutil.rmtree(self.destDir)
+        RepoSetUp.tearDown(self)
+
+    def test_layout(self):
+        self.assertEqual(['db1', 'db2'], sorted(dba.getShelveNames()))
+        self.assertTrue(dba.isSplitStorage('db1'))
+        header = shelve.open(dba.getShelvePathByName('db1'), 'r')
+        payload = shelve.open(dba.getPayloadShelvePath('db1'), 'r')
+        try:
+            self.assertEqual(['metadata', 'r1', 'r2', 'r3'],
+                             sorted(header.keys()))
+            self.assertNotIn('odb', header['r1'])
+            self.assertEqual(['r1', 'r2', 'r3'], sorted(payload.keys()))
+        finally:
+            header.close()
+            payload.close()
+
+    def test_converted_repository_is_read_through_setDbRepoDir(self):
+        with patch('dbaccess.getDbRepoDir', getDbRepoDir):
+            dba.setDbRepoDir(self.destRepo)
+            try:
+                self.assertEqual(self.destRepo,
+                                 dba.discoveryCache.getRepoDir())
+                self.assertTrue(dba.isSplitStorage('db1'))
+                for simId, entry in dba.iterEntriesData(self.getSimIds()):
+                    self.assertEqual(self.entries[simId]['input'],
+                                     entry['input'])
+            finally:
+                dba.setDbRepoDir(None)
+
+    def test_records_are_read_transparently(self):
+        for simId, entry in dba.iterEntriesData(self.getSimIds()):
+            exp = self.entries[simId]
+            self.assertEqual(exp['input'], entry['input'])
+            if exp['reports']['successfulAnalysis']:
+                np.testing.assert_array_equal(
+                    exp['odb']['results']['sortedBetaAngles'],
+                    entry['odb']['results']['sortedBetaAngles'])
+            else:
+                self.assertRaises(KeyError, entry.__getitem__, 'odb')
+        ad = AnalysisData('db1$r1')
+        self.assertEqual(5, len(ad.angles))
+        self.assertEqual(4, len(ad.rawres['K1']))
+
+    def test_header_access_does_not_open_payload(self):
+        AnalysisData('db1$r1', projection='tree')
+        self.assertEqual(['db1'], dba.shelvePool.getOpenShelveNames())
+
+    def test_queries(self):
+        simIds = self.getSimIds()
+        self.assertEqual(self.getSimIds('db1'),
+                         dba.getSubsetByCriterion(simIds, 'elements',
+                                                  'LinearTet'))
+        vals = dba.extractSimIdParamValuesFromSubset(simIds, 'angles')
+        self.assertEqual(None, vals['db2$r2'])
+        self.assertEqual(5, len(vals['db1$r1']))
+        with patch('dbaccess.parallelScanRecordThreshold', 1):
+            res = dba.extractSimIdParamValuesFromSubset(
+                simIds, 'angles', workers=2)
+        self.assertEqual(vals.keys(), res.keys())
+
+    def test_convert_in_place_or_twice(self):
+        self.assertRaises(IOError, splitStorage.convertRepository,
+                          self.destRepo)
+        self.assertRaises(IOError, splitStorage.convertDb, 'db1',
+                          self.destRepo)
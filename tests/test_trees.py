@@ -1,7 +1,14 @@
 import unittest
 from mock import Mock, MagicMock, patch, call
 from test_treeSetUp import TreeSetUp, node1FEMmembers, node1XFEMmembers, node2FEMmembers, node3FEMmembers, node3XFEMmembers, node5XFEMmembers, node10FEMmembers, node10XFEMmembers
+from test_repoSetUp import RepoSetUp, createEntry
 from trees import TreeNode, createTreeFromDbKeys, nodesPerLevel, tracePath, createTreeOfKeys, maxNodesPerLevel, nodeNamesPerLevel
+from trees import serializeTree, deserializeTree, createTreeFromRepository, getTreeIndexPath, getTreeLeaves
+import trees
+import os
+import copy
+import pickle
+import dbaccess as dba
 
 
 class TestTreeNode_constructor_parent_child_members_methods(unittest.TestCase):
@@ -404,6 +411,51 @@ class TestTreeNode_member_assignment(TreeSetUp):
         node10FEMmembers(self)
         node10XFEMmembers(self)
 
+    def test_aggregated_members_are_cached_and_invalidated(self):
+        tn0, tn1a, tn1b = self.setUp_assignMemberAsFailed()
+        res = tn0.getSuccessfulMembers()
+        self.assertIsInstance(res, frozenset)
+        self.assertIs(res, tn0.getSuccessfulMembers())
+        self.assertEqual(frozenset(), tn0.getFailedMembers())
+        tn0.assignMemberAsFailed('a1', printChanges=False)
+        self.assertEqual(set(['a1']), tn0.getFailedMembers())
+        self.assertEqual(set(['a1']), tn1a.getFailedMembers())
+        self.assertNotIn('a1', tn0.getSuccessfulMembers())
+        tn1b.addMembers(['b5', 'b6'], 'successful')
+        tn1b.successfulMembers.remove('b1')
+        self.assertEqual([9, 8, 1], tn0.getMemberCounts(tn0))
+        tn1b.failedMembers = set(['b7'])
+        self.assertEqual(set(['a1', 'b7']), tn0.getFailedMembers())
+        self.assertEqual(10, len(tn0.getAllMembers()))
+
+    def test_aggregated_members_with_changed_children(self):
+        tn0, tn1a, tn1b = self.setUp_assignMemberAsFailed()
+        self.assertEqual(8, len(tn0.getSuccessfulMembers()))
+        tn2 = TreeNode('nodeLevel2')
+        tn2.setParent(tn1b)
+        tn1b.setChild(tn2)
+        tn2.addMembers('c1', 'successful')
+        self.assertEqual(set(['a1', 'a2', 'a3', 'a4', 'c1']),
+                         tn0.getSuccessfulMembers())
+        tn0.removeChild(tn1a)
+        self.assertEqual(set(['c1']), tn0.getSuccessfulMembers())
+
+    def test_copied_nodes_invalidate_their_own_members(self):
+        tn0, tn1a, tn1b = self.setUp_assignMemberAsFailed()
+        self.assertEqual(8, len(tn0.getSuccessfulMembers()))
+        for c0 in [copy.deepcopy(tn0), pickle.loads(pickle.dumps(tn0, 2))]:
+            c1b = c0.getChildren()[1]
+            self.assertIs(c1b, c1b.successfulMembers.node)
+            self.assertEqual(8, len(c0.getSuccessfulMembers()))
+            c1b.successfulMembers.add('b9')
+            self.assertIn('b9', c0.getSuccessfulMembers())
+            self.assertNotIn('b9', tn0.getSuccessfulMembers())
+        c1b = copy.copy(tn1b)
+        c1b.successfulMembers.add('b9')
+        self.assertIs(c1b, c1b.successfulMembers.node)
+        self.assertNotIn('b9', tn1b.successfulMembers)
+        self.assertEqual(None, copy.copy(tn1b.successfulMembers).node)
+
 
 class TestCreateTreeFromDbKeys(unittest.TestCase):
 
@@ -419,7 +471,7 @@ class TestCreateTreeFromDbKeys(unittest.TestCase):
             'modelType': 'elliptic', 'elements': 'QuadraticFI'}
         return parDict[param]
 
-    def mockFunc(self, key):
+    def mockFunc(self, key, entryData=None, projection=None):
         if key == 'key1':
             self.adMock = MagicMock()
             self.adMock.getParameter.side_effect = self.adMock_sf_1
@@ -437,9 +489,14 @@ class TestCreateTreeFromDbKeys(unittest.TestCase):
         self.adPatch = patch(
             'dataProcessing.AnalysisData', self.adMock)
         self.adPatch.start()
+        self.entriesPatch = patch(
+            'dbaccess.iterEntriesData',
+            MagicMock(side_effect=lambda keys: [(k, None) for k in keys]))
+        self.entriesPatch.start()
 
     def tearDown(self):
         self.adPatch.stop()
+        self.entriesPatch.stop()
 
     def test_createTreeFromDbKeys(self):
         root = createTreeFromDbKeys(['key1', 'key2'])
@@ -663,3 +720,100 @@ class TestCreateTreeOfKeys(unittest.TestCase):
         self.assertEqual('LinearTet', nodeXc.getChildren()[0].getName())
         self.assertEqual(sorted(['LinearFI', 'QuadFI']),
                          sorted([n.getName() for n in nodeXm.getChildren()]))
+
+
+class TestTreeSerialization(TreeSetUp):
+
+    def test_serializeTree_and_deserializeTree(self):
+        root = deserializeTree(serializeTree(self.root))
+        self.assertEqual(serializeTree(self.root), serializeTree(root))
+        self.assertEqual(self.root.getSuccessfulMembers(),
+                         root.getSuccessfulMembers())
+        self.assertEqual(self.root.getFailedMembers(),
+                         root.getFailedMembers())
+        for leaf in getTreeLeaves(root):
+            self.assertIs(root, leaf.getRootNode())
+
+
+class TestCreateTreeFromRepository(RepoSetUp):
+
+    def getLeafMembers(self, root):
+        return dict((tuple(n.getName() for n in tracePath(l, 1)),
+                     (l.successfulMembers, l.failedMembers))
+                    for l in getTreeLeaves(root))
+
+    def test_createTreeFromRepository_without_tree_index(self):
+        root = createTreeFromRepository()
+        self.assertTrue(os.path.exists(getTreeIndexPath()))
+        exp = {
+            (2.0, 'XFEM', 'crackPartition', 'LinearTet'): (
+                set(['db1$r1', 'db1$r2']), set()),
+            (3.0, 'XFEM', 'crackPartition', 'LinearTet'): (
+                set(['db1$r3']), set()),
+            (2.0, 'FEM', 'elliptic', 'QuadraticRI'): (
+                set(['db2$r1']), set(['db2$r2']))}
+        self.assertEqual(exp, self.getLeafMembers(root))
+
+    def test_createTreeFromRepository_prints_only_when_verbose(self):
+        with patch('sys.stdout') as stdoutMock:
+            createTreeFromRepository()
+        self.assertFalse(stdoutMock.write.called)
+        os.remove(getTreeIndexPath())
+        with patch('sys.stdout') as stdoutMock:
+            createTreeFromRepository(verbose=True)
+        self.assertIn('Indexed 5 records from 2 databases.',
+                      ''.join(c[0][0] for c in
+                              stdoutMock.write.call_args_list))
+
+    def test_createTreeFromRepository_loads_unchanged_tree_index(self):
+        exp = self.getLeafMembers(createTreeFromRepository())
+        with patch('dataProcessing.AnalysisData',
+                   MagicMock(side_effect=AssertionError)):
+            root = createTreeFromRepository()
+        self.assertEqual(exp, self.getLeafMembers(root))
+
+    def test_createTreeFromRepository_reindexes_changed_database_only(self):
+        createTreeFromRepository()
+        del self.entries['db1$r3']
+        self.entries['db1$r4'] = self.entries['db1$r1']
+        self.writeDb('db1')
+        entriesMock = MagicMock(side_effect=dba.iterEntriesData)
+        with patch('dbaccess.iterEntriesData', entriesMock):
+            root = createTreeFromRepository()
+        entriesMock.assert_called_once_with(set(['db1$r1', 'db1$r2',
+                                                 'db1$r4']))
+        exp = {
+            (2.0, 'XFEM', 'crackPartition', 'LinearTet'): (
+                set(['db1$r1', 'db1$r2', 'db1$r4']), set()),
+            (2.0, 'FEM', 'elliptic', 'QuadraticRI'): (
+                set(['db2$r1']), set(['db2$r2']))}
+        self.assertEqual(exp, self.getLeafMembers(root))
+
+    def test_createTreeFromRepository_with_different_level_names(self):
+        createTreeFromRepository()
+        levels = trees.treeLevelParameterNames[:-1]
+        with patch('trees.treeLevelParameterNames', levels):
+            root = createTreeFromRepository()
+        self.assertEqual(3, root.countNumberOfTreeLevels())
+
+    def test_createTreeFromRepository_with_database_changed_in_session(self):
+        createTreeFromRepository()
+        self.appendEntry('db1$r9', createEntry(a=30))
+        root = createTreeFromRepository()
+        exp = set(['db1$r3', 'db1$r9'])
+        self.assertEqual(exp, root.getTreeBranch(
+            [3.0, 'XFEM', 'crackPartition', 'LinearTet']).successfulMembers)
+        dba.closeAllShelves()
+        with patch('dataProcessing.AnalysisData',
+                   MagicMock(side_effect=AssertionError)):
+            root = createTreeFromRepository()
+        self.assertEqual(exp, root.getTreeBranch(
+            [3.0, 'XFEM', 'crackPartition', 'LinearTet']).successfulMembers)
+
+    def test_createTreeFromRepository_with_another_tree_index_format(self):
+        createTreeFromRepository()
+        with patch('trees.treeIndexFormat', 1):
+            with patch('trees.createTreeFromDbKeys',
+                       MagicMock(side_effect=trees.createTreeFromDbKeys)) as m:
+                createTreeFromRepository()
+        self.assertTrue(m.called)